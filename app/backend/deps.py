@@ -1,16 +1,16 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
 from app.core.config import settings
 from app.backend.models.user import TokenData, User
 from app.core.database import db
+from app.core.tenancy import tenants, is_cutover
+from app.core.rate_limit import limiter, route_class, client_address, RateLimitExceeded
+from app.core.aging import invalidate_aging
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-def get_db():
-    return db.get_db()
-
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -26,7 +26,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     except (JWTError, ValidationError):
         raise credentials_exception
     
-    database = get_db()
+    database = db.get_db()
     user = database["users"].find_one({"user_id": token_data.user_id})
     if user is None:
         raise credentials_exception
@@ -46,6 +46,99 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+def get_db(request: Request, current_user: User = Depends(get_current_active_user)):
+    """
+    The caller's tenant database, resolved once per request from the placement
+    directory (see app.core.tenancy). While the account is being cut over to a new
+    placement, reads keep working and writes are asked to retry shortly.
+    """
+    placement = tenants.get_placement(current_user.account_id)
+    if is_cutover(placement) and request.method not in SAFE_METHODS:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Your account is being moved to new storage. Please retry in a few seconds.",
+            headers={"Retry-After": str(settings.TENANT_DIRECTORY_CACHE_SECONDS + 1)},
+        )
+    database = tenants.tenant_db(current_user.account_id, placement)
+    # Lets the causal-token middleware fence writes on the cluster that took them
+    request.state.db_client = database.client
+    return database
+
+def get_report_db(current_user: User = Depends(get_current_active_user)):
+    """Read-only report endpoints: the tenant's placement, read from secondaries (see Database.get_report_db)."""
+    return tenants.tenant_report_db(current_user.account_id)
+
+def get_report_session(request: Request, database=Depends(get_report_db)):
+    """
+    Causally consistent session for report reads. The X-Causal-Token the client got
+    back from its last write makes the secondary wait until that write is applied.
+    """
+    session = db.causal_session(request.headers.get("x-causal-token"), client=database.client)
+    try:
+        yield session
+    finally:
+        session.end_session()
+
+def invalidates_aging(*reports):
+    """
+    Router (or route) dependency for endpoints that change open balances: once a write has
+    succeeded, the tenant's cached aging reports (app.core.aging) are dropped.
+    """
+    def dependency(request: Request, current_user: User = Depends(get_current_active_user), database=Depends(get_db)):
+        yield
+        if request.method not in SAFE_METHODS:
+            invalidate_aging(database, current_user.account_id, *reports)
+    return dependency
+
+def too_many_requests(exc: RateLimitExceeded) -> HTTPException:
+    if exc.reason == "concurrency":
+        detail = "Too many reports are running for your account. Please retry shortly."
+    else:
+        detail = f"Rate limit exceeded for {exc.route_class} requests. Please retry shortly."
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+def enforce_rate_limit(request: Request, current_user: User = Depends(get_current_active_user)):
+    """
+    Per-account token bucket for the request's route class, sized by the account's plan.
+    Report routes also hold a concurrency slot until the response is done.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        yield
+        return
+    plan_key = (current_user.subscription or {}).get("plan", "free")
+    cls = route_class(request.method, request.url.path[len(settings.API_V1_STR):], request.query_params)
+    slot = None
+    try:
+        limiter.check(current_user.account_id, plan_key, cls)
+        if cls == "reports":
+            slot = limiter.acquire_report_slot(current_user.account_id, plan_key)
+    except RateLimitExceeded as e:
+        raise too_many_requests(e)
+    try:
+        yield
+    finally:
+        if slot:
+            limiter.release_report_slot(*slot)
+
+def enforce_auth_rate_limit(request: Request):
+    """
+    Login/signup run before an account is known: bucket by client address, sized
+    for many users behind one address (AUTH_RATE_LIMIT_RATE/BURST).
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    client = client_address(request.client.host if request.client else None, request.headers.get("x-forwarded-for"))
+    try:
+        limiter.check_limit(f"ip:{client}", "auth", settings.AUTH_RATE_LIMIT_RATE, settings.AUTH_RATE_LIMIT_BURST)
+    except RateLimitExceeded as e:
+        raise too_many_requests(e)
+
 async def check_plan_limit(account_id: str, limit_key: str, current_count: int):
     from app.core.plans import SUBSCRIPTION_PLANS
     database = db.get_db()
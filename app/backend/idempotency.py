@@ -0,0 +1,184 @@
+"""
+Idempotency-Key support for create endpoints.
+
+Routers built with `APIRouter(route_class=IdempotentRoute)` accept an
+`Idempotency-Key` header on POST. The first request with a key claims it in the
+`idempotency_keys` collection and runs normally; its response is stored and
+replayed (with `Idempotent-Replayed: true`) for any retry with the same key.
+A retry that arrives while the first request is still running waits for its
+result instead of creating a second invoice/payment.
+
+Keys are scoped to the authenticated user and path, expire after
+IDEMPOTENCY_KEY_TTL_HOURS, and must be reused with the same request body.
+"""
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import Callable
+
+from fastapi import HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from jose import jwt, JWTError
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.core.database import db
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL_SECONDS = 0.2
+# Business outcomes worth replaying. Auth, rate-limit and availability errors are
+# released instead, so a retry after a token refresh or a 429 really runs.
+STORED_ERROR_CODES = {400, 404, 422}
+
+
+def token_subject(request: Request):
+    """user_id from the bearer token, or None (the endpoint itself will answer 401)."""
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        payload = jwt.decode(authorization[7:], settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+
+def keys_collection():
+    return db.get_db()["idempotency_keys"]
+
+
+def claim_key(record_id: str, fingerprint: str, path: str):
+    """
+    Try to own record_id. Returns (True, None) when this request should run, or
+    (False, record) with the existing record otherwise.
+    """
+    now = datetime.utcnow()
+    record = {
+        "_id": record_id,
+        "state": "in_progress",
+        "fingerprint": fingerprint,
+        "path": path,
+        "created_at": now,
+        # A worker killed mid-request leaves the key claimable again after this
+        "locked_until": now + timedelta(seconds=settings.WORKER_TIMEOUT),
+        "expires_at": now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+    }
+    collection = keys_collection()
+    try:
+        collection.insert_one(record)
+        return True, None
+    except DuplicateKeyError:
+        pass
+
+    existing = collection.find_one({"_id": record_id})
+    if existing is None:
+        # Deleted (released or expired) between the insert and the read
+        return claim_key(record_id, fingerprint, path)
+    expired = existing["expires_at"] < now  # the TTL monitor only runs once a minute
+    abandoned = (
+        existing["state"] == "in_progress" and existing["locked_until"] < now
+        and existing["fingerprint"] == fingerprint
+    )
+    if expired or abandoned:
+        taken = collection.find_one_and_update(
+            {"_id": record_id, "locked_until": existing["locked_until"], "state": existing["state"]},
+            {"$set": {k: v for k, v in record.items() if k != "_id"}}
+        )
+        if taken:
+            return True, None
+        existing = collection.find_one({"_id": record_id}) or existing
+    return False, existing
+
+
+def complete_key(record_id: str, status_code: int, body: bytes, media_type: str):
+    keys_collection().update_one(
+        {"_id": record_id},
+        {"$set": {
+            "state": "completed",
+            "status_code": status_code,
+            "body": body,
+            "media_type": media_type,
+            "completed_at": datetime.utcnow()
+        }}
+    )
+
+
+def release_key(record_id: str):
+    keys_collection().delete_one({"_id": record_id, "state": "in_progress"})
+
+
+def replay(record) -> Response:
+    return Response(
+        content=record["body"],
+        status_code=record["status_code"],
+        media_type=record.get("media_type") or "application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def key_conflict(detail: str, status_code: int = 409, retry_after: int = None) -> JSONResponse:
+    headers = {"Retry-After": str(retry_after)} if retry_after else None
+    return JSONResponse({"detail": detail}, status_code=status_code, headers=headers)
+
+
+class IdempotentRoute(APIRoute):
+    """APIRoute that deduplicates POSTs carrying an Idempotency-Key header."""
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def idempotent_handler(request: Request) -> Response:
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if request.method != "POST" or not key:
+                return await handler(request)
+            subject = token_subject(request)
+            if subject is None:
+                return await handler(request)
+            if len(key) > MAX_KEY_LENGTH:
+                return key_conflict(f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters", 400)
+
+            body = await request.body()  # cached on the request, the endpoint reads it again
+            path = request.url.path
+            record_id = hashlib.sha256(f"{subject}|{path}|{key}".encode()).hexdigest()
+            fingerprint = hashlib.sha256(body).hexdigest()
+
+            deadline = time.monotonic() + settings.WORKER_TIMEOUT
+            while True:
+                owned, record = await run_in_threadpool(claim_key, record_id, fingerprint, path)
+                if owned:
+                    break
+                if record["fingerprint"] != fingerprint:
+                    return key_conflict("Idempotency-Key was already used with a different request", 422)
+                if record["state"] == "completed":
+                    return replay(record)
+                if time.monotonic() >= deadline:
+                    return key_conflict("A request with this Idempotency-Key is still in progress", retry_after=1)
+                # Same request still running elsewhere: wait for its result
+                await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+            try:
+                response = await handler(request)
+            except HTTPException as e:
+                if e.status_code in STORED_ERROR_CODES:
+                    stored = JSONResponse({"detail": e.detail}, status_code=e.status_code)
+                    await run_in_threadpool(complete_key, record_id, e.status_code, stored.body, stored.media_type)
+                else:
+                    await run_in_threadpool(release_key, record_id)
+                raise
+            except Exception:
+                await run_in_threadpool(release_key, record_id)
+                raise
+
+            if response.status_code < 400 or response.status_code in STORED_ERROR_CODES:
+                await run_in_threadpool(
+                    complete_key, record_id, response.status_code, bytes(response.body), response.media_type
+                )
+            else:
+                await run_in_threadpool(release_key, record_id)
+            return response
+
+        return idempotent_handler
@@ -1,7 +1,10 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.database import db
+from app.core.tenancy import tenants
+from app.core.security import shutdown_hash_executor
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -15,40 +18,74 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Causal-Token"],
 )
 
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+@app.middleware("http")
+async def attach_causal_token(request: Request, call_next):
+    """Hand successful writes a causal token so follow-up report reads on secondaries see them."""
+    response = await call_next(request)
+    client = getattr(request.state, "db_client", None)
+    if request.method in WRITE_METHODS and response.status_code < 400 and client is not None:
+        try:
+            token = await run_in_threadpool(db.write_fence, client)
+        except Exception:
+            token = None
+        if token:
+            response.headers["X-Causal-Token"] = token
+    return response
+
 @app.on_event("startup")
 def startup_db_client():
     db.connect()
-    from app.core.init_db import ensure_admin_exists
-    ensure_admin_exists()
+    # One-off bootstrap work; serve.py runs it once in the master before forking workers.
+    if settings.RUN_STARTUP_TASKS:
+        from app.core.init_db import ensure_admin_exists, ensure_indexes
+        ensure_indexes()
+        ensure_admin_exists()
 
 @app.on_event("shutdown")
 def shutdown_db_client():
+    shutdown_hash_executor()
+    tenants.close()
     db.close()
 
+from app.backend.deps import enforce_rate_limit
 from app.backend.routers import (
     auth, users, weavers, customers, categories, items, dashboard, 
     quotations, invoices, payments, purchase_orders, purchase_bills, vendor_payments,
-    subscriptions
+    subscriptions, recurring_invoices, locations, reports
 )
+# Per-account token buckets by route class (auth and subscriptions apply them per endpoint,
+# since they also serve unauthenticated routes)
+rate_limited = [Depends(enforce_rate_limit)]
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
-app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
-app.include_router(weavers.router, prefix=f"{settings.API_V1_STR}/weavers", tags=["weavers"])
-app.include_router(customers.router, prefix=f"{settings.API_V1_STR}/customers", tags=["customers"])
-app.include_router(categories.router, prefix=f"{settings.API_V1_STR}/categories", tags=["categories"])
-app.include_router(items.router, prefix=f"{settings.API_V1_STR}/items", tags=["items"])
-app.include_router(dashboard.router, prefix=f"{settings.API_V1_STR}/dashboard", tags=["dashboard"])
-app.include_router(quotations.router, prefix=f"{settings.API_V1_STR}/quotations", tags=["quotations"])
-app.include_router(invoices.router, prefix=f"{settings.API_V1_STR}/invoices", tags=["invoices"])
-app.include_router(payments.router, prefix=f"{settings.API_V1_STR}/payments", tags=["payments"])
+app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"], dependencies=rate_limited)
+app.include_router(weavers.router, prefix=f"{settings.API_V1_STR}/weavers", tags=["weavers"], dependencies=rate_limited)
+app.include_router(customers.router, prefix=f"{settings.API_V1_STR}/customers", tags=["customers"], dependencies=rate_limited)
+app.include_router(categories.router, prefix=f"{settings.API_V1_STR}/categories", tags=["categories"], dependencies=rate_limited)
+app.include_router(items.router, prefix=f"{settings.API_V1_STR}/items", tags=["items"], dependencies=rate_limited)
+app.include_router(locations.router, prefix=f"{settings.API_V1_STR}/locations", tags=["locations"], dependencies=rate_limited)
+app.include_router(dashboard.router, prefix=f"{settings.API_V1_STR}/dashboard", tags=["dashboard"], dependencies=rate_limited)
+app.include_router(reports.router, prefix=f"{settings.API_V1_STR}/reports", tags=["reports"], dependencies=rate_limited)
+app.include_router(quotations.router, prefix=f"{settings.API_V1_STR}/quotations", tags=["quotations"], dependencies=rate_limited)
+app.include_router(invoices.router, prefix=f"{settings.API_V1_STR}/invoices", tags=["invoices"], dependencies=rate_limited)
+app.include_router(payments.router, prefix=f"{settings.API_V1_STR}/payments", tags=["payments"], dependencies=rate_limited)
+app.include_router(recurring_invoices.router, prefix=f"{settings.API_V1_STR}/recurring-invoices", tags=["recurring-invoices"], dependencies=rate_limited)
 
 # Purchase Management Routers
-app.include_router(purchase_orders.router, prefix=f"{settings.API_V1_STR}/purchase-orders", tags=["purchase-orders"])
-app.include_router(purchase_bills.router, prefix=f"{settings.API_V1_STR}/purchase-bills", tags=["purchase-bills"])
-app.include_router(vendor_payments.router, prefix=f"{settings.API_V1_STR}/vendor-payments", tags=["vendor-payments"])
+app.include_router(purchase_orders.router, prefix=f"{settings.API_V1_STR}/purchase-orders", tags=["purchase-orders"], dependencies=rate_limited)
+app.include_router(purchase_bills.router, prefix=f"{settings.API_V1_STR}/purchase-bills", tags=["purchase-bills"], dependencies=rate_limited)
+app.include_router(vendor_payments.router, prefix=f"{settings.API_V1_STR}/vendor-payments", tags=["vendor-payments"], dependencies=rate_limited)
 app.include_router(subscriptions.router, prefix=f"{settings.API_V1_STR}/subscriptions", tags=["subscriptions"])
 
+# Pre-built UI shells and fingerprinted assets (python build_frontend.py)
+if settings.SERVE_FRONTEND:
+    from app.frontend.static_site import mount_static_site
+    mount_static_site(app, settings.FRONTEND_DIST_DIR)
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Billing SaaS API"}
@@ -58,6 +58,7 @@ class InvoiceBase(BaseModel):
     status: str = "active" # active, cancelled
     quotation_id: Optional[str] = None
     quotation_number: Optional[str] = None
+    location_id: Optional[str] = None # Stock is taken from here (default location when omitted)
     notes: Optional[str] = None
     payment_terms: Optional[str] = None
     discount_amount: Optional[float] = 0.0
@@ -113,5 +114,6 @@ class Invoice(InvoiceBase):
     account_id: str
     invoice_number: str
     created_at: datetime
+    stock_pending: bool = False # Duplicated and not yet saved: stock is reserved, not deducted
 
     model_config = ConfigDict(from_attributes=True)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, model_validator
+from typing import List, Optional
 from datetime import datetime
 
 class ItemBase(BaseModel):
@@ -22,6 +22,7 @@ class ItemBase(BaseModel):
     opening_stock: float = 0.0
     opening_stock_rate: float = 0.0
     preferred_supplier_id: str = ""
+    stock_shards: int = 0 # > 0 spreads stock updates over this many counters (hot items, app.core.stock)
     
     status: str = "active" # active, inactive
     description: str = ""
@@ -46,6 +47,7 @@ class ItemUpdate(BaseModel):
     opening_stock: Optional[float] = None
     opening_stock_rate: Optional[float] = None
     preferred_supplier_id: Optional[str] = None
+    stock_shards: Optional[int] = None
     status: Optional[str] = None
     description: Optional[str] = None
     notes: Optional[str] = None
@@ -55,5 +57,44 @@ class Item(ItemBase):
     account_id: str
     created_at: datetime
     current_stock: float = 0.0
+    reserved_stock: float = 0.0 # Held by quotations and unfinalized invoices (app.core.reservations)
+    available_stock: Optional[float] = None # current_stock - reserved_stock
 
     model_config = ConfigDict(from_attributes=True)
+
+    @model_validator(mode='before')
+    @classmethod
+    def derive_available(cls, data):
+        if isinstance(data, dict) and data.get('available_stock') is None:
+            data['available_stock'] = (data.get('current_stock') or 0) - (data.get('reserved_stock') or 0)
+        return data
+
+class ItemMovement(BaseModel):
+    transaction_id: str
+    item_id: str
+    item_name: Optional[str] = None
+    transaction_type: str # in, out, transfer_in, transfer_out
+    quantity: float
+    previous_stock: Optional[float] = None
+    new_stock: Optional[float] = None
+    location_id: Optional[str] = None
+    transaction_date: datetime
+    notes: Optional[str] = None
+
+    # Source document references (invoice_id, bill_id, po_id, transfer_id, ...)
+    model_config = ConfigDict(extra="allow")
+
+class ItemMovementPage(BaseModel):
+    movements: List[ItemMovement]
+    next_cursor: Optional[str] = None # Pass as ?cursor= for the next (older) page
+
+class ItemStockAsOf(BaseModel):
+    item_id: str
+    item_name: str = ""
+    sku: str = ""
+    stock: float
+
+class StockAsOf(BaseModel):
+    as_of: datetime # Movements before this instant are counted
+    based_on: Optional[datetime] = None # Snapshot the figures were derived from (None = live stock)
+    items: List[ItemStockAsOf]
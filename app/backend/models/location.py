@@ -0,0 +1,54 @@
+from pydantic import BaseModel, ConfigDict
+from typing import List, Optional
+from datetime import datetime
+
+class LocationBase(BaseModel):
+    name: str
+    location_type: str = "warehouse" # warehouse, shop, weaver
+    weaver_id: Optional[str] = None # Site of this weaver (location_type "weaver")
+    address: str = ""
+    is_default: bool = False # Used by invoices, bills and POs that name no location
+    status: str = "active" # active, inactive
+
+class LocationCreate(LocationBase):
+    pass
+
+class LocationUpdate(BaseModel):
+    name: Optional[str] = None
+    location_type: Optional[str] = None
+    weaver_id: Optional[str] = None
+    address: Optional[str] = None
+    is_default: Optional[bool] = None
+    status: Optional[str] = None
+
+class Location(LocationBase):
+    location_id: str
+    account_id: str
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class LocationStock(BaseModel):
+    item_id: str
+    item_name: str = ""
+    location_id: Optional[str] = None # None = not assigned to any location
+    location_name: str = ""
+    current_stock: float = 0.0
+
+class StockTransferCreate(BaseModel):
+    item_id: str
+    from_location_id: Optional[str] = None # None = unassigned stock
+    to_location_id: str
+    quantity: float
+    notes: Optional[str] = None
+
+class StockTransfer(BaseModel):
+    transfer_id: str
+    item_id: str
+    item_name: str
+    from_location_id: Optional[str] = None
+    to_location_id: str
+    quantity: float
+    transferred_at: datetime
+    transactions: List[dict] = []
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class PaymentBase(BaseModel):
@@ -29,5 +29,43 @@ class Payment(PaymentBase):
     payment_id: str
     payment_number: str
     created_at: datetime
+    # Invoice state right after this payment was applied (create responses only)
+    invoice_balance: Optional[float] = None
+    invoice_payment_status: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+class InvoiceAllocation(BaseModel):
+    invoice_id: str
+    amount: float
+
+class PaymentAllocationRequest(BaseModel):
+    party_id: str # Customer ID
+    party_name: str
+    amount: float
+    payment_date: Optional[datetime] = None
+    payment_mode: str = "cash"
+    reference_number: Optional[str] = None
+    notes: Optional[str] = None
+    # Explicit split; when omitted the amount is allocated FIFO by due date
+    allocations: Optional[List[InvoiceAllocation]] = None
+
+class AllocationLine(BaseModel):
+    invoice_id: Optional[str] = None # None = unallocated advance on the customer's account
+    invoice_number: Optional[str] = None
+    due_date: Optional[datetime] = None
+    amount: float
+    balance_before: Optional[float] = None
+    balance_after: Optional[float] = None
+    payment_status: Optional[str] = None
+    payment_id: str
+    payment_number: str
+
+class PaymentAllocationResult(BaseModel):
+    allocation_id: str
+    party_id: str
+    total_amount: float
+    allocated_amount: float
+    unallocated_amount: float
+    strategy: str # fifo | explicit
+    lines: List[AllocationLine]
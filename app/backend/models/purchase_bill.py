@@ -38,6 +38,7 @@ class PurchaseBillBase(BaseModel):
     
     payment_status: str = "unpaid"  # unpaid, partial, paid, overdue
     status: str = "draft"  # draft, submitted, approved, paid
+    location_id: Optional[str] = None # Stock is received here (default location when omitted)
     
     notes: Optional[str] = None
     attachments: Optional[List[str]] = []
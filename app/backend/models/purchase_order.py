@@ -31,6 +31,7 @@ class PurchaseOrderBase(BaseModel):
     
     shipping_address: Optional[str] = None
     billing_address: Optional[str] = None
+    location_id: Optional[str] = None # Receiving location (default location when omitted)
     
     notes: Optional[str] = None
     terms_and_conditions: Optional[str] = None
@@ -54,6 +55,7 @@ class PurchaseOrderUpdate(BaseModel):
     status: Optional[str] = None
     shipping_address: Optional[str] = None
     billing_address: Optional[str] = None
+    location_id: Optional[str] = None
     notes: Optional[str] = None
     terms_and_conditions: Optional[str] = None
     received_qty: Optional[float] = None
@@ -46,6 +46,7 @@ class QuotationBase(BaseModel):
     notes: Optional[str] = None
     terms_conditions: Optional[str] = None
     status: str = "draft" # draft, sent, accepted, declined, converted
+    reserve_stock: bool = False # Hold the quoted quantities until valid_until (app.core.reservations)
 
     @model_validator(mode='before')
     @classmethod
@@ -71,6 +72,7 @@ class QuotationUpdate(BaseModel):
     notes: Optional[str] = None
     terms_conditions: Optional[str] = None
     status: Optional[str] = None
+    reserve_stock: Optional[bool] = None
 
 class Quotation(QuotationBase):
     quotation_id: str
@@ -0,0 +1,55 @@
+from pydantic import BaseModel, ConfigDict, model_validator
+from typing import List, Optional
+from datetime import datetime
+from app.backend.models.invoice import InvoiceItem
+
+class RecurringInvoiceBase(BaseModel):
+    customer_id: str
+    customer_name: Optional[str] = None
+    items: List[InvoiceItem]
+    frequency: str = "monthly" # daily, weekly, monthly, quarterly, yearly
+    interval: int = 1 # Every N periods
+    start_date: datetime # First invoice date
+    end_date: Optional[datetime] = None # No invoices after this date
+    due_in_days: Optional[int] = None # due_date = invoice date + N days
+    discount_amount: Optional[float] = 0.0
+    shipping_charges: Optional[float] = 0.0
+    notes: Optional[str] = None
+    payment_terms: Optional[str] = None
+    status: str = "active" # active, paused, completed
+
+class RecurringInvoiceCreate(RecurringInvoiceBase):
+    @model_validator(mode='before')
+    @classmethod
+    def validate_create_data(cls, data: dict) -> dict:
+        if 'end_date' in data and data['end_date'] == "":
+            data['end_date'] = None
+        return data
+
+class RecurringInvoiceUpdate(BaseModel):
+    customer_id: Optional[str] = None
+    customer_name: Optional[str] = None
+    items: Optional[List[InvoiceItem]] = None
+    frequency: Optional[str] = None
+    interval: Optional[int] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    due_in_days: Optional[int] = None
+    discount_amount: Optional[float] = None
+    shipping_charges: Optional[float] = None
+    notes: Optional[str] = None
+    payment_terms: Optional[str] = None
+    status: Optional[str] = None
+
+class RecurringInvoice(RecurringInvoiceBase):
+    schedule_id: str
+    account_id: str
+    next_run_at: Optional[datetime] = None
+    last_run_at: Optional[datetime] = None
+    last_invoice_id: Optional[str] = None
+    last_invoice_number: Optional[str] = None
+    run_count: int = 0
+    last_error: Optional[str] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,38 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+from datetime import datetime
+
+class AgingParty(BaseModel):
+    party_id: str
+    party_name: str = ""
+    buckets: Dict[str, float] # not_due, 0-30, 31-60, 61-90, 90+ (days past due)
+    total: float
+    documents: int # Open invoices or bills
+    oldest_due: Optional[datetime] = None
+
+class AgingReport(BaseModel):
+    report: str # receivables | payables
+    as_of: datetime
+    buckets: Dict[str, float] # Totals across parties
+    total: float
+    parties: List[AgingParty]
+
+class CashFlowPeriod(BaseModel):
+    inflow: float # Open invoice balances due
+    outflow: float # Open purchase bill balances due
+    net: float
+    invoices: int
+    bills: int
+
+class CashFlowBucket(CashFlowPeriod):
+    period_start: datetime
+
+class CashFlowForecast(BaseModel):
+    interval: str # day | week | month
+    start: datetime
+    end: datetime
+    overdue: CashFlowPeriod # Already past due at start
+    periods: List[CashFlowBucket]
+    inflow: float
+    outflow: float
+    net: float
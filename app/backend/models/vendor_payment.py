@@ -32,5 +32,8 @@ class VendorPayment(VendorPaymentBase):
     account_id: str
     payment_number: str
     created_at: datetime
+    # Bill state right after this payment was applied (create responses only)
+    bill_balance: Optional[float] = None
+    bill_payment_status: Optional[str] = None
     
     model_config = ConfigDict(from_attributes=True)
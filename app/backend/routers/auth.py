@@ -1,8 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from app.core.database import db
-from app.core.security import verify_password, get_password_hash, create_access_token
-from app.backend.models.user import UserCreate, Token, UserInDB
+from app.core.security import (
+    get_password_hash_async, verify_and_update_password_async, create_access_token,
+    create_refresh_token, hash_refresh_token
+)
+from app.backend.models.user import UserCreate, Token, UserInDB, RefreshRequest
+from app.backend.deps import enforce_auth_rate_limit
 from datetime import timedelta
 from app.core.config import settings
 import uuid
@@ -10,28 +15,35 @@ from datetime import datetime
 
 router = APIRouter()
 
-@router.post("/signup", response_model=Token)
-def signup(user_in: UserCreate):
-    database = db.get_db()
-    users_collection = database["users"]
-    accounts_collection = database["accounts"]
-    orgs_collection = database["organizations"]
-
-    # RESTRICTION: Only allow the first user to be created via /signup
-    # This prevents unauthorized user creation once the system is set up.
-    if users_collection.count_documents({}) > 0:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Signup is disabled. An administrator already exists.",
-        )
+REFRESH_REUSE_GRACE_SECONDS = 30
 
-    # Check if user already exists (redundant but safe)
-    if users_collection.find_one({"email": user_in.email}):
-        raise HTTPException(
-            status_code=400,
-            detail="The user with this email already exists in the system.",
-        )
+def issue_tokens(database, user_doc: dict) -> dict:
+    """Mint a short-lived access token plus a rotating refresh token backed by a session document."""
+    access_token = create_access_token(
+        subject=user_doc["user_id"],
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token, token_hash = create_refresh_token()
+    now = datetime.utcnow()
+    database["sessions"].insert_one({
+        "session_id": str(uuid.uuid4()),
+        "user_id": user_doc["user_id"],
+        "account_id": user_doc["account_id"],
+        "token_hash": token_hash,
+        "previous_token_hash": None,
+        "created_at": now,
+        "last_used_at": now,
+        "expires_at": now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    })
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
 
+def create_owner_account(database, user_in: UserCreate, hashed_password: str) -> dict:
+    """Create the account, its owner and default organization; returns the owner's tokens."""
     # 1. Create New Account (Multi-tenant Root)
     account_id = str(uuid.uuid4())
     account_doc = {
@@ -40,7 +52,7 @@ def signup(user_in: UserCreate):
         "status": "active",
         "created_at": datetime.utcnow()
     }
-    accounts_collection.insert_one(account_doc)
+    database["accounts"].insert_one(account_doc)
 
     # 2. Create User linked to Account
     user_id = str(uuid.uuid4())
@@ -49,12 +61,12 @@ def signup(user_in: UserCreate):
         "account_id": account_id,
         "email": user_in.email,
         "full_name": user_in.full_name,
-        "hashed_password": get_password_hash(user_in.password),
+        "hashed_password": hashed_password,
         "role": "owner",
         "is_active": True,
         "created_at": datetime.utcnow()
     }
-    users_collection.insert_one(user_doc)
+    database["users"].insert_one(user_doc)
 
     # 3. Create Default Organization
     org_id = str(uuid.uuid4())
@@ -64,61 +76,152 @@ def signup(user_in: UserCreate):
         "company_name": user_in.organization_name,
         "created_at": datetime.utcnow()
     }
-    orgs_collection.insert_one(org_doc)
+    database["organizations"].insert_one(org_doc)
 
-    # 4. Generate Token
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        subject=user_id, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    # 4. Generate Tokens
+    return issue_tokens(database, user_doc)
+
+# signup and login are async so hashing can be awaited in the process pool; their
+# blocking pymongo calls go through run_in_threadpool to keep the event loop free.
 
-@router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends()):
+@router.post("/signup", response_model=Token, dependencies=[Depends(enforce_auth_rate_limit)])
+async def signup(user_in: UserCreate):
+    database = db.get_db()
+    users_collection = database["users"]
+
+    # RESTRICTION: Only allow the first user to be created via /signup
+    # This prevents unauthorized user creation once the system is set up.
+    if await run_in_threadpool(users_collection.count_documents, {}) > 0:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Signup is disabled. An administrator already exists.",
+        )
+
+    # Check if user already exists (redundant but safe)
+    if await run_in_threadpool(users_collection.find_one, {"email": user_in.email}):
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this email already exists in the system.",
+        )
+
+    # Hash in the dedicated process pool before writing anything
+    hashed_password = await get_password_hash_async(user_in.password)
+    return await run_in_threadpool(create_owner_account, database, user_in, hashed_password)
+
+@router.post("/login", response_model=Token, dependencies=[Depends(enforce_auth_rate_limit)])
+async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     database = db.get_db()
     users_collection = database["users"]
     
-    user_doc = users_collection.find_one({"email": form_data.username})
-    if not user_doc or not verify_password(form_data.password, user_doc["hashed_password"]):
+    user_doc = await run_in_threadpool(users_collection.find_one, {"email": form_data.username})
+    is_valid, new_hash = False, None
+    if user_doc:
+        is_valid, new_hash = await verify_and_update_password_async(form_data.password, user_doc["hashed_password"])
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # Transparent rehash when PASSWORD_HASH_ROUNDS changed since this hash was made
+    if new_hash:
+        await run_in_threadpool(
+            users_collection.update_one, {"user_id": user_doc["user_id"]}, {"$set": {"hashed_password": new_hash}}
+        )
     
     if not user_doc.get("is_active", True):
         raise HTTPException(status_code=400, detail="Inactive user")
 
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return await run_in_threadpool(issue_tokens, database, user_doc)
+
+@router.post("/refresh", response_model=Token)
+def refresh_access_token(body: RefreshRequest):
+    """
+    Exchange a refresh token for a new access token without password verification.
+    The refresh token is rotated on every call; presenting an already-rotated token
+    revokes the whole session (token theft / replay). Not rate limited by address:
+    the token cannot be guessed, and a throttled refresh would sign users out.
+    """
+    database = db.get_db()
+    sessions_collection = database["sessions"]
+    token_hash = hash_refresh_token(body.refresh_token)
+    now = datetime.utcnow()
+    invalid_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    new_token, new_hash = create_refresh_token()
+    session = sessions_collection.find_one_and_update(
+        {"token_hash": token_hash, "expires_at": {"$gt": now}},
+        {"$set": {
+            "token_hash": new_hash,
+            "previous_token_hash": token_hash,
+            "last_used_at": now,
+            "expires_at": now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        }}
+    )
+    if not session:
+        # Reuse of a rotated token revokes the session it belonged to, unless it is
+        # a benign race (two tabs refreshing at once) inside the grace window.
+        sessions_collection.delete_one({
+            "previous_token_hash": token_hash,
+            "last_used_at": {"$lt": now - timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS)}
+        })
+        raise invalid_exception
+
+    user_doc = database["users"].find_one(
+        {"user_id": session["user_id"]},
+        projection={"user_id": 1, "is_active": 1}
+    )
+    if not user_doc or not user_doc.get("is_active", True):
+        sessions_collection.delete_one({"session_id": session["session_id"]})
+        raise invalid_exception
+
     access_token = create_access_token(
-        subject=user_doc["user_id"], expires_delta=access_token_expires
+        subject=user_doc["user_id"],
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": new_token,
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+@router.post("/logout")
+def logout(body: RefreshRequest):
+    """Revoke the session behind a refresh token."""
+    database = db.get_db()
+    database["sessions"].delete_one({"token_hash": hash_refresh_token(body.refresh_token)})
+    return {"message": "Logged out"}
 
 from app.backend.models.user import User
-from app.backend.deps import get_current_active_user
+from app.backend.deps import get_current_active_user, get_db, enforce_rate_limit
 
-@router.get("/organization")
+@router.get("/organization", dependencies=[Depends(enforce_rate_limit)])
 def get_organization(
     current_user: User = Depends(get_current_active_user),
+    database=Depends(get_db)
 ):
-    database = db.get_db()
     org = database["organizations"].find_one({"account_id": current_user.account_id})
     if not org:
         raise HTTPException(status_code=404, detail="Organization not found")
     org["_id"] = str(org["_id"])
     return org
 
-@router.put("/organization")
+@router.put("/organization", dependencies=[Depends(enforce_rate_limit)])
 def update_organization(
     org_update: dict,
     current_user: User = Depends(get_current_active_user),
+    database=Depends(get_db)
 ):
     # Only owners/managers can update org
     if current_user.role not in ["owner", "manager"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
         
-    database = db.get_db()
     orgs_collection = database["organizations"]
     
     # We restrict update to specific fields for safety
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from typing import List, Optional
 from app.backend.models.category import Category, CategoryCreate, CategoryUpdate
 from app.backend.models.user import User
 from app.backend.deps import get_current_active_user, get_db
 from app.core.database import db as db_core
+from app.core.sync import begin_sync, delta_query
 import uuid
 from datetime import datetime
 import pymongo
@@ -59,14 +60,25 @@ def create_category(
 
 @router.get("/", response_model=List[Category])
 def list_categories(
+    request: Request,
+    response: Response,
     search: Optional[str] = Query(None, description="Search by category name"),
     status_filter: Optional[str] = Query(None, description="Filter by status: active or inactive"),
+    updated_since: Optional[datetime] = Query(None, description="Only categories changed since this time"),
     current_user: User = Depends(get_current_active_user),
     db=Depends(get_db)
 ):
     """List all categories for the current user's account"""
     try:
-        query = {"account_id": current_user.account_id}
+        sync_headers, not_modified = begin_sync(request, db["categories"], current_user.account_id, active_only=False)
+        if not_modified:
+            return not_modified
+        response.headers.update(sync_headers)
+
+        if updated_since:
+            query = delta_query(current_user.account_id, updated_since)
+        else:
+            query = {"account_id": current_user.account_id}
         
         if search and search.strip():
             query["$or"] = [
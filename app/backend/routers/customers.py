@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from typing import List, Optional
 from app.backend.models.customer import Customer, CustomerCreate, CustomerUpdate
 from app.backend.models.user import User
 from app.backend.deps import get_current_active_user, get_db
 from app.core.database import db as db_core
+from app.core.sync import begin_sync, delta_query
 import uuid
 from datetime import datetime
 import pymongo
@@ -25,6 +26,7 @@ def create_customer(
     customer_doc["account_id"] = current_user.account_id
     customer_doc["customer_code"] = new_code
     customer_doc["created_at"] = datetime.utcnow()
+    customer_doc["updated_at"] = customer_doc["created_at"]
     
     # Initialize balance
     customer_doc["current_balance"] = customer_doc.get("opening_balance", 0.0)
@@ -34,13 +36,25 @@ def create_customer(
 
 @router.get("/", response_model=List[Customer])
 def list_customers(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
     current_user: User = Depends(get_current_active_user),
     db=Depends(get_db)
 ):
-    query = {"account_id": current_user.account_id, "status": {"$ne": "inactive"}}
+    """List customers. With `updated_since`, returns only records changed since then (including deactivated ones)."""
+    sync_headers, not_modified = begin_sync(request, db["customers"], current_user.account_id)
+    if not_modified:
+        return not_modified
+    response.headers.update(sync_headers)
+
+    if updated_since:
+        query = delta_query(current_user.account_id, updated_since)
+    else:
+        query = {"account_id": current_user.account_id, "status": {"$ne": "inactive"}}
     if search:
         query["$or"] = [
             {"customer_name": {"$regex": search, "$options": "i"}},
@@ -76,6 +90,7 @@ def update_customer(
 
     update_data = customer_in.dict(exclude_unset=True)
     if update_data:
+        update_data["updated_at"] = datetime.utcnow()
         db["customers"].update_one(query, {"$set": update_data})
         customer = db["customers"].find_one(query)
     
@@ -88,7 +103,7 @@ def delete_customer(
     db=Depends(get_db)
 ):
     query = {"customer_id": customer_id, "account_id": current_user.account_id}
-    result = db["customers"].update_one(query, {"$set": {"status": "inactive"}})
+    result = db["customers"].update_one(query, {"$set": {"status": "inactive", "updated_at": datetime.utcnow()}})
     if result.modified_count == 0:
          raise HTTPException(status_code=404, detail="Customer not found")
     return {"message": "Customer deactivated successfully"}
@@ -1,7 +1,9 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
 from fastapi.responses import Response
 from app.backend.models.user import User
-from app.backend.deps import get_current_active_user, get_db
+from app.backend.deps import get_current_active_user, get_db, get_report_db, get_report_session
+from app.core.cashflow import cash_flow
+from app.core.valuation import cost_of_sales, inventory_value as valued_inventory
 from datetime import datetime, timedelta
 import io
 import csv
@@ -15,7 +17,8 @@ def get_dashboard_stats(
     start_date: str = Query(None),
     end_date: str = Query(None),
     current_user: User = Depends(get_current_active_user),
-    db=Depends(get_db)
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
 ):
     """
     Get dashboard statistics with optimized aggregation.
@@ -46,7 +49,7 @@ def get_dashboard_stats(
             "total_receivables": {"$sum": "$balance_amount"}
         }}
     ]
-    finance_stats = list(db["invoices"].aggregate(finance_pipeline))
+    finance_stats = list(db["invoices"].aggregate(finance_pipeline, session=session))
     finance = finance_stats[0] if finance_stats else {"total_sales": 0, "total_receivables": 0}
 
     # 3. Total Payables (from Weavers)
@@ -54,27 +57,29 @@ def get_dashboard_stats(
         {"$match": {"account_id": account_id, "status": "active"}},
         {"$group": {"_id": None, "total_payables": {"$sum": "$current_balance"}}}
     ]
-    payables_res = list(db["weavers"].aggregate(weaver_pipeline))
+    payables_res = list(db["weavers"].aggregate(weaver_pipeline, session=session))
     total_payables = payables_res[0]["total_payables"] if payables_res else 0
 
-    # 4. Inventory Value
-    item_pipeline = [
-        {"$match": {"account_id": account_id, "status": "active"}},
-        {"$group": {"_id": None, "total_inventory_value": {"$sum": {"$multiply": ["$current_stock", "$purchase_price"]}}}}
-    ]
-    inventory_res = list(db["items"].aggregate(item_pipeline))
-    inventory_value = inventory_res[0]["total_inventory_value"] if inventory_res else 0
+    # 4. Inventory Value: at purchase cost (app.core.valuation), item master prices until first valued
+    inventory_value = valued_inventory(db, account_id, session=session)
+    if inventory_value is None:
+        item_pipeline = [
+            {"$match": {"account_id": account_id, "status": "active"}},
+            {"$group": {"_id": None, "total_inventory_value": {"$sum": {"$multiply": ["$current_stock", "$purchase_price"]}}}}
+        ]
+        inventory_res = list(db["items"].aggregate(item_pipeline, session=session))
+        inventory_value = inventory_res[0]["total_inventory_value"] if inventory_res else 0
 
     # 5. Low stock & Quotations
     low_stock_count = db["items"].count_documents({
         "account_id": account_id, 
         "status": "active",
         "$expr": {"$lte": ["$current_stock", "$reorder_level"]}
-    })
+    }, session=session)
     quote_pending = db["quotations"].count_documents({
         "account_id": account_id, 
         "status": {"$in": ["draft", "sent"]}
-    })
+    }, session=session)
 
     # 6. Optimized Revenue Chart Data (One Pipeline)
     history_cutoff = datetime.utcnow() - timedelta(days=days)
@@ -94,7 +99,7 @@ def get_dashboard_stats(
         }},
         {"$sort": {"_id.year": 1, "_id.month": 1, "_id.day": 1}}
     ]
-    chart_results = list(db["invoices"].aggregate(chart_pipeline))
+    chart_results = list(db["invoices"].aggregate(chart_pipeline, session=session))
     
     # Map results to contiguous days
     revenue_map = {f"{r['_id']['year']}-{r['_id']['month']}-{r['_id']['day']}": r['daily_total'] for r in chart_results}
@@ -169,9 +174,10 @@ def get_recent_activity(
 @router.get("/report/summary")
 def download_summary_report(
     current_user: User = Depends(get_current_active_user),
-    db=Depends(get_db)
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
 ):
-    stats = get_dashboard_stats(days=7, current_user=current_user, db=db)
+    stats = get_dashboard_stats(days=7, current_user=current_user, db=db, session=session)
     
     output = io.StringIO()
     writer = csv.writer(output)
@@ -189,6 +195,71 @@ def download_summary_report(
     response.headers["Content-Type"] = "text/csv"
     return response
 
+@router.get("/report/margin")
+def get_margin_report(
+    start_date: str = Query(None),
+    end_date: str = Query(None),
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
+):
+    """
+    Gross margin per item: invoiced revenue (before tax) against the cost of the
+    stock sold, read from the precomputed daily cost of sales.
+    """
+    account_id = current_user.account_id
+    try:
+        start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00')).replace(tzinfo=None) if start_date else None
+        end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00')).replace(tzinfo=None) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date, use ISO format (YYYY-MM-DD)")
+
+    match = {"account_id": account_id, "status": "active"}
+    if start_dt or end_dt:
+        match["invoice_date"] = {}
+        if start_dt:
+            match["invoice_date"]["$gte"] = start_dt
+        if end_dt:
+            match["invoice_date"]["$lte"] = end_dt
+    revenue = list(db["invoices"].aggregate([
+        {"$match": match},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": "$items.item_id",
+            "item_name": {"$first": "$items.item_name"},
+            "quantity": {"$sum": "$items.qty"},
+            "revenue": {"$sum": {"$multiply": ["$items.qty", "$items.rate"]}}
+        }}
+    ], session=session))
+    costs = cost_of_sales(db, account_id, start_dt, end_dt, session=session)
+
+    items = []
+    for row in revenue:
+        cost = costs.get(row["_id"], {}).get("cost", 0)
+        margin = row["revenue"] - cost
+        items.append({
+            "item_id": row["_id"],
+            "item_name": row["item_name"],
+            "quantity": row["quantity"],
+            "revenue": round(row["revenue"], 2),
+            "cost": round(cost, 2),
+            "margin": round(margin, 2),
+            "margin_percent": round(margin / row["revenue"] * 100, 2) if row["revenue"] else None
+        })
+    items.sort(key=lambda item: item["margin"], reverse=True)
+
+    total_revenue = sum(item["revenue"] for item in items)
+    total_cost = sum(item["cost"] for item in items)
+    return {
+        "start_date": start_dt,
+        "end_date": end_dt,
+        "revenue": round(total_revenue, 2),
+        "cost": round(total_cost, 2),
+        "margin": round(total_revenue - total_cost, 2),
+        "margin_percent": round((total_revenue - total_cost) / total_revenue * 100, 2) if total_revenue else None,
+        "items": items
+    }
+
 @router.get("/search")
 def global_search(
     q: str = Query(...),
@@ -301,7 +372,8 @@ def get_notifications(
 def get_top_selling_items(
     limit: int = Query(5),
     current_user: User = Depends(get_current_active_user),
-    db=Depends(get_db)
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
 ):
     """Get top selling items by revenue"""
     account_id = current_user.account_id
@@ -320,7 +392,7 @@ def get_top_selling_items(
         {"$limit": limit}
     ]
     
-    top_items = list(db["invoices"].aggregate(pipeline))
+    top_items = list(db["invoices"].aggregate(pipeline, session=session))
     
     return [{
         "item_id": item["_id"],
@@ -378,9 +450,10 @@ def get_calendar_events(
     month: int = Query(None),
     year: int = Query(None),
     current_user: User = Depends(get_current_active_user),
-    db=Depends(get_db)
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
 ):
-    """Get invoice due dates for calendar view"""
+    """Expected receipts and payments per due date for the calendar view"""
     account_id = current_user.account_id
     
     # Default to current month if not specified
@@ -388,36 +461,17 @@ def get_calendar_events(
     target_month = month if month else now.month
     target_year = year if year else now.year
     
-    # Get start and end of month
-    from calendar import monthrange
-    _, last_day = monthrange(target_year, target_month)
     start_of_month = datetime(target_year, target_month, 1)
-    end_of_month = datetime(target_year, target_month, last_day, 23, 59, 59)
-    
-    # Find invoices with due dates in this month
-    invoices = list(db["invoices"].find({
-        "account_id": account_id,
-        "status": "active",
-        "due_date": {"$gte": start_of_month, "$lte": end_of_month}
-    }))
+    end_of_month = datetime(target_year + target_month // 12, target_month % 12 + 1, 1)
     
-    # Group by date
-    events_by_date = {}
-    for inv in invoices:
-        if inv.get("due_date"):
-            date_key = inv["due_date"].strftime("%Y-%m-%d")
-            if date_key not in events_by_date:
-                events_by_date[date_key] = []
-            
-            events_by_date[date_key].append({
-                "invoice_id": inv.get("invoice_id"),
-                "invoice_number": inv.get("invoice_number"),
-                "customer_name": inv.get("customer_name"),
-                "amount": inv.get("grand_total", 0),
-                "payment_status": inv.get("payment_status", "unpaid")
-            })
-    
-    return events_by_date
+    # Open invoice and bill balances totalled per day in the database
+    forecast = cash_flow(db, account_id, start_of_month, end_of_month, "day", overdue=False, session=session)
+    return {
+        day["period_start"].strftime("%Y-%m-%d"): {
+            key: day[key] for key in ("inflow", "outflow", "net", "invoices", "bills")
+        }
+        for day in forecast["periods"]
+    }
 
 @router.get("/organization")
 def get_organization_info(
@@ -2,17 +2,41 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from typing import List, Optional
 from app.backend.models.invoice import Invoice, InvoiceCreate, InvoiceUpdate, InvoiceItem
 from app.backend.models.user import User
-from app.backend.deps import get_current_active_user, get_db, check_plan_limit
+from app.backend.deps import get_current_active_user, get_db, get_report_db, get_report_session, check_plan_limit, invalidates_aging
 from app.core.database import db as db_core
+from app.backend.idempotency import IdempotentRoute
+from app.core.balances import invoice_payment_update
+from app.core.numbering import reserve_invoice_numbers
+from app.core.line_edits import diff_lines, apply_stock_diff
+from app.core.stock import StockMovement, apply_movements, with_shards
+from app.core.locations import resolve_location, sale_availability, place_for_sale, LocationNotFound
+from app.core.reservations import (
+    reserve, held_by, take_source, consume, unreserve, release_source, available_stock, InsufficientStock
+)
 import uuid
 from datetime import datetime, date
 import pymongo
 from decimal import Decimal
 from bson import ObjectId
 
-router = APIRouter()
+def check_location_stock(db, account_id: str, location_id: str, item_docs: list, needed: dict):
+    """400 unless the location's stock plus unassigned stock covers needed (item_id -> quantity)."""
+    for item_id, (at_location, unassigned) in sale_availability(db, account_id, location_id, item_docs).items():
+        if at_location + unassigned < needed.get(item_id, 0):
+            name = next(doc.get("item_name", item_id) for doc in item_docs if doc["item_id"] == item_id)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Insufficient stock for {name} at this location. "
+                       f"Available: {round(at_location + unassigned, 6)}, Requested: {needed[item_id]}"
+            )
 
-@router.post("/", response_model=Invoice)
+# Retried POSTs with the same Idempotency-Key replay the first response
+router = APIRouter(route_class=IdempotentRoute)
+
+# Writes that change open balances drop the cached receivables aging; emails and reminders do not
+changes_balances = [Depends(invalidates_aging("receivables"))]
+
+@router.post("/", response_model=Invoice, dependencies=changes_balances)
 async def create_invoice(
     invoice_in: InvoiceCreate,
     current_user: User = Depends(get_current_active_user),
@@ -41,28 +65,15 @@ async def create_invoice(
                 detail=f"Customer not found with ID: {invoice_in.customer_id}"
             )
 
-        # 3. Robust Invoice Numbering
-        # Find the latest invoice to determine the next number
-        last_invoice = db["invoices"].find_one(
-            {"account_id": current_user.account_id},
-            sort=[("created_at", pymongo.DESCENDING)]
-        )
-        
-        new_num = 1
-        if last_invoice and "invoice_number" in last_invoice:
-            try:
-                # Attempt to extract numeric part from "INV-XXXX"
-                parts = last_invoice["invoice_number"].split('-')
-                if len(parts) > 1:
-                    new_num = int(parts[1]) + 1
-                else:
-                    new_num = current_count + 1
-            except (ValueError, IndexError):
-                new_num = current_count + 1
-        
-        invoice_number = f"INV-{str(new_num).zfill(4)}"
-
-        # 4. Stock Validation
+        # 3. Stock Validation: stock reserved by others is not available, stock
+        # held by the quotation being converted is. With locations, the selling
+        # location must also cover the quantity, drawing on unassigned stock.
+        try:
+            location_id = resolve_location(db, current_user.account_id, invoice_in.location_id)
+        except LocationNotFound as e:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        held = held_by(db, current_user.account_id, "quotation", invoice_in.quotation_id) if invoice_in.quotation_id else {}
+        item_docs = []
         for item in invoice_in.items:
             item_doc = db["items"].find_one({
                 "item_id": item.item_id, 
@@ -74,12 +85,22 @@ async def create_invoice(
                     detail=f"Item {item.item_name} not found"
                 )
             
-            current_stock = item_doc.get("current_stock", 0)
+            with_shards(db, current_user.account_id, [item_doc])
+            item_docs.append(item_doc)
+            current_stock = available_stock(item_doc) + held.get(item.item_id, 0)
             if current_stock < item.qty:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Insufficient stock for {item.item_name}. Available: {current_stock}, Requested: {item.qty}"
                 )
+        needed = {}
+        for item in invoice_in.items:
+            needed[item.item_id] = needed.get(item.item_id, 0) + item.qty
+        if location_id:
+            check_location_stock(db, current_user.account_id, location_id, item_docs, needed)
+
+        # 4. Invoice Numbering (shared counter, so recurring batches never collide)
+        invoice_number = reserve_invoice_numbers(db, current_user.account_id)[0]
 
         # 5. Prepare Document
         invoice_doc = invoice_in.dict()
@@ -88,6 +109,7 @@ async def create_invoice(
             "account_id": current_user.account_id,
             "user_id": current_user.user_id,
             "invoice_number": invoice_number,
+            "location_id": location_id,
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
             "status": "active",
@@ -149,30 +171,23 @@ async def create_invoice(
 
         # 7. Finalize Creation and Stock Updates
         db["invoices"].insert_one(invoice_doc)
-        
-        for item in invoice_in.items:
-            db["items"].update_one(
-                {"item_id": item.item_id, "account_id": current_user.account_id},
-                {
-                    "$inc": {"current_stock": -item.qty},
-                    "$set": {"updated_at": datetime.utcnow()}
-                }
-            )
-            
-            # Stock Transaction Log
-            stock_transaction = {
-                "transaction_id": str(uuid.uuid4()),
-                "item_id": item.item_id,
-                "item_name": item.item_name,
-                "invoice_id": invoice_doc["invoice_id"],
-                "invoice_number": invoice_number,
-                "account_id": current_user.account_id,
-                "transaction_type": "out",
-                "quantity": item.qty,
-                "transaction_date": datetime.utcnow(),
-                "notes": f"Sold via invoice {invoice_number}"
-            }
-            db["stock_transactions"].insert_one(stock_transaction)
+        if location_id:
+            place_for_sale(db, current_user.account_id, location_id, item_docs, needed)
+        
+        # A converted quotation's reservation is released in the same update as the deduction
+        reserved = take_source(db, current_user.account_id, "quotation", invoice_in.quotation_id) if invoice_in.quotation_id else {}
+        used = consume([item.dict() for item in invoice_in.items], reserved)
+        apply_movements(
+            db, current_user.account_id,
+            [
+                StockMovement(item.item_id, item.item_name, -item.qty, reserved=held_qty)
+                for item, held_qty in zip(invoice_in.items, used)
+            ],
+            {"invoice_id": invoice_doc["invoice_id"], "invoice_number": invoice_number},
+            f"Sold via invoice {invoice_number}",
+            location_id=location_id
+        )
+        unreserve(db, current_user.account_id, reserved)
 
         # 8. Create Payment Record (if any amount received)
         if invoice_doc.get("amount_received", 0) > 0:
@@ -191,6 +206,13 @@ async def create_invoice(
             }
             db["payments"].insert_one(payment_doc)
 
+        # 9. Customer owes the invoice total less what was received with it
+        db["customers"].update_one(
+            {"customer_id": invoice_in.customer_id, "account_id": current_user.account_id},
+            {"$inc": {"current_balance": invoice_doc["grand_total"] - invoice_doc.get("amount_received", 0)},
+             "$set": {"updated_at": datetime.utcnow()}}
+        )
+
         return db_core.serialize_doc(invoice_doc)
         
     except HTTPException:
@@ -345,7 +367,7 @@ def get_invoice_by_number(
             detail="Error retrieving invoice"
         )
 
-@router.put("/{invoice_id}", response_model=Invoice)
+@router.put("/{invoice_id}", response_model=Invoice, dependencies=changes_balances)
 async def update_invoice(
     invoice_id: str,
     invoice_in: InvoiceUpdate,
@@ -374,65 +396,60 @@ async def update_invoice(
         update_data = invoice_in.dict(exclude_unset=True)
         update_data["updated_at"] = datetime.utcnow()
 
-        # Handle Item and Stock Updates
+        # Handle Item and Stock Updates: only the net change per item touches stock.
+        # A duplicated invoice (stock_pending) holds a reservation and has deducted
+        # nothing yet; saving its lines converts the reservation into the deduction.
         if "items" in update_data:
-            # 1. Revert stock for all OLD items
-            for old_item in old_invoice.get("items", []):
-                db["items"].update_one(
-                    {"item_id": old_item["item_id"], "account_id": current_user.account_id},
-                    {"$inc": {"current_stock": old_item["qty"]}}
+            pending = old_invoice.get("stock_pending", False)
+            changes = diff_lines([] if pending else old_invoice.get("items", []), update_data["items"])
+            held = held_by(db, current_user.account_id, "invoice", invoice_id) if pending else {}
+            increases = [change for change in changes if change.delta > 0]
+            if increases:
+                item_docs = with_shards(db, current_user.account_id, list(db["items"].find(
+                    {"item_id": {"$in": [change.item_id for change in increases]}, "account_id": current_user.account_id},
+                    projection={"item_id": 1, "item_name": 1, "current_stock": 1, "reserved_stock": 1, "stock_shards": 1}
+                )))
+                stock = {doc["item_id"]: available_stock(doc) + held.get(doc["item_id"], 0) for doc in item_docs}
+                for change in increases:
+                    if change.item_id not in stock:
+                        raise HTTPException(
+                            status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"Item {change.item_name} not found"
+                        )
+                    # What this invoice already holds counts as available
+                    available = stock[change.item_id] + change.old_qty
+                    if available < change.new_qty:
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Insufficient stock for {change.item_name}. Available: {available}, Requested: {change.new_qty}"
+                        )
+                # The location already gave up what this invoice deducted; it must cover the increase
+                if old_invoice.get("location_id"):
+                    increased = {change.item_id: change.delta for change in increases}
+                    check_location_stock(db, current_user.account_id, old_invoice["location_id"], item_docs, increased)
+                    place_for_sale(db, current_user.account_id, old_invoice["location_id"], item_docs, increased)
+            if pending:
+                reserved = take_source(db, current_user.account_id, "invoice", invoice_id)
+                used = consume(update_data["items"], reserved)
+                apply_movements(
+                    db, current_user.account_id,
+                    [
+                        StockMovement(item["item_id"], item["item_name"], -item["qty"], reserved=held_qty)
+                        for item, held_qty in zip(update_data["items"], used)
+                    ],
+                    {"invoice_id": invoice_id, "invoice_number": old_invoice.get("invoice_number")},
+                    f"Sold via invoice {old_invoice.get('invoice_number')}",
+                    location_id=old_invoice.get("location_id")
                 )
-                # Log Reversal
-                db["stock_transactions"].insert_one({
-                    "transaction_id": str(uuid.uuid4()),
-                    "item_id": old_item["item_id"],
-                    "item_name": old_item["item_name"],
-                    "invoice_id": invoice_id,
-                    "account_id": current_user.account_id,
-                    "transaction_type": "in",
-                    "quantity": old_item["qty"],
-                    "transaction_date": datetime.utcnow(),
-                    "notes": f"Stock reverted for invoice update: {old_invoice.get('invoice_number')}"
-                })
-
-            # 2. Validate and Deduct stock for NEW items
-            for new_item in update_data["items"]:
-                item_doc = db["items"].find_one({
-                    "item_id": new_item["item_id"], 
-                    "account_id": current_user.account_id
-                })
-                if not item_doc:
-                    # Rolling back might be complex here, but since we are in a try/except, 
-                    # we should ideally do this in a transaction. 
-                    # For now, we raise error and user has to fix.
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail=f"Item {new_item['item_name']} not found"
-                    )
-                
-                if item_doc.get("current_stock", 0) < new_item["qty"]:
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail=f"Insufficient stock for {new_item['item_name']}. Available: {item_doc.get('current_stock', 0)}, Requested: {new_item['qty']}"
-                    )
-                
-                db["items"].update_one(
-                    {"item_id": new_item["item_id"], "account_id": current_user.account_id},
-                    {"$inc": {"current_stock": -new_item["qty"]}}
+                unreserve(db, current_user.account_id, reserved)
+                update_data["stock_pending"] = False
+            else:
+                apply_stock_diff(
+                    db, current_user.account_id, changes, -1,
+                    {"invoice_id": invoice_id, "invoice_number": old_invoice.get("invoice_number")},
+                    f"Stock adjusted for invoice update: {old_invoice.get('invoice_number')}",
+                    location_id=old_invoice.get("location_id")
                 )
-                
-                # Log New Deduction
-                db["stock_transactions"].insert_one({
-                    "transaction_id": str(uuid.uuid4()),
-                    "item_id": new_item["item_id"],
-                    "item_name": new_item["item_name"],
-                    "invoice_id": invoice_id,
-                    "account_id": current_user.account_id,
-                    "transaction_type": "out",
-                    "quantity": new_item["qty"],
-                    "transaction_date": datetime.utcnow(),
-                    "notes": f"Stock deducted for invoice update: {old_invoice.get('invoice_number')}"
-                })
 
         # Handle customer name snapshot if customer_id changed
         if "customer_id" in update_data and update_data["customer_id"] != old_invoice["customer_id"]:
@@ -460,6 +477,19 @@ async def update_invoice(
         
         if update_data:
             db["invoices"].update_one(query, {"$set": update_data})
+
+        # Customer balances follow the invoice total (and the invoice, if it changed hands)
+        old_total = old_invoice.get("grand_total", 0)
+        new_total = update_data.get("grand_total", old_total)
+        new_customer = update_data.get("customer_id", old_invoice["customer_id"])
+        balance_changes = [(old_invoice["customer_id"], -old_total), (new_customer, new_total)] \
+            if new_customer != old_invoice["customer_id"] else [(new_customer, new_total - old_total)]
+        for customer_id, change in balance_changes:
+            if change:
+                db["customers"].update_one(
+                    {"customer_id": customer_id, "account_id": current_user.account_id},
+                    {"$inc": {"current_balance": change}, "$set": {"updated_at": datetime.utcnow()}}
+                )
             
         # Fetch and return the updated invoice
         updated_invoice = db["invoices"].find_one(query)
@@ -480,7 +510,7 @@ async def update_invoice(
             detail=f"Error updating invoice: {str(e)}"
         )
 
-@router.delete("/{invoice_id}")
+@router.delete("/{invoice_id}", dependencies=changes_balances)
 def delete_invoice(
     invoice_id: str,
     current_user: User = Depends(get_current_active_user),
@@ -505,41 +535,17 @@ def delete_invoice(
                 detail="Invoice is already cancelled"
             )
 
-        # 1. Revert stock
-        for item in invoice.get("items", []):
-            db["items"].update_one(
-                {
-                    "item_id": item["item_id"], 
-                    "account_id": current_user.account_id
-                },
-                {
-                    "$inc": {"current_stock": item["qty"]},
-                    "$set": {"updated_at": datetime.utcnow()}
-                }
+        # 1. Revert stock (a duplicated invoice that was never saved only held a reservation)
+        if invoice.get("stock_pending"):
+            release_source(db, current_user.account_id, "invoice", invoice_id)
+        else:
+            apply_movements(
+                db, current_user.account_id,
+                [StockMovement(item["item_id"], item["item_name"], item["qty"]) for item in invoice.get("items", [])],
+                {"invoice_id": invoice_id, "invoice_number": invoice.get("invoice_number")},
+                f"Stock reverted due to invoice cancellation: {invoice.get('invoice_number')}",
+                location_id=invoice.get("location_id")
             )
-            
-            # Create stock transaction record for reversal
-            stock_transaction = {
-                "transaction_id": str(uuid.uuid4()),
-                "item_id": item["item_id"],
-                "item_name": item["item_name"],
-                "invoice_id": invoice_id,
-                "invoice_number": invoice.get("invoice_number"),
-                "account_id": current_user.account_id,
-                "transaction_type": "in",
-                "quantity": item["qty"],
-                "previous_stock": db["items"].find_one({
-                    "item_id": item["item_id"], 
-                    "account_id": current_user.account_id
-                }).get("current_stock", 0) - item["qty"],  # Subtract to get previous
-                "new_stock": db["items"].find_one({
-                    "item_id": item["item_id"], 
-                    "account_id": current_user.account_id
-                }).get("current_stock", 0),
-                "transaction_date": datetime.utcnow(),
-                "notes": f"Stock reverted due to invoice cancellation: {invoice.get('invoice_number')}"
-            }
-            db["stock_transactions"].insert_one(stock_transaction)
 
         # 2. Revert quotation status if applicable
         if invoice.get("quotation_id"):
@@ -569,7 +575,17 @@ def delete_invoice(
             }
         )
 
-        # 4. Mark related payments as cancelled
+        # 4. Mark related payments as cancelled; the customer no longer owes what was left
+        received = sum(
+            payment.get("amount", 0) for payment in db["payments"].find(
+                {"invoice_id": invoice_id, "account_id": current_user.account_id, "status": {"$ne": "cancelled"}},
+                projection={"amount": 1}
+            )
+        )
+        db["customers"].update_one(
+            {"customer_id": invoice["customer_id"], "account_id": current_user.account_id},
+            {"$inc": {"current_balance": -(invoice.get("grand_total", 0) - received)}, "$set": {"updated_at": datetime.utcnow()}}
+        )
         db["payments"].update_many(
             {
                 "invoice_id": invoice_id,
@@ -598,7 +614,7 @@ def delete_invoice(
             detail="Error cancelling invoice"
         )
 
-@router.post("/{invoice_id}/add-payment")
+@router.post("/{invoice_id}/add-payment", dependencies=changes_balances)
 def add_payment_to_invoice(
     invoice_id: str,
     payment_data: dict,
@@ -610,19 +626,6 @@ def add_payment_to_invoice(
     """
     try:
         query = {"invoice_id": invoice_id, "account_id": current_user.account_id}
-        invoice = db["invoices"].find_one(query)
-        
-        if not invoice:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Invoice not found"
-            )
-        
-        if invoice.get("status") == "cancelled":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Cannot add payment to a cancelled invoice"
-            )
         
         amount = payment_data.get("amount", 0)
         payment_method = payment_data.get("payment_method", "cash")
@@ -635,28 +638,36 @@ def add_payment_to_invoice(
                 detail="Payment amount must be greater than 0"
             )
         
-        # Calculate new balance
-        current_balance = invoice.get("balance_amount", invoice.get("grand_total", 0))
-        current_received = invoice.get("amount_received", 0)
+        # Apply the payment atomically; the filter guarantees it still fits the balance
+        # even when several payments for this invoice arrive at once
+        invoice = db["invoices"].find_one_and_update(
+            {
+                **query,
+                "status": {"$ne": "cancelled"},
+                "$expr": {"$gte": [{"$ifNull": ["$balance_amount", "$grand_total"]}, amount]}
+            },
+            invoice_payment_update(amount),
+            return_document=pymongo.ReturnDocument.AFTER
+        )
         
-        if amount > current_balance:
+        if not invoice:
+            current = db["invoices"].find_one(query, projection={"status": 1, "balance_amount": 1, "grand_total": 1})
+            if not current:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Invoice not found"
+                )
+            if current.get("status") == "cancelled":
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Cannot add payment to a cancelled invoice"
+                )
+            current_balance = current.get("balance_amount", current.get("grand_total", 0))
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Payment amount ({amount}) exceeds balance due ({current_balance})"
             )
         
-        new_balance = current_balance - amount
-        new_received = current_received + amount
-        
-        # Determine new payment status
-        if new_balance <= 0:
-            new_payment_status = "paid"
-            new_balance = 0
-        elif new_received > 0:
-            new_payment_status = "partial"
-        else:
-            new_payment_status = "unpaid"
-        
         # Create payment record
         payment = {
             "payment_id": str(uuid.uuid4()),
@@ -673,22 +684,16 @@ def add_payment_to_invoice(
             "created_at": datetime.utcnow()
         }
         db["payments"].insert_one(payment)
-        
-        # Update invoice
-        update_data = {
-            "payment_status": new_payment_status,
-            "amount_received": new_received,
-            "balance_amount": new_balance,
-            "updated_at": datetime.utcnow()
-        }
-        
-        db["invoices"].update_one(query, {"$set": update_data})
+        db["customers"].update_one(
+            {"customer_id": invoice.get("customer_id"), "account_id": current_user.account_id},
+            {"$inc": {"current_balance": -amount}, "$set": {"updated_at": datetime.utcnow()}}
+        )
         
         return {
             "message": "Payment added successfully",
             "payment_id": payment["payment_id"],
-            "new_balance": new_balance,
-            "new_payment_status": new_payment_status
+            "new_balance": invoice["balance_amount"],
+            "new_payment_status": invoice["payment_status"]
         }
         
     except HTTPException:
@@ -901,16 +906,18 @@ Best regards,
             detail=f"Failed to send reminder: {str(e)}"
         )
 
-@router.post("/{invoice_id}/duplicate")
+@router.post("/{invoice_id}/duplicate", dependencies=changes_balances)
 async def duplicate_invoice(
     invoice_id: str,
     current_user: User = Depends(get_current_active_user),
     db=Depends(get_db)
 ):
     """
-    Duplicate an existing invoice with stock validation.
-    IMPORTANT: Validates stock availability but does NOT deduct stock.
-    Stock will only be deducted when the duplicated invoice is finalized/saved.
+    Duplicate an existing invoice and reserve its stock.
+    IMPORTANT: Reserves stock but does NOT deduct it; other documents cannot sell the
+    reserved quantity meanwhile. Stock is deducted (and the reservation released in
+    the same update) when the duplicated invoice is saved, or the hold lapses after
+    RESERVATION_TTL_HOURS.
     """
     try:
         # 1. Fetch source invoice
@@ -921,58 +928,26 @@ async def duplicate_invoice(
         if not source_invoice:
             raise HTTPException(status_code=404, detail="Source invoice not found")
 
-        # 2. Validate stock availability for all items
-        stock_errors = []
-        for item in source_invoice.get("items", []):
-            item_doc = db["items"].find_one({
-                "item_id": item.get("item_id"),
-                "account_id": current_user.account_id
-            })
-            
-            if not item_doc:
-                stock_errors.append(f"Item '{item.get('item_name')}' not found in inventory")
-                continue
-            
-            current_stock = item_doc.get("current_stock", 0)
-            required_qty = item.get("qty", 0)
-            
-            if current_stock < required_qty:
-                stock_errors.append(
-                    f"Insufficient stock for '{item.get('item_name')}'. "
-                    f"Available: {current_stock}, Required: {required_qty}"
-                )
-        
-        # If any stock validation errors, return them
-        if stock_errors:
+        # 2. Reserve stock for all items (one guarded update per item)
+        new_invoice_id = str(uuid.uuid4())
+        try:
+            reservations = reserve(db, current_user.account_id, source_invoice.get("items", []), "invoice", new_invoice_id)
+        except InsufficientStock as e:
             raise HTTPException(
                 status_code=400,
                 detail={
                     "message": "Cannot duplicate invoice due to insufficient stock",
-                    "errors": stock_errors
+                    "errors": [str(e)]
                 }
             )
 
         # 3. Get next invoice number
-        last_invoice = db["invoices"].find_one(
-            {"account_id": current_user.account_id},
-            sort=[("created_at", pymongo.DESCENDING)]
-        )
-        
-        new_num = 1
-        if last_invoice and "invoice_number" in last_invoice:
-            try:
-                parts = last_invoice["invoice_number"].split('-')
-                if len(parts) > 1:
-                    new_num = int(parts[1]) + 1
-            except (ValueError, IndexError):
-                new_num = db["invoices"].count_documents({"account_id": current_user.account_id}) + 1
-        
-        invoice_number = f"INV-{str(new_num).zfill(4)}"
+        invoice_number = reserve_invoice_numbers(db, current_user.account_id)[0]
 
         # 4. Create new invoice based on source
         new_invoice = source_invoice.copy()
         new_invoice.update({
-            "invoice_id": str(uuid.uuid4()),
+            "invoice_id": new_invoice_id,
             "invoice_number": invoice_number,
             "invoice_date": datetime.utcnow().strftime("%Y-%m-%d"),
             "created_at": datetime.utcnow(),
@@ -980,7 +955,8 @@ async def duplicate_invoice(
             "payment_status": "unpaid",
             "amount_received": 0,
             "balance_amount": source_invoice.get("grand_total", 0),
-            "status": "active"
+            "status": "active",
+            "stock_pending": True
         })
         
         # Remove MongoDB internal ID and quotation reference
@@ -990,16 +966,29 @@ async def duplicate_invoice(
             del new_invoice["quotation_id"]
         if "quotation_number" in new_invoice:
             del new_invoice["quotation_number"]
+        # A copy is not a run of the source's recurring schedule
+        new_invoice.pop("schedule_id", None)
+        new_invoice.pop("schedule_run_at", None)
             
         # 5. Insert the duplicate (stock will be deducted when invoice is finalized)
         db["invoices"].insert_one(new_invoice)
+        db["customers"].update_one(
+            {"customer_id": new_invoice.get("customer_id"), "account_id": current_user.account_id},
+            {"$inc": {"current_balance": new_invoice.get("grand_total", 0)}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+        if reservations:
+            db["stock_reservations"].update_many(
+                {"account_id": current_user.account_id, "source_type": "invoice", "source_id": new_invoice_id},
+                {"$set": {"source_number": invoice_number}}
+            )
         
         return {
             "status": "success",
             "message": "Invoice duplicated successfully",
             "new_invoice_id": new_invoice["invoice_id"],
             "invoice_number": invoice_number,
-            "note": "Stock validated but not deducted. Complete the invoice to finalize stock changes."
+            "reserved_until": reservations[0]["expires_at"] if reservations else None,
+            "note": "Stock reserved but not deducted. Complete the invoice to finalize stock changes."
         }
         
     except HTTPException:
@@ -1014,7 +1003,8 @@ async def duplicate_invoice(
 @router.get("/stats")
 def get_invoice_stats(
     current_user: User = Depends(get_current_active_user),
-    db=Depends(get_db)
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
 ):
     """
     Get invoice statistics for dashboard
@@ -1034,21 +1024,21 @@ def get_invoice_stats(
         total_invoices = db["invoices"].count_documents({
             "account_id": account_id,
             "status": {"$ne": "cancelled"}
-        })
+        }, session=session)
         
         # Today's invoices
         today_invoices = list(db["invoices"].find({
             "account_id": account_id,
             "status": {"$ne": "cancelled"},
             "created_at": {"$gte": today_start, "$lte": today_end}
-        }))
+        }, session=session))
         
         # This month's invoices
         month_invoices = list(db["invoices"].find({
             "account_id": account_id,
             "status": {"$ne": "cancelled"},
             "created_at": {"$gte": month_start}
-        }))
+        }, session=session))
         
         # Calculate totals
         today_total = sum(inv.get("grand_total", 0) for inv in today_invoices)
@@ -1059,7 +1049,7 @@ def get_invoice_stats(
             "account_id": account_id,
             "status": {"$ne": "cancelled"},
             "payment_status": {"$in": ["unpaid", "partial"]}
-        }))
+        }, session=session))
         
         pending_amount = sum(inv.get("balance_amount", 0) for inv in pending_invoices)
         
@@ -1068,19 +1058,19 @@ def get_invoice_stats(
             "account_id": account_id,
             "status": {"$ne": "cancelled"},
             "payment_status": "unpaid"
-        })
+        }, session=session)
         
         partial_count = db["invoices"].count_documents({
             "account_id": account_id,
             "status": {"$ne": "cancelled"},
             "payment_status": "partial"
-        })
+        }, session=session)
         
         paid_count = db["invoices"].count_documents({
             "account_id": account_id,
             "status": {"$ne": "cancelled"},
             "payment_status": "paid"
-        })
+        }, session=session)
         
         return {
             "total_invoices": total_invoices,
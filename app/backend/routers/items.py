@@ -1,15 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
 from typing import List, Optional
-from app.backend.models.item import Item, ItemCreate, ItemUpdate
+from app.backend.models.item import Item, ItemCreate, ItemUpdate, ItemMovementPage, StockAsOf
+from app.backend.models.location import LocationStock
 from app.backend.models.user import User
-from app.backend.deps import get_current_active_user, get_db
+from app.backend.deps import get_current_active_user, get_db, get_report_db, get_report_session
 from app.core.database import db as db_core
+from app.core.sync import begin_sync, delta_query
+from app.core.config import settings
+from app.core.stock import STOCK_COUNTERS, with_shards, fold_stock_counters, invalidate_sharded_items, shards_changed_since
+from app.core.locations import stock_by_location
+from app.core.stock_log import meta_query, flatten, encode_cursor, cursor_query
+from app.core.snapshots import stock_as_of
 import uuid
-from datetime import datetime
+from datetime import datetime, date, time, timedelta
 import pymongo
 
 router = APIRouter()
 
+def validate_stock_shards(shards: int):
+    if not 0 <= shards <= settings.STOCK_SHARDS_MAX:
+        raise HTTPException(status_code=400, detail=f"stock_shards must be between 0 and {settings.STOCK_SHARDS_MAX}")
+
 @router.post("/", response_model=Item)
 async def create_item(
     item_in: ItemCreate,
@@ -20,36 +31,98 @@ async def create_item(
     from app.backend.deps import check_plan_limit
     current_count = db["items"].count_documents({"account_id": current_user.account_id, "status": {"$ne": "inactive"}})
     await check_plan_limit(current_user.account_id, "items", current_count)
+    validate_stock_shards(item_in.stock_shards)
 
     item_doc = item_in.dict()
     item_doc["item_id"] = str(uuid.uuid4())
     item_doc["account_id"] = current_user.account_id
     item_doc["created_at"] = datetime.utcnow()
+    item_doc["updated_at"] = item_doc["created_at"]
     
     # Initialize stock
     item_doc["current_stock"] = item_doc.get("opening_stock", 0.0)
 
     db["items"].insert_one(item_doc)
+    if item_doc["stock_shards"]:
+        invalidate_sharded_items(db, current_user.account_id)
     return db_core.serialize_doc(item_doc)
 
 @router.get("/", response_model=List[Item])
 def list_items(
+    request: Request,
+    response: Response,
     search: Optional[str] = None,
     category_id: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
     current_user: User = Depends(get_current_active_user),
     db=Depends(get_db)
 ):
-    query = {"account_id": current_user.account_id, "status": {"$ne": "inactive"}}
+    """List items. With `updated_since`, returns only records changed since then (including deactivated ones)."""
+    # Sharded items sell without touching their document: shard updates change the version too
+    sync_headers, not_modified = begin_sync(request, db["items"], current_user.account_id, related=db[STOCK_COUNTERS])
+    if not_modified:
+        return not_modified
+    response.headers.update(sync_headers)
+
+    if updated_since:
+        moved = shards_changed_since(db, current_user.account_id, updated_since)
+        query = delta_query(current_user.account_id, updated_since, {"item_id": {"$in": moved}} if moved else None)
+    else:
+        query = {"account_id": current_user.account_id, "status": {"$ne": "inactive"}}
     if search:
-        query["$or"] = [
+        query = {"$and": [query, {"$or": [
             {"item_name": {"$regex": search, "$options": "i"}},
             {"sku": {"$regex": search, "$options": "i"}},
-        ]
+        ]}]}
     if category_id:
         query["category_id"] = category_id
     
     items = list(db["items"].find(query).sort("item_name", pymongo.ASCENDING))
-    return db_core.serialize_list(items)
+    return db_core.serialize_list(with_shards(db, current_user.account_id, items))
+
+@router.get("/stock-as-of", response_model=StockAsOf)
+def get_stock_as_of(
+    as_of_date: date = Query(..., alias="date", description="Stock at the end of this day (UTC)"),
+    item_id: Optional[List[str]] = Query(None),
+    category_id: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
+):
+    """
+    Historical stock per item: the nearest stock snapshot adjusted by the movements
+    between it and the requested day, so only a bounded slice of history is read.
+    """
+    when = datetime.combine(as_of_date + timedelta(days=1), time.min)
+    item_ids = item_id
+    if category_id:
+        in_category = [
+            doc["item_id"] for doc in db["items"].find(
+                {"account_id": current_user.account_id, "category_id": category_id}, projection={"item_id": 1}, session=session
+            )
+        ]
+        item_ids = [i for i in item_ids if i in in_category] if item_ids else in_category
+        if not item_ids:
+            return {"as_of": when, "based_on": None, "items": []}
+
+    stock, based_on = stock_as_of(db, current_user.account_id, when, item_ids, session)
+    items = {
+        doc["item_id"]: doc for doc in db["items"].find(
+            {"account_id": current_user.account_id, "item_id": {"$in": list(stock)}},
+            projection={"item_id": 1, "item_name": 1, "sku": 1}, session=session
+        )
+    }
+    return {
+        "as_of": when,
+        "based_on": based_on,
+        "items": sorted(
+            (
+                {"item_id": item_id, "item_name": items[item_id].get("item_name", ""), "sku": items[item_id].get("sku", ""), "stock": qty}
+                for item_id, qty in stock.items() if item_id in items
+            ),
+            key=lambda row: row["item_name"]
+        )
+    }
 
 @router.get("/{item_id}", response_model=Item)
 def get_item(
@@ -60,7 +133,90 @@ def get_item(
     item = db["items"].find_one({"item_id": item_id, "account_id": current_user.account_id})
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    return db_core.serialize_doc(item)
+    return db_core.serialize_doc(with_shards(db, current_user.account_id, [item])[0])
+
+@router.get("/{item_id}/reservations")
+def list_item_reservations(
+    item_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """Active stock reservations on an item (quotations and unsaved duplicate invoices), soonest expiry first."""
+    reservations = db["stock_reservations"].find(
+        {"account_id": current_user.account_id, "item_id": item_id, "status": "active"}
+    ).sort("expires_at", pymongo.ASCENDING)
+    return db_core.serialize_list(list(reservations))
+
+@router.get("/{item_id}/movements", response_model=ItemMovementPage)
+def list_item_movements(
+    item_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    transaction_type: Optional[str] = None,
+    location_id: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
+):
+    """
+    Stock movement history of an item, newest first. Pages are keyset-paginated:
+    pass the returned next_cursor to get the following (older) page.
+    """
+    query = meta_query(current_user.account_id, item_id)
+    if date_from or date_to:
+        query["transaction_date"] = {}
+        if date_from:
+            query["transaction_date"]["$gte"] = date_from
+        if date_to:
+            query["transaction_date"]["$lte"] = date_to
+    if transaction_type:
+        query["transaction_type"] = transaction_type
+    if location_id:
+        query["location_id"] = location_id
+    if cursor:
+        try:
+            query = {"$and": [query, cursor_query(cursor)]}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    docs = list(
+        db["stock_transactions"].find(query, session=session)
+        .sort([("transaction_date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)])
+        .limit(limit + 1)
+    )
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return {
+        "movements": db_core.serialize_list([flatten(doc) for doc in docs[:limit]]),
+        "next_cursor": next_cursor
+    }
+
+@router.get("/{item_id}/locations", response_model=List[LocationStock])
+def list_item_locations(
+    item_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """Stock of an item per location; stock not placed at any location is listed with location_id null."""
+    item = db["items"].find_one({"item_id": item_id, "account_id": current_user.account_id})
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    total = with_shards(db, current_user.account_id, [item])[0].get("current_stock") or 0
+    names = {
+        loc["location_id"]: loc["name"]
+        for loc in db["locations"].find({"account_id": current_user.account_id}, projection={"location_id": 1, "name": 1})
+    }
+    return [
+        {
+            "item_id": item_id,
+            "item_name": item.get("item_name", ""),
+            "location_id": location_id,
+            "location_name": names.get(location_id, "") if location_id else "Unassigned",
+            "current_stock": stock
+        }
+        for location_id, stock in stock_by_location(db, current_user.account_id, item_id, total).items()
+    ]
 
 @router.put("/{item_id}", response_model=Item)
 def update_item(
@@ -76,12 +232,19 @@ def update_item(
         raise HTTPException(status_code=404, detail="Item not found")
 
     update_data = item_in.dict(exclude_unset=True)
+    if update_data.get("stock_shards") is not None:
+        validate_stock_shards(update_data["stock_shards"])
+
+    # Settle sharded counters first, so current_stock below is the full figure
+    if "stock_shards" in update_data or "opening_stock" in update_data:
+        fold_stock_counters(db, current_user.account_id, item_id)
+        old_item = db["items"].find_one(query)
     
     # If opening stock is updated, we might want to update current stock too
     # but only if there are no stock movements/transactions yet.
     if "opening_stock" in update_data:
         # Check if any stock transactions exist for this item
-        transaction_count = db["stock_transactions"].count_documents({"item_id": item_id, "account_id": current_user.account_id})
+        transaction_count = 1 if db["stock_transactions"].find_one(meta_query(current_user.account_id, item_id), projection={"_id": 1}) else 0
         
         curr = float(old_item.get("current_stock") or 0)
         old_open = float(old_item.get("opening_stock") or 0)
@@ -92,8 +255,10 @@ def update_item(
 
     update_data["updated_at"] = datetime.utcnow()
     db["items"].update_one(query, {"$set": update_data})
+    if "stock_shards" in update_data:
+        invalidate_sharded_items(db, current_user.account_id)
     
-    return db_core.serialize_doc(db["items"].find_one(query))
+    return db_core.serialize_doc(with_shards(db, current_user.account_id, [db["items"].find_one(query)])[0])
 
 @router.delete("/{item_id}")
 def delete_item(
@@ -104,6 +269,6 @@ def delete_item(
     # In a real app, check if item has transaction history
     db["items"].update_one(
         {"item_id": item_id, "account_id": current_user.account_id},
-        {"$set": {"status": "inactive"}}
+        {"$set": {"status": "inactive", "updated_at": datetime.utcnow()}}
     )
     return {"message": "Item deactivated"}
@@ -0,0 +1,175 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List
+from app.backend.models.location import (
+    Location, LocationCreate, LocationUpdate, LocationStock, StockTransfer, StockTransferCreate
+)
+from app.backend.models.user import User
+from app.backend.deps import get_current_active_user, get_db
+from app.core.database import db as db_core
+from app.backend.idempotency import IdempotentRoute
+from app.core.locations import LOCATION_TYPES, InsufficientLocationStock, transfer_stock
+from app.core.stock import with_shards
+import uuid
+from datetime import datetime
+import pymongo
+
+# Retried transfers with the same Idempotency-Key replay the first response
+router = APIRouter(route_class=IdempotentRoute)
+
+def validate_location(db, account_id: str, data: dict):
+    if "location_type" in data and data["location_type"] not in LOCATION_TYPES:
+        raise HTTPException(status_code=400, detail=f"Location type must be one of: {', '.join(LOCATION_TYPES)}")
+    if data.get("weaver_id"):
+        if not db["weavers"].find_one({"weaver_id": data["weaver_id"], "account_id": account_id}, projection={"_id": 1}):
+            raise HTTPException(status_code=404, detail=f"Weaver not found with ID: {data['weaver_id']}")
+
+def get_location_or_404(db, account_id: str, location_id: str):
+    location = db["locations"].find_one({"location_id": location_id, "account_id": account_id})
+    if not location:
+        raise HTTPException(status_code=404, detail=f"Location not found with ID: {location_id}")
+    return location
+
+@router.post("/", response_model=Location, status_code=status.HTTP_201_CREATED)
+def create_location(
+    location_in: LocationCreate,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """
+    Create a stock location. The account's first location becomes its default:
+    invoices that name no location sell from it, and stock not yet placed at any
+    location is transferred there as it is sold.
+    """
+    location_doc = location_in.dict()
+    validate_location(db, current_user.account_id, location_doc)
+    if db["locations"].find_one({"account_id": current_user.account_id, "name": location_in.name}, projection={"_id": 1}):
+        raise HTTPException(status_code=400, detail=f"Location '{location_in.name}' already exists")
+
+    now = datetime.utcnow()
+    if not db["locations"].find_one({"account_id": current_user.account_id, "is_default": True}, projection={"_id": 1}):
+        location_doc["is_default"] = True
+    elif location_doc["is_default"]:
+        db["locations"].update_many(
+            {"account_id": current_user.account_id, "is_default": True},
+            {"$set": {"is_default": False, "updated_at": now}}
+        )
+    location_doc.update({
+        "location_id": str(uuid.uuid4()),
+        "account_id": current_user.account_id,
+        "created_at": now,
+        "updated_at": now
+    })
+    db["locations"].insert_one(location_doc)
+    return db_core.serialize_doc(location_doc)
+
+@router.get("/", response_model=List[Location])
+def list_locations(
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    locations = db["locations"].find(
+        {"account_id": current_user.account_id, "status": {"$ne": "inactive"}}
+    ).sort("name", pymongo.ASCENDING)
+    return db_core.serialize_list(list(locations))
+
+@router.get("/{location_id}", response_model=Location)
+def get_location(
+    location_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    return db_core.serialize_doc(get_location_or_404(db, current_user.account_id, location_id))
+
+@router.get("/{location_id}/stock", response_model=List[LocationStock])
+def list_location_stock(
+    location_id: str,
+    include_zero: bool = False,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """Stock of every item held at a location."""
+    location = get_location_or_404(db, current_user.account_id, location_id)
+    query = {"account_id": current_user.account_id, "location_id": location_id}
+    if not include_zero:
+        query["current_stock"] = {"$ne": 0}
+    docs = db["item_locations"].find(query).sort("item_name", pymongo.ASCENDING)
+    return [{**doc, "location_name": location["name"]} for doc in docs]
+
+@router.put("/{location_id}", response_model=Location)
+def update_location(
+    location_id: str,
+    location_in: LocationUpdate,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    query = {"location_id": location_id, "account_id": current_user.account_id}
+    get_location_or_404(db, current_user.account_id, location_id)
+    update_data = location_in.dict(exclude_unset=True)
+    validate_location(db, current_user.account_id, update_data)
+
+    update_data["updated_at"] = datetime.utcnow()
+    if update_data.get("is_default"):
+        db["locations"].update_many(
+            {"account_id": current_user.account_id, "is_default": True, "location_id": {"$ne": location_id}},
+            {"$set": {"is_default": False, "updated_at": update_data["updated_at"]}}
+        )
+    db["locations"].update_one(query, {"$set": update_data})
+    return db_core.serialize_doc(db["locations"].find_one(query))
+
+@router.delete("/{location_id}")
+def delete_location(
+    location_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """Deactivate an empty location; stock must be transferred out first."""
+    get_location_or_404(db, current_user.account_id, location_id)
+    holding = db["item_locations"].count_documents(
+        {"account_id": current_user.account_id, "location_id": location_id, "current_stock": {"$ne": 0}}
+    )
+    if holding:
+        raise HTTPException(status_code=400, detail=f"Location still holds stock of {holding} items; transfer it first")
+    db["locations"].update_one(
+        {"location_id": location_id, "account_id": current_user.account_id},
+        {"$set": {"status": "inactive", "is_default": False, "updated_at": datetime.utcnow()}}
+    )
+    return {"message": "Location deactivated"}
+
+@router.post("/transfers", response_model=StockTransfer, status_code=status.HTTP_201_CREATED)
+def create_stock_transfer(
+    transfer_in: StockTransferCreate,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """
+    Move stock of one item between locations. Without from_location_id the stock
+    comes from the item's unassigned stock (e.g. to place stock from before locations).
+    """
+    if transfer_in.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    if transfer_in.from_location_id == transfer_in.to_location_id:
+        raise HTTPException(status_code=400, detail="Source and destination are the same location")
+
+    item = db["items"].find_one(
+        {"item_id": transfer_in.item_id, "account_id": current_user.account_id},
+        projection={"item_id": 1, "item_name": 1, "current_stock": 1, "stock_shards": 1}
+    )
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    from_location = (
+        get_location_or_404(db, current_user.account_id, transfer_in.from_location_id)
+        if transfer_in.from_location_id else None
+    )
+    to_location = get_location_or_404(db, current_user.account_id, transfer_in.to_location_id)
+    if to_location.get("status") == "inactive":
+        raise HTTPException(status_code=400, detail=f"Location {to_location['name']} is inactive")
+
+    try:
+        transfer = transfer_stock(
+            db, current_user.account_id, item, from_location, to_location, transfer_in.quantity, transfer_in.notes,
+            total=with_shards(db, current_user.account_id, [dict(item)])[0].get("current_stock", 0)
+        )
+    except InsufficientLocationStock as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    transfer["transactions"] = db_core.serialize_list(transfer["transactions"])
+    return transfer
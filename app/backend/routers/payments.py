@@ -1,14 +1,49 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional
-from app.backend.models.payment import Payment, PaymentCreate
+from app.backend.models.payment import Payment, PaymentCreate, PaymentAllocationRequest, PaymentAllocationResult
 from app.backend.models.user import User
-from app.backend.deps import get_current_active_user, get_db
+from app.backend.deps import get_current_active_user, get_db, invalidates_aging
 from app.core.database import db as db_core
+from app.backend.idempotency import IdempotentRoute
+from app.core.balances import invoice_payment_update
 import uuid
 from datetime import datetime
 import pymongo
 
-router = APIRouter()
+# Retried POSTs with the same Idempotency-Key replay the first response
+router = APIRouter(route_class=IdempotentRoute, dependencies=[Depends(invalidates_aging("receivables", "payables"))])
+
+def next_payment_sequence(db, account_id: str) -> int:
+    """Next PAY-#### sequence number for the account."""
+    last_pay = db["payments"].find_one(
+        {"account_id": account_id},
+        sort=[("created_at", pymongo.DESCENDING)]
+    )
+    new_num = 1
+    if last_pay and "payment_number" in last_pay:
+        try:
+            parts = last_pay["payment_number"].split('-')
+            new_num = int(parts[1]) + 1 if len(parts) > 1 else db["payments"].count_documents({"account_id": account_id}) + 1
+        except:
+            new_num = db["payments"].count_documents({"account_id": account_id}) + 1
+    return new_num
+
+# Rounding slack between amounts rounded to paise and stored float balances. The
+# allocation check and the write filter use the same value, so a line that passes
+# validation can only fail the write when another payment got there first.
+ALLOCATION_TOLERANCE = 0.005
+
+def as_datetime(value) -> datetime:
+    """Sort key for invoice dates, some of which are stored as ISO strings (duplicated invoices)."""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            return datetime.max
+    return value or datetime.max
+
+class AllocationConflict(Exception):
+    """An invoice's balance dropped below its allocation before the transaction committed."""
 
 @router.post("/", response_model=Payment)
 def create_payment(
@@ -21,19 +56,7 @@ def create_payment(
     Robust numbering and thread-safe balance updates.
     """
     # 1. Robust Payment Numbering
-    last_pay = db["payments"].find_one(
-        {"account_id": current_user.account_id},
-        sort=[("created_at", pymongo.DESCENDING)]
-    )
-    new_num = 1
-    if last_pay and "payment_number" in last_pay:
-        try:
-            parts = last_pay["payment_number"].split('-')
-            new_num = int(parts[1]) + 1 if len(parts) > 1 else db["payments"].count_documents({"account_id": current_user.account_id}) + 1
-        except:
-            new_num = db["payments"].count_documents({"account_id": current_user.account_id}) + 1
-    
-    pay_number = f"PAY-{str(new_num).zfill(4)}"
+    pay_number = f"PAY-{str(next_payment_sequence(db, current_user.account_id)).zfill(4)}"
 
     payment_doc = payment_in.dict()
     payment_doc.update({
@@ -46,38 +69,210 @@ def create_payment(
         payment_doc["payment_date"] = datetime.utcnow()
 
     # 2. Synchronize Balances
+    invoice = None
     if payment_in.payment_type == "receive":
+        if payment_in.invoice_id:
+            # Single atomic pipeline update: balance and status are derived server-side,
+            # so concurrent payments on one invoice cannot overwrite each other
+            invoice = db["invoices"].find_one_and_update(
+                {"invoice_id": payment_in.invoice_id, "account_id": current_user.account_id},
+                invoice_payment_update(payment_in.amount),
+                projection={"balance_amount": 1, "payment_status": 1},
+                return_document=pymongo.ReturnDocument.AFTER
+            )
+            if not invoice:
+                raise HTTPException(status_code=404, detail="Invoice not found")
+
         # Receving from Customer
         db["customers"].update_one(
             {"customer_id": payment_in.party_id, "account_id": current_user.account_id},
-            {"$inc": {"current_balance": -payment_in.amount}}
+            {"$inc": {"current_balance": -payment_in.amount}, "$set": {"updated_at": datetime.utcnow()}}
         )
-        
-        if payment_in.invoice_id:
-            invoice = db["invoices"].find_one({"invoice_id": payment_in.invoice_id, "account_id": current_user.account_id})
-            if invoice:
-                new_balance = max(0, invoice.get("balance_amount", 0) - payment_in.amount)
-                new_received = invoice.get("amount_received", 0) + payment_in.amount
-                p_status = "partial" if new_balance > 0 else "paid"
-                
-                db["invoices"].update_one(
-                    {"invoice_id": payment_in.invoice_id},
-                    {"$set": {
-                        "balance_amount": new_balance, 
-                        "amount_received": new_received,
-                        "payment_status": p_status,
-                        "updated_at": datetime.utcnow()
-                    }}
-                )
     else:
         # Paying to Weaver
         db["weavers"].update_one(
             {"weaver_id": payment_in.party_id, "account_id": current_user.account_id},
-            {"$inc": {"current_balance": -payment_in.amount}}
+            {"$inc": {"current_balance": -payment_in.amount}, "$set": {"updated_at": datetime.utcnow()}}
         )
 
     db["payments"].insert_one(payment_doc)
-    return db_core.serialize_doc(payment_doc)
+    result = db_core.serialize_doc(payment_doc)
+    if invoice:
+        result["invoice_balance"] = invoice["balance_amount"]
+        result["invoice_payment_status"] = invoice["payment_status"]
+    return result
+
+@router.post("/allocate", response_model=PaymentAllocationResult)
+def allocate_payment(
+    allocation_in: PaymentAllocationRequest,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """
+    Allocate one customer receipt across open invoices: FIFO by due date (oldest
+    first) unless an explicit split is given. Any remainder stays on the customer's
+    account as an advance. All invoice updates, payment records and the customer
+    balance change commit together in one transaction.
+    """
+    account_id = current_user.account_id
+    amount = round(allocation_in.amount, 2)
+    if amount <= 0:
+        raise HTTPException(status_code=400, detail="Payment amount must be greater than 0")
+
+    customer = db["customers"].find_one(
+        {"customer_id": allocation_in.party_id, "account_id": account_id},
+        projection={"customer_id": 1}
+    )
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+
+    # 1. Open invoices in one indexed query (account_id, customer_id, status, due_date)
+    open_query = {
+        "account_id": account_id,
+        "customer_id": allocation_in.party_id,
+        "status": "active",
+        "balance_amount": {"$gt": 0}
+    }
+    requested = {}
+    if allocation_in.allocations:
+        for line in allocation_in.allocations:
+            if line.amount <= 0:
+                raise HTTPException(status_code=400, detail="Allocation amounts must be greater than 0")
+            requested[line.invoice_id] = round(requested.get(line.invoice_id, 0) + line.amount, 2)
+        if sum(requested.values()) > amount + ALLOCATION_TOLERANCE:
+            raise HTTPException(status_code=400, detail="Allocations exceed the payment amount")
+        open_query["invoice_id"] = {"$in": list(requested)}
+
+    invoices = list(db["invoices"].find(
+        open_query,
+        projection={"invoice_id": 1, "invoice_number": 1, "due_date": 1, "invoice_date": 1, "balance_amount": 1}
+    ).sort([("due_date", pymongo.ASCENDING), ("invoice_date", pymongo.ASCENDING)]))
+
+    # 2. Decide the split
+    plan = []
+    if requested:
+        by_id = {inv["invoice_id"]: inv for inv in invoices}
+        missing = [invoice_id for invoice_id in requested if invoice_id not in by_id]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Invoices not open for this customer: {', '.join(missing)}")
+        for invoice_id, line_amount in requested.items():
+            invoice = by_id[invoice_id]
+            if line_amount > invoice["balance_amount"] + ALLOCATION_TOLERANCE:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Allocation ({line_amount}) exceeds balance due ({invoice['balance_amount']}) on {invoice['invoice_number']}"
+                )
+            plan.append((invoice, line_amount))
+    else:
+        # Invoices without a due date are aged from their invoice date
+        invoices.sort(key=lambda inv: as_datetime(inv.get("due_date") or inv.get("invoice_date")))
+        remaining = amount
+        for invoice in invoices:
+            if remaining <= 0:
+                break
+            line_amount = round(min(invoice["balance_amount"], remaining), 2)
+            plan.append((invoice, line_amount))
+            remaining = round(remaining - line_amount, 2)
+    unallocated = round(amount - sum(line_amount for _, line_amount in plan), 2)
+
+    # 3. Build payment records (one per invoice, plus the advance) and invoice updates
+    allocation_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    sequence = next_payment_sequence(db, account_id)
+    base_doc = {
+        "account_id": account_id,
+        "party_id": allocation_in.party_id,
+        "party_name": allocation_in.party_name,
+        "payment_date": allocation_in.payment_date or now,
+        "payment_mode": allocation_in.payment_mode,
+        "reference_number": allocation_in.reference_number,
+        "payment_type": "receive",
+        "notes": allocation_in.notes,
+        "allocation_id": allocation_id,
+        "created_at": now
+    }
+    payment_docs = []
+    invoice_ops = []
+    for invoice, line_amount in plan:
+        payment_docs.append({
+            **base_doc,
+            "payment_id": str(uuid.uuid4()),
+            "payment_number": f"PAY-{str(sequence + len(payment_docs)).zfill(4)}",
+            "amount": line_amount,
+            "invoice_id": invoice["invoice_id"]
+        })
+        invoice_ops.append(pymongo.UpdateOne(
+            {
+                "invoice_id": invoice["invoice_id"],
+                "account_id": account_id,
+                "status": "active",
+                "balance_amount": {"$gte": line_amount - ALLOCATION_TOLERANCE}
+            },
+            invoice_payment_update(line_amount)
+        ))
+    if unallocated > 0:
+        payment_docs.append({
+            **base_doc,
+            "payment_id": str(uuid.uuid4()),
+            "payment_number": f"PAY-{str(sequence + len(payment_docs)).zfill(4)}",
+            "amount": unallocated,
+            "invoice_id": None
+        })
+
+    updated = {}
+
+    def apply(session):
+        if invoice_ops:
+            result = db["invoices"].bulk_write(invoice_ops, ordered=True, session=session)
+            if result.matched_count != len(invoice_ops):
+                raise AllocationConflict()
+            for inv in db["invoices"].find(
+                {"account_id": account_id, "invoice_id": {"$in": [inv["invoice_id"] for inv, _ in plan]}},
+                projection={"invoice_id": 1, "balance_amount": 1, "payment_status": 1},
+                session=session
+            ):
+                updated[inv["invoice_id"]] = inv
+        db["payments"].insert_many([dict(doc) for doc in payment_docs], session=session)
+        db["customers"].update_one(
+            {"customer_id": allocation_in.party_id, "account_id": account_id},
+            {"$inc": {"current_balance": -amount}, "$set": {"updated_at": datetime.utcnow()}},
+            session=session
+        )
+
+    try:
+        db_core.run_in_transaction(db.client, apply)
+    except AllocationConflict:
+        raise HTTPException(
+            status_code=409,
+            detail="One or more invoices were paid while allocating. Please review and retry."
+        )
+
+    # 4. Breakdown
+    lines = []
+    for doc in payment_docs:
+        line = {"payment_id": doc["payment_id"], "payment_number": doc["payment_number"], "amount": doc["amount"]}
+        if doc["invoice_id"]:
+            invoice = next(inv for inv, _ in plan if inv["invoice_id"] == doc["invoice_id"])
+            after = updated.get(doc["invoice_id"], {})
+            line.update({
+                "invoice_id": invoice["invoice_id"],
+                "invoice_number": invoice.get("invoice_number"),
+                "due_date": invoice.get("due_date"),
+                "balance_before": invoice["balance_amount"],
+                "balance_after": after.get("balance_amount"),
+                "payment_status": after.get("payment_status")
+            })
+        lines.append(line)
+
+    return {
+        "allocation_id": allocation_id,
+        "party_id": allocation_in.party_id,
+        "total_amount": amount,
+        "allocated_amount": round(amount - unallocated, 2),
+        "unallocated_amount": unallocated,
+        "strategy": "explicit" if requested else "fifo",
+        "lines": lines
+    }
 
 @router.get("/", response_model=List[Payment])
 def list_payments(
@@ -103,7 +298,8 @@ def delete_payment(
 ):
     """Delete a payment and REVERT all balance changes."""
     query = {"payment_id": payment_id, "account_id": current_user.account_id}
-    payment = db["payments"].find_one(query)
+    # Delete first so two concurrent deletes cannot both revert the balances
+    payment = db["payments"].find_one_and_delete(query)
     if not payment:
         raise HTTPException(status_code=404, detail="Payment record not found")
 
@@ -112,33 +308,20 @@ def delete_payment(
         # Revert Customer Balance
         db["customers"].update_one(
             {"customer_id": payment["party_id"], "account_id": current_user.account_id},
-            {"$inc": {"current_balance": payment["amount"]}}
+            {"$inc": {"current_balance": payment["amount"]}, "$set": {"updated_at": datetime.utcnow()}}
         )
         
         # Revert Invoice Balance if applicable
         if payment.get("invoice_id"):
-            invoice = db["invoices"].find_one({"invoice_id": payment["invoice_id"]})
-            if invoice:
-                orig_received = max(0, invoice.get("amount_received", 0) - payment["amount"])
-                orig_balance = invoice.get("balance_amount", 0) + payment["amount"]
-                p_status = "unpaid" if orig_received == 0 else "partial"
-                if orig_balance >= invoice.get("grand_total", 0):
-                    p_status = "unpaid"
-                
-                db["invoices"].update_one(
-                    {"invoice_id": payment["invoice_id"]},
-                    {"$set": {
-                        "amount_received": orig_received,
-                        "balance_amount": orig_balance,
-                        "payment_status": p_status
-                    }}
-                )
+            db["invoices"].update_one(
+                {"invoice_id": payment["invoice_id"], "account_id": current_user.account_id},
+                invoice_payment_update(-payment["amount"])
+            )
     else:
         # Revert Weaver Balance
         db["weavers"].update_one(
             {"weaver_id": payment["party_id"], "account_id": current_user.account_id},
-            {"$inc": {"current_balance": payment["amount"]}}
+            {"$inc": {"current_balance": payment["amount"]}, "$set": {"updated_at": datetime.utcnow()}}
         )
 
-    db["payments"].delete_one(query)
     return {"message": "Payment record deleted and balances reverted"}
@@ -2,13 +2,18 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional
 from app.backend.models.purchase_bill import PurchaseBill, PurchaseBillCreate, PurchaseBillUpdate
 from app.backend.models.user import User
-from app.backend.deps import get_current_active_user, get_db
+from app.backend.deps import get_current_active_user, get_db, invalidates_aging
 from app.core.database import db as db_core
+from app.backend.idempotency import IdempotentRoute
+from app.core.line_edits import diff_lines, apply_stock_diff, line_rates
+from app.core.stock import StockMovement, apply_movements
+from app.core.locations import resolve_location, LocationNotFound
 import uuid
 from datetime import datetime
 import pymongo
 
-router = APIRouter()
+# Retried POSTs with the same Idempotency-Key replay the first response
+router = APIRouter(route_class=IdempotentRoute, dependencies=[Depends(invalidates_aging("payables"))])
 
 @router.post("/", response_model=PurchaseBill)
 def create_purchase_bill(
@@ -38,12 +43,18 @@ def create_purchase_bill(
             new_num = db["purchase_bills"].count_documents({"account_id": current_user.account_id}) + 1
     
     bill_number = f"BILL-{str(new_num).zfill(4)}"
+
+    try:
+        location_id = resolve_location(db, current_user.account_id, bill_in.location_id)
+    except LocationNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
     
     bill_doc = bill_in.dict()
     bill_doc.update({
         "bill_id": str(uuid.uuid4()),
         "account_id": current_user.account_id,
         "bill_number": bill_number,
+        "location_id": location_id,
         "created_at": datetime.utcnow(),
         "updated_at": datetime.utcnow(),
         "balance_amount": bill_in.total_amount,
@@ -53,33 +64,17 @@ def create_purchase_bill(
     # 2. Update weaver outstanding balance
     db["weavers"].update_one(
         {"weaver_id": bill_in.weaver_id, "account_id": current_user.account_id},
-        {"$inc": {"current_balance": bill_doc["total_amount"]}}
+        {"$inc": {"current_balance": bill_doc["total_amount"]}, "$set": {"updated_at": datetime.utcnow()}}
     )
     
     # 3. Increment Stock and Log Transactions
-    for item in bill_in.items:
-        db["items"].update_one(
-            {"item_id": item.item_id, "account_id": current_user.account_id},
-            {
-                "$inc": {"current_stock": item.qty},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
-        
-        # Stock Transaction Log
-        stock_transaction = {
-            "transaction_id": str(uuid.uuid4()),
-            "item_id": item.item_id,
-            "item_name": item.item_name,
-            "bill_id": bill_doc["bill_id"],
-            "bill_number": bill_number,
-            "account_id": current_user.account_id,
-            "transaction_type": "in",
-            "quantity": item.qty,
-            "transaction_date": datetime.utcnow(),
-            "notes": f"Purchased via bill {bill_number}"
-        }
-        db["stock_transactions"].insert_one(stock_transaction)
+    apply_movements(
+        db, current_user.account_id,
+        [StockMovement(item.item_id, item.item_name, item.qty, unit_cost=item.rate) for item in bill_in.items],
+        {"bill_id": bill_doc["bill_id"], "bill_number": bill_number},
+        f"Purchased via bill {bill_number}",
+        location_id=location_id
+    )
 
     db["purchase_bills"].insert_one(bill_doc)
     return db_core.serialize_doc(bill_doc)
@@ -119,16 +114,18 @@ def list_purchase_bills(
 
 @router.get("/overdue", response_model=List[PurchaseBill])
 def get_overdue_bills(
+    skip: int = 0,
+    limit: int = 100,
     current_user: User = Depends(get_current_active_user),
     db=Depends(get_db)
 ):
-    """Get all overdue bills"""
+    """Overdue bills, oldest due first (totals per weaver: /reports/payables-aging)"""
     query = {
         "account_id": current_user.account_id,
         "payment_status": {"$in": ["unpaid", "partial"]},
         "due_date": {"$lt": datetime.utcnow()}
     }
-    bills = list(db["purchase_bills"].find(query).sort("due_date", pymongo.ASCENDING))
+    bills = list(db["purchase_bills"].find(query).sort("due_date", pymongo.ASCENDING).skip(skip).limit(limit))
     return db_core.serialize_list(bills)
 
 @router.get("/{bill_id}", response_model=PurchaseBill)
@@ -168,49 +165,20 @@ async def update_purchase_bill(
             diff = update_data["total_amount"] - old_bill["total_amount"]
             db["weavers"].update_one(
                 {"weaver_id": old_bill["weaver_id"], "account_id": current_user.account_id},
-                {"$inc": {"current_balance": diff}}
+                {"$inc": {"current_balance": diff}, "$set": {"updated_at": datetime.utcnow()}}
             )
 
-        # Handle Item and Stock Updates
+        # Handle Item and Stock Updates: only the net change per item touches stock
         if "items" in update_data:
-            # 1. Revert stock for all OLD items
-            for old_item in old_bill.get("items", []):
-                db["items"].update_one(
-                    {"item_id": old_item["item_id"], "account_id": current_user.account_id},
-                    {"$inc": {"current_stock": -old_item["qty"]}} # Note: In Bills, inward stock is POSITIVE. So we INC with NEGATIVE qty to revert.
-                )
-                # Log Reversal
-                db["stock_transactions"].insert_one({
-                    "transaction_id": str(uuid.uuid4()),
-                    "item_id": old_item["item_id"],
-                    "item_name": old_item["item_name"],
-                    "bill_id": bill_id,
-                    "account_id": current_user.account_id,
-                    "transaction_type": "out", # Reverting an inward transaction is an 'out' movement
-                    "quantity": old_item["qty"],
-                    "transaction_date": datetime.utcnow(),
-                    "notes": f"Stock reverted for bill update: {old_bill.get('bill_number')}"
-                })
-
-            # 2. Add stock for NEW items
-            for new_item in update_data["items"]:
-                db["items"].update_one(
-                    {"item_id": new_item["item_id"], "account_id": current_user.account_id},
-                    {"$inc": {"current_stock": new_item["qty"]}},
-                    upsert=True # Just in case, though items should exist
-                )
-                # Log New Addition
-                db["stock_transactions"].insert_one({
-                    "transaction_id": str(uuid.uuid4()),
-                    "item_id": new_item["item_id"],
-                    "item_name": new_item["item_name"],
-                    "bill_id": bill_id,
-                    "account_id": current_user.account_id,
-                    "transaction_type": "in",
-                    "quantity": new_item["qty"],
-                    "transaction_date": datetime.utcnow(),
-                    "notes": f"Stock added for bill update: {old_bill.get('bill_number')}"
-                })
+            apply_stock_diff(
+                db, current_user.account_id,
+                diff_lines(old_bill.get("items", []), update_data["items"]), 1,
+                {"bill_id": bill_id, "bill_number": old_bill.get("bill_number")},
+                f"Stock adjusted for bill update: {old_bill.get('bill_number')}",
+                upsert=True, # Just in case, though items should exist
+                location_id=old_bill.get("location_id"),
+                unit_costs=line_rates(update_data["items"])
+            )
 
         if update_data:
             db["purchase_bills"].update_one(query, {"$set": update_data})
@@ -237,10 +205,10 @@ def delete_purchase_bill(
     if not bill:
         raise HTTPException(status_code=404, detail="Purchase Bill not found")
     
-    # Adjust weaver balance
+    # Adjust weaver balance: payments made against the bill stay on record, so the whole bill comes off
     db["weavers"].update_one(
         {"weaver_id": bill["weaver_id"], "account_id": current_user.account_id},
-        {"$inc": {"current_balance": -bill["balance_amount"]}}
+        {"$inc": {"current_balance": -bill["total_amount"]}, "$set": {"updated_at": datetime.utcnow()}}
     )
     
     db["purchase_bills"].delete_one(query)
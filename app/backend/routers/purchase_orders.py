@@ -4,6 +4,8 @@ from app.backend.models.purchase_order import PurchaseOrder, PurchaseOrderCreate
 from app.backend.models.user import User
 from app.backend.deps import get_current_active_user, get_db
 from app.core.database import db as db_core
+from app.core.stock import StockMovement, apply_movements
+from app.core.locations import resolve_location, LocationNotFound
 import uuid
 from datetime import datetime
 import pymongo
@@ -115,10 +117,14 @@ async def update_purchase_order(
 def update_po_status(
     po_id: str,
     new_status: str,
+    location_id: Optional[str] = None,
     current_user: User = Depends(get_current_active_user),
     db=Depends(get_db)
 ):
-    """Update PO status: draft -> sent -> confirmed -> received"""
+    """
+    Update PO status: draft -> sent -> confirmed -> received. Received goods go to
+    location_id, else the PO's location, else the default location.
+    """
     query = {"po_id": po_id, "account_id": current_user.account_id}
     po = db["purchase_orders"].find_one(query)
     if not po:
@@ -131,26 +137,18 @@ def update_po_status(
     
     # If marking as received, update inventory and log transactions
     if new_status == "received":
-        for item in po["items"]:
-            db["items"].update_one(
-                {"item_id": item["item_id"], "account_id": current_user.account_id},
-                {"$inc": {"current_stock": item["qty"]}}
-            )
-            
-            # Stock Transaction Log
-            stock_transaction = {
-                "transaction_id": str(uuid.uuid4()),
-                "item_id": item["item_id"],
-                "item_name": item["item_name"],
-                "po_id": po_id,
-                "po_number": po.get("po_number"),
-                "account_id": current_user.account_id,
-                "transaction_type": "in",
-                "quantity": item["qty"],
-                "transaction_date": datetime.utcnow(),
-                "notes": f"Received via PO {po.get('po_number')}"
-            }
-            db["stock_transactions"].insert_one(stock_transaction)
+        try:
+            location_id = resolve_location(db, current_user.account_id, location_id or po.get("location_id"))
+        except LocationNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        apply_movements(
+            db, current_user.account_id,
+            [StockMovement(item["item_id"], item["item_name"], item["qty"], unit_cost=item.get("rate")) for item in po["items"]],
+            {"po_id": po_id, "po_number": po.get("po_number")},
+            f"Received via PO {po.get('po_number')}",
+            location_id=location_id
+        )
+        update_data["location_id"] = location_id
             
         update_data["received_qty"] = po.get("pending_qty", 0)
         update_data["pending_qty"] = 0.0
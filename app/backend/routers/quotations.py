@@ -4,12 +4,28 @@ from app.backend.models.quotation import Quotation, QuotationCreate, QuotationUp
 from app.backend.models.user import User
 from app.backend.deps import get_current_active_user, get_db
 from app.core.database import db as db_core
+from app.core.reservations import reserve, release_source, default_expiry, InsufficientStock
 import uuid
 from datetime import datetime
 import pymongo
 
 router = APIRouter()
 
+# A quotation in these states no longer holds stock
+RELEASED_STATUSES = {"declined", "converted"}
+
+def hold_stock(db, account_id: str, quote: dict):
+    """Reserve the quotation's lines until valid_until if it asks to hold stock."""
+    if not quote.get("reserve_stock") or quote.get("status") in RELEASED_STATUSES:
+        return
+    try:
+        reserve(
+            db, account_id, quote["items"], "quotation", quote["quotation_id"],
+            quote.get("quotation_number"), default_expiry(quote.get("valid_until"))
+        )
+    except InsufficientStock as e:
+        raise HTTPException(status_code=404 if e.available is None else 400, detail=str(e))
+
 @router.post("/", response_model=Quotation)
 async def create_quotation(
     quote_in: QuotationCreate,
@@ -31,6 +47,7 @@ async def create_quotation(
     quote_doc["quotation_number"] = quote_number
     quote_doc["created_at"] = datetime.utcnow()
 
+    hold_stock(db, current_user.account_id, quote_doc)
     db["quotations"].insert_one(quote_doc)
     return db_core.serialize_doc(quote_doc)
 
@@ -86,6 +103,19 @@ async def update_quotation(
         if customer:
             update_data["customer_name"] = customer.get("customer_name", "")
 
+    # Re-hold stock to match the new lines, validity and status
+    if {"items", "valid_until", "status", "reserve_stock"} & update_data.keys():
+        release_source(db, current_user.account_id, "quotation", quotation_id)
+        try:
+            hold_stock(db, current_user.account_id, {**old_quote, **update_data})
+        except HTTPException:
+            # Keep the previous hold if the edited quotation cannot be covered
+            try:
+                hold_stock(db, current_user.account_id, old_quote)
+            except HTTPException:
+                pass
+            raise
+
     if update_data:
         db["quotations"].update_one(query, {"$set": update_data})
     
@@ -98,6 +128,7 @@ def delete_quotation(
     db=Depends(get_db)
 ):
     db["quotations"].delete_one({"quotation_id": quotation_id, "account_id": current_user.account_id})
+    release_source(db, current_user.account_id, "quotation", quotation_id)
     return {"message": "Quotation deleted"}
 
 @router.post("/{quotation_id}/email")
@@ -213,7 +244,8 @@ async def duplicate_quotation(
             "quote_date": datetime.utcnow().strftime("%Y-%m-%d"),
             "created_at": datetime.utcnow(),
             "updated_at": datetime.utcnow(),
-            "status": "active"
+            "status": "active",
+            "reserve_stock": False # The copy does not hold stock until asked to
         })
         
         # Remove MongoDB internal ID and invoice reference
@@ -0,0 +1,170 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional
+from app.backend.models.recurring_invoice import RecurringInvoice, RecurringInvoiceCreate, RecurringInvoiceUpdate
+from app.backend.models.invoice import Invoice
+from app.backend.models.user import User
+from app.backend.deps import get_current_active_user, get_db
+from app.core.database import db as db_core
+from app.backend.idempotency import IdempotentRoute
+from app.core.recurring import FREQUENCIES, first_occurrence_after
+import uuid
+from datetime import datetime
+import pymongo
+
+# Retried POSTs with the same Idempotency-Key replay the first response
+router = APIRouter(route_class=IdempotentRoute)
+
+SCHEDULE_STATUSES = ["active", "paused"]
+
+def validate_schedule(db, account_id: str, data: dict, existing: dict = None):
+    """Frequency, interval, status, dates, customer and items of a new or edited schedule."""
+    if "frequency" in data and data["frequency"] not in FREQUENCIES:
+        raise HTTPException(status_code=400, detail=f"Frequency must be one of: {', '.join(FREQUENCIES)}")
+    if "interval" in data and data["interval"] < 1:
+        raise HTTPException(status_code=400, detail="Interval must be at least 1")
+    if "status" in data and data["status"] not in SCHEDULE_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Status must be one of: {', '.join(SCHEDULE_STATUSES)}")
+    dates = {**(existing or {}), **data}
+    if dates.get("start_date") and dates.get("end_date") and dates["end_date"] < dates["start_date"]:
+        raise HTTPException(status_code=400, detail="End date cannot be before start date")
+
+    customer = None
+    if data.get("customer_id"):
+        customer = db["customers"].find_one(
+            {"customer_id": data["customer_id"], "account_id": account_id},
+            projection={"customer_name": 1}
+        )
+        if not customer:
+            raise HTTPException(status_code=404, detail=f"Customer not found with ID: {data['customer_id']}")
+
+    if "items" in data:
+        if not data["items"]:
+            raise HTTPException(status_code=400, detail="A recurring invoice needs at least one item")
+        item_ids = {item["item_id"] for item in data["items"]}
+        found = {
+            doc["item_id"] for doc in db["items"].find(
+                {"account_id": account_id, "item_id": {"$in": list(item_ids)}},
+                projection={"item_id": 1}
+            )
+        }
+        missing = [item["item_name"] for item in data["items"] if item["item_id"] not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Items not found: {', '.join(missing)}")
+    return customer
+
+@router.post("/", response_model=RecurringInvoice, status_code=status.HTTP_201_CREATED)
+def create_recurring_invoice(
+    schedule_in: RecurringInvoiceCreate,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """Create a recurring invoice schedule. The first invoice is generated on start_date."""
+    schedule_doc = schedule_in.dict()
+    customer = validate_schedule(db, current_user.account_id, schedule_doc)
+
+    now = datetime.utcnow()
+    schedule_doc.update({
+        "schedule_id": str(uuid.uuid4()),
+        "account_id": current_user.account_id,
+        "user_id": current_user.user_id,
+        "customer_name": customer.get("customer_name", schedule_in.customer_name),
+        "next_run_at": schedule_in.start_date,
+        # Monthly runs return to this day of the month after shorter months
+        "anchor_day": schedule_in.start_date.day,
+        "run_count": 0,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now
+    })
+    db["recurring_invoices"].insert_one(schedule_doc)
+    return db_core.serialize_doc(schedule_doc)
+
+@router.get("/", response_model=List[RecurringInvoice])
+def list_recurring_invoices(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    status_filter: Optional[str] = Query(None, description="active, paused or completed"),
+    customer_id: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """List recurring invoice schedules, next due first."""
+    query = {"account_id": current_user.account_id}
+    if status_filter:
+        query["status"] = status_filter
+    if customer_id:
+        query["customer_id"] = customer_id
+    schedules = db["recurring_invoices"].find(query).sort("next_run_at", pymongo.ASCENDING).skip(skip).limit(limit)
+    return db_core.serialize_list(list(schedules))
+
+@router.get("/{schedule_id}", response_model=RecurringInvoice)
+def get_recurring_invoice(
+    schedule_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    schedule = db["recurring_invoices"].find_one({"schedule_id": schedule_id, "account_id": current_user.account_id})
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Recurring invoice not found")
+    return db_core.serialize_doc(schedule)
+
+@router.get("/{schedule_id}/invoices", response_model=List[Invoice])
+def list_generated_invoices(
+    schedule_id: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """Invoices generated by a schedule, newest period first."""
+    invoices = db["invoices"].find(
+        {"schedule_id": schedule_id, "account_id": current_user.account_id}
+    ).sort("schedule_run_at", pymongo.DESCENDING).skip(skip).limit(limit)
+    return db_core.serialize_list(list(invoices))
+
+@router.put("/{schedule_id}", response_model=RecurringInvoice)
+def update_recurring_invoice(
+    schedule_id: str,
+    schedule_in: RecurringInvoiceUpdate,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """
+    Edit a schedule. Changing start_date restarts it from that date; resuming a
+    paused schedule continues from the next period instead of billing the missed ones.
+    """
+    query = {"schedule_id": schedule_id, "account_id": current_user.account_id}
+    existing = db["recurring_invoices"].find_one(query)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Recurring invoice not found")
+
+    update_data = schedule_in.dict(exclude_unset=True)
+    customer = validate_schedule(db, current_user.account_id, update_data, existing)
+    if customer:
+        update_data["customer_name"] = customer.get("customer_name", existing.get("customer_name"))
+
+    now = datetime.utcnow()
+    if update_data.get("start_date"):
+        update_data["next_run_at"] = update_data["start_date"]
+        update_data["anchor_day"] = update_data["start_date"].day
+    elif update_data.get("status") == "active" and existing.get("status") == "paused":
+        update_data["next_run_at"] = first_occurrence_after({**existing, **update_data}, now)
+    if update_data.get("status") == "active":
+        update_data["last_error"] = None
+    update_data["updated_at"] = now
+
+    # Dropping the lease lets an edit take effect on the next scheduler pass
+    db["recurring_invoices"].update_one(query, {"$set": update_data, "$unset": {"lease_owner": "", "lease_until": ""}})
+    return db_core.serialize_doc(db["recurring_invoices"].find_one(query))
+
+@router.delete("/{schedule_id}")
+def delete_recurring_invoice(
+    schedule_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_db)
+):
+    """Delete a schedule. Invoices it already generated are kept."""
+    result = db["recurring_invoices"].delete_one({"schedule_id": schedule_id, "account_id": current_user.account_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Recurring invoice not found")
+    return {"message": "Recurring invoice deleted successfully"}
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, Query, HTTPException
+from datetime import datetime, timedelta
+from app.backend.models.report import AgingReport, CashFlowForecast
+from app.backend.models.user import User
+from app.backend.deps import get_current_active_user, get_report_db, get_report_session
+from app.core.aging import aging_report
+from app.core.cashflow import cash_flow
+
+router = APIRouter()
+
+@router.get("/receivables-aging", response_model=AgingReport)
+def get_receivables_aging(
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
+):
+    """Open invoice balances per customer by days past due."""
+    return aging_report(db, current_user.account_id, "receivables", session=session)
+
+@router.get("/payables-aging", response_model=AgingReport)
+def get_payables_aging(
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
+):
+    """Open purchase bill balances per weaver by days past due."""
+    return aging_report(db, current_user.account_id, "payables", session=session)
+
+@router.get("/cash-flow-forecast", response_model=CashFlowForecast)
+def get_cash_flow_forecast(
+    weeks: int = Query(12, ge=1, le=52),
+    interval: str = Query("week", description="week or month"),
+    current_user: User = Depends(get_current_active_user),
+    db=Depends(get_report_db),
+    session=Depends(get_report_session)
+):
+    """Expected receipts (open invoices) and payments (open purchase bills) over the next weeks, by due date."""
+    if interval not in ("week", "month"):
+        raise HTTPException(status_code=400, detail="interval must be week or month")
+    start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    return cash_flow(db, current_user.account_id, start, start + timedelta(weeks=weeks), interval, session=session)
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from app.backend.models.user import User
-from app.backend.deps import get_current_active_user, get_db
+from app.backend.deps import get_current_active_user, get_db, enforce_rate_limit
 from app.core.plans import SUBSCRIPTION_PLANS
 from datetime import datetime
 
@@ -10,7 +10,7 @@ router = APIRouter()
 def get_plans():
     return SUBSCRIPTION_PLANS
 
-@router.get("/status")
+@router.get("/status", dependencies=[Depends(enforce_rate_limit)])
 def get_subscription_status(
     current_user: User = Depends(get_current_active_user),
     db=Depends(get_db)
@@ -42,7 +42,7 @@ def get_subscription_status(
         "created_at": created_at
     }
 
-@router.post("/upgrade")
+@router.post("/upgrade", dependencies=[Depends(enforce_rate_limit)])
 def upgrade_subscription(
     plan: str,
     current_user: User = Depends(get_current_active_user),
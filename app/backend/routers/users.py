@@ -3,7 +3,7 @@ from typing import List, Optional
 from app.backend.models.user import User, UserInvite
 from app.backend.deps import get_current_active_user, get_db
 from app.core.database import db as db_core
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async
 import uuid
 from datetime import datetime
 
@@ -51,7 +51,7 @@ async def create_user(
         "account_id": current_user.account_id,
         "email": user_in.email,
         "full_name": user_in.full_name,
-        "hashed_password": get_password_hash(user_in.password),
+        "hashed_password": await get_password_hash_async(user_in.password),
         "role": user_in.role,
         "is_active": True,
         "created_at": datetime.utcnow()
@@ -2,13 +2,16 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Optional
 from app.backend.models.vendor_payment import VendorPayment, VendorPaymentCreate, VendorPaymentUpdate
 from app.backend.models.user import User
-from app.backend.deps import get_current_active_user, get_db
+from app.backend.deps import get_current_active_user, get_db, invalidates_aging
 from app.core.database import db as db_core
+from app.backend.idempotency import IdempotentRoute
+from app.core.balances import bill_payment_update
 import uuid
 from datetime import datetime
 import pymongo
 
-router = APIRouter()
+# Retried POSTs with the same Idempotency-Key replay the first response
+router = APIRouter(route_class=IdempotentRoute, dependencies=[Depends(invalidates_aging("payables"))])
 
 @router.post("/", response_model=VendorPayment)
 def create_vendor_payment(
@@ -26,42 +29,30 @@ def create_vendor_payment(
     payment_doc["payment_number"] = payment_number
     payment_doc["created_at"] = datetime.utcnow()
     
+    # If payment is for a specific bill, update bill in one atomic pipeline update
+    bill = None
+    if payment_in.bill_id:
+        bill = db["purchase_bills"].find_one_and_update(
+            {"bill_id": payment_in.bill_id, "account_id": current_user.account_id},
+            bill_payment_update(payment_in.amount),
+            projection={"balance_amount": 1, "payment_status": 1},
+            return_document=pymongo.ReturnDocument.AFTER
+        )
+        if not bill:
+            raise HTTPException(status_code=404, detail="Purchase Bill not found")
+    
     # Update weaver balance
     db["weavers"].update_one(
         {"weaver_id": payment_in.weaver_id, "account_id": current_user.account_id},
-        {"$inc": {"current_balance": -payment_in.amount}}
+        {"$inc": {"current_balance": -payment_in.amount}, "$set": {"updated_at": datetime.utcnow()}}
     )
     
-    # If payment is for a specific bill, update bill
-    if payment_in.bill_id:
-        bill = db["purchase_bills"].find_one({
-            "bill_id": payment_in.bill_id, 
-            "account_id": current_user.account_id
-        })
-        if bill:
-            new_paid = bill.get("paid_amount", 0) + payment_in.amount
-            new_balance = bill["total_amount"] - new_paid
-            
-            # Determine payment status
-            if new_balance <= 0:
-                p_status = "paid"
-                new_balance = 0
-            elif new_paid > 0:
-                p_status = "partial"
-            else:
-                p_status = "unpaid"
-            
-            db["purchase_bills"].update_one(
-                {"bill_id": payment_in.bill_id},
-                {"$set": {
-                    "paid_amount": new_paid,
-                    "balance_amount": new_balance,
-                    "payment_status": p_status
-                }}
-            )
-    
     db["vendor_payments"].insert_one(payment_doc)
-    return db_core.serialize_doc(payment_doc)
+    result = db_core.serialize_doc(payment_doc)
+    if bill:
+        result["bill_balance"] = bill["balance_amount"]
+        result["bill_payment_status"] = bill["payment_status"]
+    return result
 
 @router.get("/", response_model=List[VendorPayment])
 def list_vendor_payments(
@@ -109,41 +100,22 @@ def delete_vendor_payment(
 ):
     """Delete payment and revert balances"""
     query = {"payment_id": payment_id, "account_id": current_user.account_id}
-    payment = db["vendor_payments"].find_one(query)
+    # Delete first so two concurrent deletes cannot both revert the balances
+    payment = db["vendor_payments"].find_one_and_delete(query)
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
     # Revert weaver balance
     db["weavers"].update_one(
         {"weaver_id": payment["weaver_id"], "account_id": current_user.account_id},
-        {"$inc": {"current_balance": payment["amount"]}}
+        {"$inc": {"current_balance": payment["amount"]}, "$set": {"updated_at": datetime.utcnow()}}
     )
     
     # Revert bill payment if applicable
     if payment.get("bill_id"):
-        bill = db["purchase_bills"].find_one({
-            "bill_id": payment["bill_id"],
-            "account_id": current_user.account_id
-        })
-        if bill:
-            new_paid = bill.get("paid_amount", 0) - payment["amount"]
-            new_balance = bill["total_amount"] - new_paid
-            
-            if new_balance <= 0:
-                p_status = "paid"
-            elif new_paid > 0:
-                p_status = "partial"
-            else:
-                p_status = "unpaid"
-            
-            db["purchase_bills"].update_one(
-                {"bill_id": payment["bill_id"]},
-                {"$set": {
-                    "paid_amount": new_paid,
-                    "balance_amount": new_balance,
-                    "payment_status": p_status
-                }}
-            )
+        db["purchase_bills"].update_one(
+            {"bill_id": payment["bill_id"], "account_id": current_user.account_id},
+            bill_payment_update(-payment["amount"])
+        )
     
-    db["vendor_payments"].delete_one(query)
     return {"message": "Payment deleted successfully"}
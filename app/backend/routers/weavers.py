@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from typing import List, Optional
 from app.backend.models.weaver import Weaver, WeaverCreate, WeaverUpdate
 from app.backend.models.user import User
 from app.backend.deps import get_current_active_user, get_db
 from app.core.database import db as db_core
+from app.core.sync import begin_sync, delta_query
 import uuid
 from datetime import datetime
 import pymongo
@@ -27,6 +28,7 @@ def create_weaver(
     weaver_doc["account_id"] = current_user.account_id
     weaver_doc["weaver_code"] = new_code
     weaver_doc["created_at"] = datetime.utcnow()
+    weaver_doc["updated_at"] = weaver_doc["created_at"]
     
     # Initialize balance
     weaver_doc["current_balance"] = weaver_doc.get("opening_balance", 0.0)
@@ -36,13 +38,25 @@ def create_weaver(
 
 @router.get("/", response_model=List[Weaver])
 def list_weavers(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
+    updated_since: Optional[datetime] = None,
     current_user: User = Depends(get_current_active_user),
     db=Depends(get_db)
 ):
-    query = {"account_id": current_user.account_id, "status": {"$ne": "inactive"}}
+    """List weavers. With `updated_since`, returns only records changed since then (including deactivated ones)."""
+    sync_headers, not_modified = begin_sync(request, db["weavers"], current_user.account_id)
+    if not_modified:
+        return not_modified
+    response.headers.update(sync_headers)
+
+    if updated_since:
+        query = delta_query(current_user.account_id, updated_since)
+    else:
+        query = {"account_id": current_user.account_id, "status": {"$ne": "inactive"}}
     if search:
         query["$or"] = [
             {"weaver_name": {"$regex": search, "$options": "i"}},
@@ -77,6 +91,7 @@ def update_weaver(
 
     update_data = weaver_in.dict(exclude_unset=True)
     if update_data:
+        update_data["updated_at"] = datetime.utcnow()
         db["weavers"].update_one(query, {"$set": update_data})
         weaver = db["weavers"].find_one(query)
     
@@ -93,7 +108,7 @@ def delete_weaver(
     # Or actually, the delete endpoint can just set status='inactive'
     # But usually HTTP DELETE implies removal. I will use Soft Delete logic here.
     query = {"weaver_id": weaver_id, "account_id": current_user.account_id}
-    result = db["weavers"].update_one(query, {"$set": {"status": "inactive"}})
+    result = db["weavers"].update_one(query, {"$set": {"status": "inactive", "updated_at": datetime.utcnow()}})
     if result.modified_count == 0:
          raise HTTPException(status_code=404, detail="Weaver not found or already inactive")
     return {"message": "Weaver deactivated successfully"}
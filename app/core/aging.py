@@ -0,0 +1,138 @@
+"""
+Receivables and payables aging.
+
+Open balances are grouped per party and by how far past due they are:
+not yet due, 0-30, 31-60, 61-90 and 90+ days. One pipeline per report does it,
+matching on the (account_id, payment_status, due_date) index:
+
+    receivables   invoices.balance_amount per customer (cancelled invoices excluded)
+    payables      purchase_bills.balance_amount per weaver
+
+Reports are cached per worker for AGING_CACHE_SECONDS under the tenant's report
+version (report_versions, one counter per report). Invoice, bill and payment
+writes bump the counter (invalidate_aging, app.backend.deps.invalidates_aging),
+so every worker recomputes on its next read, not only the one that took the write.
+"""
+import time
+from datetime import datetime
+
+from app.core.config import settings
+
+REPORT_VERSIONS = "report_versions"
+
+AGING_BUCKETS = ["not_due", "0-30", "31-60", "61-90", "90+"]
+
+AGING_REPORTS = {
+    "receivables": {
+        "collection": "invoices",
+        "party_id": "customer_id",
+        "party_name": "customer_name",
+        "match": {"payment_status": {"$in": ["unpaid", "partial"]}, "status": {"$ne": "cancelled"}},
+        "number": "invoice_number",
+        # Invoices without a due date are due on their invoice date
+        "due": {"$ifNull": ["$due_date", "$invoice_date"]},
+    },
+    "payables": {
+        "collection": "purchase_bills",
+        "party_id": "weaver_id",
+        "party_name": "weaver_name",
+        "match": {"payment_status": {"$in": ["unpaid", "partial", "overdue"]}},
+        "number": "bill_number",
+        "due": "$due_date",
+    },
+}
+
+_cache = {}
+
+
+def aging_pipeline(account_id: str, report: str, now: datetime) -> list:
+    spec = AGING_REPORTS[report]
+    due = {"$convert": {"input": spec["due"], "to": "date", "onError": now, "onNull": now}}
+    days = {"$dateDiff": {"startDate": due, "endDate": now, "unit": "day"}}
+    return [
+        {"$match": {"account_id": account_id, **spec["match"], "balance_amount": {"$gt": 0}}},
+        {"$group": {
+            "_id": {
+                "party_id": f"${spec['party_id']}",
+                "bucket": {"$switch": {
+                    "branches": [
+                        {"case": {"$lt": [days, 0]}, "then": "not_due"},
+                        {"case": {"$lte": [days, 30]}, "then": "0-30"},
+                        {"case": {"$lte": [days, 60]}, "then": "31-60"},
+                        {"case": {"$lte": [days, 90]}, "then": "61-90"},
+                    ],
+                    "default": "90+"
+                }}
+            },
+            "party_name": {"$first": f"${spec['party_name']}"},
+            "amount": {"$sum": "$balance_amount"},
+            "documents": {"$sum": 1},
+            "oldest_due": {"$min": due}
+        }},
+        {"$group": {
+            "_id": "$_id.party_id",
+            "party_name": {"$first": "$party_name"},
+            "buckets": {"$push": {"k": "$_id.bucket", "v": "$amount"}},
+            "total": {"$sum": "$amount"},
+            "documents": {"$sum": "$documents"},
+            "oldest_due": {"$min": "$oldest_due"}
+        }},
+        {"$project": {
+            "party_name": 1, "total": 1, "documents": 1, "oldest_due": 1,
+            "buckets": {"$arrayToObject": "$buckets"}
+        }},
+        {"$sort": {"total": -1}}
+    ]
+
+
+def compute_aging(database, account_id: str, report: str, now: datetime = None, session=None) -> dict:
+    now = now or datetime.utcnow()
+    spec = AGING_REPORTS[report]
+    parties = []
+    totals = dict.fromkeys(AGING_BUCKETS, 0.0)
+    for row in database[spec["collection"]].aggregate(aging_pipeline(account_id, report, now), session=session):
+        buckets = {bucket: round(row["buckets"].get(bucket, 0), 2) for bucket in AGING_BUCKETS}
+        for bucket, amount in buckets.items():
+            totals[bucket] += amount
+        parties.append({
+            "party_id": row["_id"],
+            "party_name": row.get("party_name") or "",
+            "buckets": buckets,
+            "total": round(row["total"], 2),
+            "documents": row["documents"],
+            "oldest_due": row.get("oldest_due")
+        })
+    return {
+        "report": report,
+        "as_of": now,
+        "buckets": {bucket: round(amount, 2) for bucket, amount in totals.items()},
+        "total": round(sum(totals.values()), 2),
+        "parties": parties
+    }
+
+
+def report_version(database, account_id: str, report: str, session=None) -> int:
+    doc = database[REPORT_VERSIONS].find_one({"_id": account_id}, projection={report: 1}, session=session)
+    return (doc or {}).get(report, 0)
+
+
+def invalidate_aging(database, account_id: str, *reports):
+    """Make every worker recompute the given reports (default: both) on their next read."""
+    database[REPORT_VERSIONS].update_one(
+        {"_id": account_id},
+        {"$inc": {report: 1 for report in reports or AGING_REPORTS}},
+        upsert=True
+    )
+
+
+def aging_report(database, account_id: str, report: str, session=None) -> dict:
+    """compute_aging, served from the worker's cache while the report version and day are unchanged."""
+    version = report_version(database, account_id, report, session)
+    key = (database.name, account_id, report)
+    now = time.monotonic()
+    cached = _cache.get(key)
+    if cached and cached[0] == version and cached[1] > now and cached[2]["as_of"].date() == datetime.utcnow().date():
+        return cached[2]
+    result = compute_aging(database, account_id, report, session=session)
+    _cache[key] = (version, now + settings.AGING_CACHE_SECONDS, result)
+    return result
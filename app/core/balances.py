@@ -0,0 +1,43 @@
+"""
+Server-side settlement updates for invoices and purchase bills.
+
+Each helper returns an aggregation-pipeline update that applies a signed payment
+amount (positive = pay, negative = revert) and derives balance and payment_status
+from the stored values in the same atomic write, so concurrent payments never
+overwrite each other and no read is needed beforehand.
+"""
+from datetime import datetime
+
+
+def _payment_status(paid_field: str):
+    return {"$switch": {
+        "branches": [
+            {"case": {"$lte": ["$balance_amount", 0]}, "then": "paid"},
+            {"case": {"$gt": [paid_field, 0]}, "then": "partial"},
+        ],
+        "default": "unpaid"
+    }}
+
+
+def invoice_payment_update(amount: float):
+    """Pipeline for invoices: amount_received += amount, balance_amount = grand_total - amount_received."""
+    return [
+        {"$set": {"amount_received": {"$max": [0, {"$add": [{"$ifNull": ["$amount_received", 0]}, amount]}]}}},
+        {"$set": {
+            "balance_amount": {"$max": [0, {"$subtract": [{"$ifNull": ["$grand_total", 0]}, "$amount_received"]}]},
+            "updated_at": datetime.utcnow()
+        }},
+        {"$set": {"payment_status": _payment_status("$amount_received")}}
+    ]
+
+
+def bill_payment_update(amount: float):
+    """Pipeline for purchase bills: paid_amount += amount (floored at 0), balance_amount = total_amount - paid_amount."""
+    return [
+        {"$set": {"paid_amount": {"$max": [0, {"$add": [{"$ifNull": ["$paid_amount", 0]}, amount]}]}}},
+        {"$set": {
+            "balance_amount": {"$max": [0, {"$subtract": [{"$ifNull": ["$total_amount", 0]}, "$paid_amount"]}]},
+            "updated_at": datetime.utcnow()
+        }},
+        {"$set": {"payment_status": _payment_status("$paid_amount")}}
+    ]
@@ -0,0 +1,98 @@
+"""
+Cash-flow forecast from due dates.
+
+Expected inflows are the open balances of invoices, expected outflows the open
+balances of purchase bills (the same documents as the aging reports), placed
+on their due date. One aggregation over invoices, with purchase_bills pulled in
+by $unionWith, totals them per period:
+
+    day     the dashboard calendar
+    week    weeks starting Monday
+    month
+
+Balances already past due at the start of the range are not spread over the
+periods; they are reported once as overdue, since when they will be settled is
+not known. Due dates are read as in the aging reports: string dates are
+converted, invoices without a due date fall due on their invoice date, and a
+document with no usable date is due today. The forecast, the calendar and the
+aging reports therefore count the same balances.
+"""
+from datetime import datetime
+
+from app.core.aging import AGING_REPORTS
+
+FLOWS = {"receivables": "in", "payables": "out"}
+
+FORECAST_INTERVALS = ["day", "week", "month"]
+
+
+def _flow_stages(account_id: str, report: str, due: dict, today: datetime) -> list:
+    spec = AGING_REPORTS[report]
+    return [
+        {"$match": {"account_id": account_id, **spec["match"], "balance_amount": {"$gt": 0}}},
+        {"$project": {
+            "_id": 0,
+            "flow": FLOWS[report],
+            "due": {"$convert": {"input": spec["due"], "to": "date", "onError": today, "onNull": today}},
+            "amount": "$balance_amount"
+        }},
+        # Filtered after the conversion: string due dates never match a date range
+        {"$match": {"due": due}}
+    ]
+
+
+def forecast_pipeline(account_id: str, start: datetime, end: datetime, interval: str = "week", overdue: bool = True) -> list:
+    """Inflow and outflow per period from start up to end; period None holds what is overdue."""
+    due = {"$lt": end} if overdue else {"$gte": start, "$lt": end}
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    period = {"$cond": [
+        {"$lt": ["$due", start]},
+        None,
+        {"$dateTrunc": {"date": "$due", "unit": interval, "startOfWeek": "monday"}}
+    ]}
+    return [
+        *_flow_stages(account_id, "receivables", due, today),
+        {"$unionWith": {"coll": AGING_REPORTS["payables"]["collection"], "pipeline": _flow_stages(account_id, "payables", due, today)}},
+        {"$group": {
+            "_id": period,
+            "inflow": {"$sum": {"$cond": [{"$eq": ["$flow", "in"]}, "$amount", 0]}},
+            "outflow": {"$sum": {"$cond": [{"$eq": ["$flow", "out"]}, "$amount", 0]}},
+            "invoices": {"$sum": {"$cond": [{"$eq": ["$flow", "in"]}, 1, 0]}},
+            "bills": {"$sum": {"$cond": [{"$eq": ["$flow", "out"]}, 1, 0]}}
+        }},
+        {"$sort": {"_id": 1}}
+    ]
+
+
+def _totals(row: dict) -> dict:
+    return {
+        "inflow": round(row["inflow"], 2),
+        "outflow": round(row["outflow"], 2),
+        "net": round(row["inflow"] - row["outflow"], 2),
+        "invoices": row["invoices"],
+        "bills": row["bills"]
+    }
+
+
+def cash_flow(database, account_id: str, start: datetime, end: datetime, interval: str = "week",
+              overdue: bool = True, session=None) -> dict:
+    """Expected inflows and outflows between start and end, per interval (see forecast_pipeline)."""
+    past_due = {"inflow": 0, "outflow": 0, "invoices": 0, "bills": 0}
+    periods = []
+    for row in database["invoices"].aggregate(forecast_pipeline(account_id, start, end, interval, overdue), session=session):
+        if row["_id"] is None:
+            past_due = row
+        else:
+            periods.append({"period_start": row["_id"], **_totals(row)})
+    inflow = sum(period["inflow"] for period in periods)
+    outflow = sum(period["outflow"] for period in periods)
+    return {
+        "interval": interval,
+        "start": start,
+        "end": end,
+        "overdue": _totals(past_due),
+        "periods": periods,
+        "inflow": round(inflow, 2),
+        "outflow": round(outflow, 2),
+        "net": round(inflow - outflow, 2)
+    }
@@ -14,8 +14,72 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "insecure-secret-key-for-dev"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14 # Sliding: every /auth/refresh rotates the token and extends the session
+    PASSWORD_HASH_ROUNDS: int = 29000 # pbkdf2_sha256 cost; existing hashes are upgraded on next login
+    PASSWORD_HASH_WORKERS: int = 2 # Processes dedicated to hashing/verification per API worker
     API_V1_STR: str = "/api/v1"
 
+    # Process Model (serve.py)
+    API_BIND: str = "0.0.0.0:8000"
+    WEB_BIND: str = "0.0.0.0:5000"
+    API_WORKERS: int = 0 # 0 = derive from CPU count
+    WEB_WORKERS: int = 0 # 0 = derive from CPU count
+    WEB_THREADS: int = 4
+    WORKER_MAX_REQUESTS: int = 2000 # Recycle a worker after N requests to bound memory
+    WORKER_MAX_REQUESTS_JITTER: int = 200
+    WORKER_TIMEOUT: int = 60
+    WORKER_GRACEFUL_TIMEOUT: int = 30
+    RUN_STARTUP_TASKS: bool = True # serve.py runs them once in the master and disables this
+
+    # Report Read Routing (app.core.database.get_report_db)
+    REPORT_READ_PREFERENCE: str = "secondaryPreferred" # primary | primaryPreferred | secondary | secondaryPreferred | nearest
+    REPORT_MAX_STALENESS_SECONDS: int = 90 # -1 = no limit; MongoDB requires at least 90
+
+    # Tenant Placement (app.core.tenancy)
+    TENANT_DIRECTORY_CACHE_SECONDS: int = 5 # How long a worker trusts a cached placement; bounds the cutover write pause
+
+    # Rate Limiting (app.core.rate_limit; limits per plan in app.core.plans)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory" # memory (per worker) | mongo (shared across workers and hosts)
+    # Login and signup are limited per client address, which a whole office NAT may share
+    AUTH_RATE_LIMIT_RATE: float = 1 # Requests/second refill per address
+    AUTH_RATE_LIMIT_BURST: int = 30
+    TRUSTED_PROXIES: str = "" # Comma-separated proxy addresses whose X-Forwarded-For is used; "*" trusts any peer (Render)
+
+    # Idempotency-Key support (app.backend.idempotency)
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24
+
+    # Recurring Invoices (recurring_worker.py)
+    RECURRING_BATCH_SIZE: int = 200 # Schedules claimed and generated per batch
+    RECURRING_LEASE_SECONDS: int = 300 # A claimed schedule is skipped by other workers for this long
+    RECURRING_POLL_SECONDS: int = 30
+    RECURRING_RETRY_MINUTES: int = 60 # Backoff for a schedule that failed validation (stock, customer, plan)
+
+    # Stock Reservations (app.core.reservations)
+    RESERVATION_TTL_HOURS: int = 72 # Hold for duplicated invoices and quotations without a future valid_until
+    RESERVATION_HISTORY_DAYS: int = 30 # Closed reservations are purged by a TTL index after this
+
+    # Sharded Stock Counters (app.core.stock)
+    STOCK_SHARDS_MAX: int = 64 # Upper bound for items.stock_shards
+    STOCK_SHARD_CACHE_SECONDS: int = 5 # How long a worker trusts its list of sharded items
+
+    # Stock Snapshots (app.core.snapshots)
+    STOCK_SNAPSHOT_INTERVAL: str = "monthly" # daily, weekly or monthly (UTC period starts)
+    STOCK_SNAPSHOT_CHUNK: int = 20000 # Items per snapshot document
+    STOCK_SNAPSHOT_LAG_SECONDS: int = 120 # A boundary is snapshotted once it is this old (the log is written after commit)
+
+    # Inventory Valuation (app.core.valuation)
+    INVENTORY_VALUATION_METHOD: str = "weighted_average" # weighted_average | fifo; per account via rebuild_valuation.py
+    VALUATION_LAG_SECONDS: int = 120 # Log entries younger than this wait for the next pass (the log is written after commit)
+    VALUATION_LEASE_SECONDS: int = 900 # An account being valued is skipped by other workers for this long
+
+    # Aging Reports (app.core.aging)
+    AGING_CACHE_SECONDS: int = 300 # Upper bound on reuse; writes invalidate sooner
+
+    # Static Frontend (build_frontend.py)
+    SERVE_FRONTEND: bool = False # Mount the pre-built UI on the FastAPI app
+    FRONTEND_DIST_DIR: str = "dist/frontend"
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()
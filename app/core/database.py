@@ -1,8 +1,28 @@
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+from pymongo.read_preferences import ReadPreference, Primary
+from bson import json_util
 from app.core.config import settings
+import base64
 import certifi
 import sys
 
+REPORT_READ_MODES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+def report_read_preference():
+    """Read preference for report traffic, built from REPORT_READ_PREFERENCE / REPORT_MAX_STALENESS_SECONDS."""
+    mode = REPORT_READ_MODES.get(settings.REPORT_READ_PREFERENCE, ReadPreference.SECONDARY_PREFERRED)
+    if isinstance(mode, Primary):
+        return mode
+    # max_staleness is not allowed with mode "primary"; every other mode accepts it
+    return type(mode)(max_staleness=settings.REPORT_MAX_STALENESS_SECONDS)
+
 class Database:
     client: MongoClient = None
 
@@ -44,6 +64,83 @@ class Database:
             raise Exception("Database client not initialized. Check your MongoDB connection.")
         return self.client[settings.DATABASE_NAME]
 
+    def get_report_db(self):
+        """
+        Database handle for read-only report/aggregation endpoints. Reads are routed
+        to secondaries (REPORT_READ_PREFERENCE) so heavy aggregations stay off the
+        primary that serves invoicing writes. On a standalone server this is the primary.
+        """
+        if not self.client:
+            raise Exception("Database client not initialized. Check your MongoDB connection.")
+        return self.client.get_database(settings.DATABASE_NAME, read_preference=report_read_preference())
+
+    @staticmethod
+    def open_client(uri: str) -> MongoClient:
+        """Client for an additional cluster (tenant placements), with the same TLS settings as connect()."""
+        return MongoClient(
+            uri,
+            serverSelectionTimeoutMS=5000,
+            tls=True,
+            tlsCAFile=certifi.where(),
+            retryWrites=True
+        )
+
+    def causal_session(self, causal_token: str = None, client: MongoClient = None):
+        """
+        Start a causally consistent session on client (default: the main client).
+        When a causal token from an earlier write (see causal_token) is given, reads
+        in this session wait until the selected member has applied that write, so
+        secondary reads see it.
+        """
+        client = client or self.client
+        if not client:
+            raise Exception("Database client not initialized. Check your MongoDB connection.")
+        session = client.start_session(causal_consistency=True)
+        if causal_token:
+            try:
+                state = json_util.loads(base64.urlsafe_b64decode(causal_token.encode()).decode())
+                session.advance_cluster_time(state["cluster_time"])
+                session.advance_operation_time(state["operation_time"])
+            except Exception:
+                # A malformed or foreign token only costs read-your-writes, never the request
+                pass
+        return session
+
+    @staticmethod
+    def causal_token(session):
+        """Opaque token carrying a session's cluster/operation time, or None outside a replica set."""
+        if session.cluster_time is None or session.operation_time is None:
+            return None
+        state = {"cluster_time": session.cluster_time, "operation_time": session.operation_time}
+        return base64.urlsafe_b64encode(json_util.dumps(state, json_options=json_util.CANONICAL_JSON_OPTIONS).encode()).decode()
+
+    def write_fence(self, client: MongoClient = None):
+        """
+        Causal token covering every write already acknowledged by client's primary.
+        Returned to clients after mutating requests so their next report read
+        (get_report_db + causal_session) cannot observe state from before the write.
+        """
+        client = client or self.client
+        with self.causal_session(client=client) as session:
+            client[settings.DATABASE_NAME]["accounts"].find_one({"_id": None}, projection={"_id": 1}, session=session)
+            return self.causal_token(session)
+
+    @staticmethod
+    def run_in_transaction(client: MongoClient, callback):
+        """
+        Run callback(session) in a multi-document transaction (retried on transient
+        errors by with_transaction). A standalone server cannot run transactions,
+        so there the callback runs once with session=None.
+        """
+        with client.start_session() as session:
+            try:
+                return session.with_transaction(callback)
+            except OperationFailure as e:
+                # 20 = IllegalOperation: "Transaction numbers are only allowed on a replica set member or mongos"
+                if e.code != 20:
+                    raise
+        return callback(None)
+
     def close(self):
         if self.client:
             self.client.close()
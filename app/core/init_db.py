@@ -1,7 +1,116 @@
 from datetime import datetime
 import uuid
 from app.core.database import db
+from app.core.tenancy import tenants
 from app.core.security import get_password_hash
+from app.core.stock_log import STOCK_TRANSACTIONS, ensure_stock_transactions, is_time_series
+import pymongo
+
+def ensure_indexes():
+    """Create the indexes the API relies on. create_index is idempotent, so this is safe on every deploy."""
+    database = db.get_db()
+
+    # Login lookup
+    database["users"].create_index("email")
+
+    # Refresh-token sessions: lookup by hash, expired sessions purged by the TTL monitor
+    database["sessions"].create_index("token_hash", unique=True)
+    database["sessions"].create_index("previous_token_hash")
+    database["sessions"].create_index("expires_at", expireAfterSeconds=0)
+
+    # Shared rate-limit buckets (RATE_LIMIT_BACKEND=mongo); idle buckets expire
+    database["rate_limits"].create_index("expires_at", expireAfterSeconds=0)
+
+    # Stored responses for Idempotency-Key retries
+    database["idempotency_keys"].create_index("expires_at", expireAfterSeconds=0)
+
+    # Tenant placement directory (app.core.tenancy)
+    database["tenant_placements"].create_index("account_id", unique=True)
+
+    ensure_tenant_indexes(database)
+    # Accounts moved to dedicated placements need the same account-scoped indexes
+    for placement in database["tenant_placements"].find({}, projection={"_id": 0}):
+        ensure_tenant_indexes(tenants.database_for(placement))
+
+def ensure_tenant_indexes(database):
+    """Indexes on the account-scoped collections. Also run on every dedicated tenant placement."""
+    # Open invoices per customer, oldest due first (payment allocation)
+    database["invoices"].create_index([
+        ("account_id", pymongo.ASCENDING), ("customer_id", pymongo.ASCENDING),
+        ("status", pymongo.ASCENDING), ("due_date", pymongo.ASCENDING)
+    ])
+
+    # Aging reports and the cash-flow forecast: open balances by due date
+    for collection in ["invoices", "purchase_bills"]:
+        database[collection].create_index([
+            ("account_id", pymongo.ASCENDING), ("payment_status", pymongo.ASCENDING), ("due_date", pymongo.ASCENDING)
+        ])
+
+    # Receipts of an invoice (cancellation reverses what is still owed)
+    database["payments"].create_index([("account_id", pymongo.ASCENDING), ("invoice_id", pymongo.ASCENDING)])
+    # Corrections written by reconcile_balances.py
+    database["balance_adjustments"].create_index([("account_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)])
+
+    # Recurring invoices: due schedules for the scheduler, and one invoice per schedule period
+    database["recurring_invoices"].create_index([("status", pymongo.ASCENDING), ("next_run_at", pymongo.ASCENDING)])
+    database["recurring_invoices"].create_index([("account_id", pymongo.ASCENDING), ("schedule_id", pymongo.ASCENDING)])
+    database["invoices"].create_index(
+        [("schedule_id", pymongo.ASCENDING), ("schedule_run_at", pymongo.ASCENDING)],
+        unique=True,
+        partialFilterExpression={"schedule_id": {"$exists": True}}
+    )
+
+    # Stock reservations: per source, expiry sweep, and purge of closed ones
+    database["stock_reservations"].create_index([
+        ("account_id", pymongo.ASCENDING), ("source_type", pymongo.ASCENDING),
+        ("source_id", pymongo.ASCENDING), ("status", pymongo.ASCENDING)
+    ])
+    database["stock_reservations"].create_index([
+        ("account_id", pymongo.ASCENDING), ("item_id", pymongo.ASCENDING),
+        ("status", pymongo.ASCENDING), ("expires_at", pymongo.ASCENDING)
+    ])
+    database["stock_reservations"].create_index([("status", pymongo.ASCENDING), ("expires_at", pymongo.ASCENDING)])
+    database["stock_reservations"].create_index("purge_at", expireAfterSeconds=0)
+
+    # Stock movement log: time-series collection (app.core.stock_log). A legacy regular
+    # collection is left alone until migrate_stock_transactions.py converts it.
+    ensure_stock_transactions(database)
+    if is_time_series(database):
+        database[STOCK_TRANSACTIONS].create_index([
+            ("meta.account_id", pymongo.ASCENDING), ("meta.item_id", pymongo.ASCENDING),
+            ("transaction_date", pymongo.DESCENDING)
+        ])
+        # Duplicate checks when copying the log (migrate_stock_transactions.py, migrate_tenant.py)
+        database[STOCK_TRANSACTIONS].create_index("transaction_id")
+
+    # Point-in-time stock snapshots (app.core.snapshots)
+    database["stock_snapshots"].create_index([("account_id", pymongo.ASCENDING), ("as_of", pymongo.DESCENDING)])
+
+    # Inventory valuation (app.core.valuation): cost states and daily cost of sales per item
+    database["item_costs"].create_index("account_id")
+    database["cost_of_sales"].create_index([("account_id", pymongo.ASCENDING), ("day", pymongo.ASCENDING)])
+
+    # Stock locations (app.core.locations)
+    database["locations"].create_index([("account_id", pymongo.ASCENDING), ("location_id", pymongo.ASCENDING)], unique=True)
+    database["item_locations"].create_index(
+        [("account_id", pymongo.ASCENDING), ("item_id", pymongo.ASCENDING), ("location_id", pymongo.ASCENDING)],
+        unique=True
+    )
+    database["item_locations"].create_index([("account_id", pymongo.ASCENDING), ("location_id", pymongo.ASCENDING)])
+
+    # Sharded stock counters (app.core.stock)
+    database["stock_counters"].create_index([("account_id", pymongo.ASCENDING), ("item_id", pymongo.ASCENDING)])
+    database["stock_counters"].create_index([("account_id", pymongo.ASCENDING), ("updated_at", pymongo.ASCENDING)])
+    database["items"].create_index(
+        [("account_id", pymongo.ASCENDING), ("stock_shards", pymongo.ASCENDING)],
+        partialFilterExpression={"stock_shards": {"$gt": 0}}
+    )
+
+    # Master-data delta sync (?updated_since=) and ETag revalidation
+    for collection in ["items", "customers", "weavers", "categories"]:
+        database[collection].create_index(
+            [("account_id", pymongo.ASCENDING), ("updated_at", pymongo.DESCENDING)]
+        )
 
 def ensure_admin_exists():
     database = db.get_db()
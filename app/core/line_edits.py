@@ -0,0 +1,76 @@
+"""
+Line-level diffing for edits of documents that move stock (invoices, purchase bills).
+
+Editing used to revert every old line and re-apply every new one: two stock
+updates and two stock_transactions per line, even when only the notes changed.
+diff_lines compares old and new lines by item_id, and apply_stock_diff writes
+only the net change: one stock movement (app.core.stock) for each item whose
+quantity changed, logged as one adjustment in stock_transactions.
+"""
+from typing import List, NamedTuple
+
+from app.core.stock import StockMovement, apply_movements
+
+
+class LineChange(NamedTuple):
+    item_id: str
+    item_name: str
+    old_qty: float
+    new_qty: float
+
+    @property
+    def delta(self) -> float:
+        return self.new_qty - self.old_qty
+
+
+def line_quantities(lines):
+    """item_id -> (item_name, total qty); an item listed on several lines is summed."""
+    totals = {}
+    for line in lines or []:
+        name, qty = totals.get(line["item_id"], (line.get("item_name", ""), 0))
+        totals[line["item_id"]] = (name, qty + line.get("qty", 0))
+    return totals
+
+
+def line_rates(lines) -> dict:
+    """item_id -> quantity-weighted rate of the lines, the unit cost of stock they add."""
+    totals = {}
+    for line in lines or []:
+        qty, amount = totals.get(line["item_id"], (0, 0))
+        totals[line["item_id"]] = (qty + line.get("qty", 0), amount + line.get("qty", 0) * line.get("rate", 0))
+    return {item_id: amount / qty for item_id, (qty, amount) in totals.items() if qty}
+
+
+def diff_lines(old_lines, new_lines) -> List[LineChange]:
+    """Items whose total quantity differs between the old and new lines (added and removed items included)."""
+    old, new = line_quantities(old_lines), line_quantities(new_lines)
+    changes = []
+    for item_id in list(old) + [item_id for item_id in new if item_id not in old]:
+        old_name, old_qty = old.get(item_id, ("", 0))
+        new_name, new_qty = new.get(item_id, ("", 0))
+        if round(new_qty - old_qty, 6) != 0:
+            changes.append(LineChange(item_id, new_name or old_name, old_qty, new_qty))
+    return changes
+
+
+def apply_stock_diff(database, account_id: str, changes: List[LineChange], sign: int, reference: dict,
+                     note: str, upsert: bool = False, session=None, location_id: str = None,
+                     unit_costs: dict = None) -> List[dict]:
+    """
+    Apply the net stock effect of `changes`. sign is -1 for lines that consume stock
+    (invoices) and +1 for lines that add it (purchase bills); reference holds the
+    document's id/number fields copied onto each stock transaction. unit_costs
+    (item_id -> rate) prices the stock an edit adds. Returns the logged adjustments.
+    """
+    return apply_movements(
+        database, account_id,
+        [
+            StockMovement(
+                change.item_id, change.item_name, sign * change.delta,
+                f"{note} (qty {change.old_qty:g} -> {change.new_qty:g})",
+                unit_cost=(unit_costs or {}).get(change.item_id) if sign * change.delta > 0 else None
+            )
+            for change in changes
+        ],
+        reference, note, upsert=upsert, session=session, location_id=location_id
+    )
@@ -0,0 +1,225 @@
+"""
+Stock locations (godown, shop floor, weaver sites).
+
+items.current_stock stays the account-wide total, so item lists, stock checks
+and dashboard queries keep reading a single collection. Each location's share
+lives in item_locations, one document per (account_id, item_id, location_id):
+
+    {"account_id", "item_id", "location_id", "item_name", "current_stock", "updated_at"}
+
+apply_movements (app.core.stock) updates both when a movement has a location.
+Stock that has never been placed (opening stock, stock from before locations
+existed, recurring invoices) is "unassigned":
+
+    unassigned = items.current_stock - sum(item_locations.current_stock)
+
+and can be placed with a transfer from no location. A sale at a location may
+draw on it: place_for_sale transfers the shortfall from unassigned stock to the
+location first, so an account that sets a default location keeps invoicing
+items whose stock has not been placed yet. Transfers move stock
+between locations without changing the item total and log a transfer_out and a
+transfer_in stock transaction once the move has committed.
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import List
+
+from pymongo import ReturnDocument
+
+from app.core.database import db as db_core
+from app.core.stock_log import log_transactions
+
+LOCATION_TYPES = ["warehouse", "shop", "weaver"]
+
+
+class LocationNotFound(Exception):
+    def __init__(self, location_id: str):
+        self.location_id = location_id
+        super().__init__(f"Location not found with ID: {location_id}")
+
+
+class InsufficientLocationStock(Exception):
+    def __init__(self, item_name: str, location_name: str, available: float, requested: float):
+        self.available = available
+        super().__init__(
+            f"Insufficient stock for {item_name} at {location_name}. Available: {available}, Requested: {requested}"
+        )
+
+
+def resolve_location(database, account_id: str, location_id: str = None):
+    """
+    The location a document moves stock at: location_id when given (it must exist
+    and be active), else the account's default location, else None (unassigned).
+    """
+    if location_id:
+        location = database["locations"].find_one(
+            {"account_id": account_id, "location_id": location_id, "status": "active"},
+            projection={"location_id": 1}
+        )
+        if not location:
+            raise LocationNotFound(location_id)
+        return location_id
+    default = database["locations"].find_one(
+        {"account_id": account_id, "is_default": True, "status": "active"},
+        projection={"location_id": 1}
+    )
+    return default["location_id"] if default else None
+
+
+def move_location_stock(database, account_id: str, location_id: str, item_id: str, item_name: str,
+                        quantity: float, now: datetime, session=None) -> float:
+    """$inc one item's stock at a location; returns the location's new stock."""
+    doc = database["item_locations"].find_one_and_update(
+        {"account_id": account_id, "item_id": item_id, "location_id": location_id},
+        {"$inc": {"current_stock": quantity}, "$set": {"item_name": item_name, "updated_at": now}},
+        projection={"current_stock": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    return doc["current_stock"]
+
+
+def stock_by_location(database, account_id: str, item_id: str, total: float) -> dict:
+    """location_id -> stock of one item, with None for the unassigned remainder."""
+    stock = {
+        doc["location_id"]: doc["current_stock"]
+        for doc in database["item_locations"].find(
+            {"account_id": account_id, "item_id": item_id},
+            projection={"location_id": 1, "current_stock": 1}
+        )
+    }
+    stock[None] = round(total - sum(stock.values()), 6)
+    return stock
+
+
+def transfer_stock(database, account_id: str, item: dict, from_location: dict, to_location: dict,
+                   quantity: float, notes: str = None, total: float = None) -> dict:
+    """
+    Move quantity of an item from one location (None = unassigned) to another,
+    guarded so the source cannot go negative. `total` is the item's stock total
+    (sharded counters included) and is only needed for transfers out of
+    unassigned stock. Returns the transfer with both stock transactions.
+    """
+    now = datetime.utcnow()
+    transfer_id = str(uuid.uuid4())
+    from_id = from_location["location_id"] if from_location else None
+    from_name = from_location["name"] if from_location else "Unassigned"
+
+    def write(session):
+        if from_id:
+            source = database["item_locations"].find_one_and_update(
+                {"account_id": account_id, "item_id": item["item_id"], "location_id": from_id,
+                 "current_stock": {"$gte": quantity}},
+                {"$inc": {"current_stock": -quantity}, "$set": {"updated_at": now}},
+                projection={"current_stock": 1},
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            if not source:
+                current = database["item_locations"].find_one(
+                    {"account_id": account_id, "item_id": item["item_id"], "location_id": from_id},
+                    projection={"current_stock": 1}, session=session
+                )
+                raise InsufficientLocationStock(item["item_name"], from_name, (current or {}).get("current_stock", 0), quantity)
+            source_after = source["current_stock"]
+        else:
+            placed = sum(
+                doc["current_stock"] for doc in database["item_locations"].find(
+                    {"account_id": account_id, "item_id": item["item_id"]},
+                    projection={"current_stock": 1}, session=session
+                )
+            )
+            unassigned = round((item.get("current_stock", 0) if total is None else total) - placed, 6)
+            if unassigned < quantity:
+                raise InsufficientLocationStock(item["item_name"], from_name, unassigned, quantity)
+            source_after = unassigned - quantity
+        target_after = move_location_stock(
+            database, account_id, to_location["location_id"], item["item_id"], item["item_name"], quantity, now, session
+        )
+
+        legs = [
+            ("transfer_out", from_id, from_name, source_after + quantity, source_after),
+            ("transfer_in", to_location["location_id"], to_location["name"], target_after - quantity, target_after),
+        ]
+        transactions = [
+            {
+                "transaction_id": str(uuid.uuid4()),
+                "transfer_id": transfer_id,
+                "item_id": item["item_id"],
+                "item_name": item["item_name"],
+                "account_id": account_id,
+                "transaction_type": transaction_type,
+                "location_id": location_id,
+                "location_name": location_name,
+                "quantity": quantity,
+                "previous_stock": previous,
+                "new_stock": new,
+                "transaction_date": now,
+                "notes": notes or f"Transfer {from_name} -> {to_location['name']}"
+            }
+            for transaction_type, location_id, location_name, previous, new in legs
+        ]
+        return transactions
+
+    transactions = db_core.run_in_transaction(database.client, write)
+    log_transactions(database, transactions)
+    return {
+        "transfer_id": transfer_id,
+        "item_id": item["item_id"],
+        "item_name": item["item_name"],
+        "from_location_id": from_id,
+        "to_location_id": to_location["location_id"],
+        "quantity": quantity,
+        "transferred_at": now,
+        "transactions": transactions
+    }
+
+
+def sale_availability(database, account_id: str, location_id: str, items: List[dict]) -> dict:
+    """
+    item_id -> (stock at location_id, unassigned stock) for item documents whose
+    current_stock includes pending shard deltas. A sale there can use both.
+    """
+    at_location, placed = {}, defaultdict(float)
+    for doc in database["item_locations"].find(
+        {"account_id": account_id, "item_id": {"$in": [item["item_id"] for item in items]}},
+        projection={"item_id": 1, "location_id": 1, "current_stock": 1}
+    ):
+        placed[doc["item_id"]] += doc["current_stock"]
+        if doc["location_id"] == location_id:
+            at_location[doc["item_id"]] = doc["current_stock"]
+    return {
+        item["item_id"]: (
+            at_location.get(item["item_id"], 0),
+            max(0, round((item.get("current_stock") or 0) - placed[item["item_id"]], 6))
+        )
+        for item in items
+    }
+
+
+def place_for_sale(database, account_id: str, location_id: str, items: List[dict], needed: dict) -> List[dict]:
+    """
+    Transfer unassigned stock to location_id for items whose stock there is short
+    of needed (item_id -> quantity about to be sold). Returns the transfers.
+    """
+    availability = sale_availability(database, account_id, location_id, items)
+    short = [
+        (item, round(needed[item["item_id"]] - availability[item["item_id"]][0], 6))
+        for item in {item["item_id"]: item for item in items}.values()
+        if needed.get(item["item_id"], 0) > availability[item["item_id"]][0]
+    ]
+    if not short:
+        return []
+    location = database["locations"].find_one(
+        {"account_id": account_id, "location_id": location_id}, projection={"location_id": 1, "name": 1}
+    )
+    return [
+        transfer_stock(
+            database, account_id, item, None, location, min(shortfall, availability[item["item_id"]][1]),
+            notes=f"Placed at {location['name']} for a sale", total=item.get("current_stock", 0)
+        )
+        for item, shortfall in short
+        if availability[item["item_id"]][1] > 0
+    ]
@@ -10,6 +10,15 @@ SUBSCRIPTION_PLANS = {
             "users": 1,
             "reports": False
         },
+        # Token buckets per route class: `rate` requests/second refill, `burst` bucket size
+        "rate_limits": {
+            "auth": {"rate": 0.2, "burst": 5},
+            "reads": {"rate": 5, "burst": 30},
+            "writes": {"rate": 1, "burst": 10},
+            "reports": {"rate": 0.2, "burst": 3},
+            "search": {"rate": 1, "burst": 5}
+        },
+        "report_concurrency": 1,
         "features": ["Basic Invoicing", "Inventory Management", "Single User Access"]
     },
     "pro": {
@@ -22,6 +31,14 @@ SUBSCRIPTION_PLANS = {
             "users": 5,
             "reports": True
         },
+        "rate_limits": {
+            "auth": {"rate": 0.5, "burst": 10},
+            "reads": {"rate": 20, "burst": 100},
+            "writes": {"rate": 5, "burst": 40},
+            "reports": {"rate": 1, "burst": 10},
+            "search": {"rate": 3, "burst": 15}
+        },
+        "report_concurrency": 2,
         "features": ["Bulk Invoicing", "Advanced Reports", "Multi-user Access", "Priority Support"]
     },
     "enterprise": {
@@ -34,6 +51,14 @@ SUBSCRIPTION_PLANS = {
             "users": -1, # Unlimited
             "reports": True
         },
+        "rate_limits": {
+            "auth": {"rate": 1, "burst": 20},
+            "reads": {"rate": 50, "burst": 200},
+            "writes": {"rate": 20, "burst": 100},
+            "reports": {"rate": 3, "burst": 20},
+            "search": {"rate": 10, "burst": 40}
+        },
+        "report_concurrency": 4,
         "features": ["Unlimited Everything", "Dedicated Account Manager", "Custom Integrations", "24/7 Phone Support"]
     }
 }
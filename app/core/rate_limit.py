@@ -0,0 +1,201 @@
+"""
+Per-account token-bucket rate limiting and concurrency bulkheads.
+
+Requests are classified into route classes (auth, reads, writes, reports, search);
+each account gets one bucket per class, sized by its plan's `rate_limits` in
+SUBSCRIPTION_PLANS. Report routes additionally hold one of the plan's
+`report_concurrency` slots while they run.
+
+Backends (RATE_LIMIT_BACKEND):
+    memory  per worker process; cheap, but every worker has its own buckets
+    mongo   shared by all workers and hosts; one atomic find_one_and_update per request
+"""
+import math
+import re
+import threading
+import time
+import uuid
+
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.core.database import db
+from app.core.plans import SUBSCRIPTION_PLANS
+
+# Paths (below API_V1_STR) served by heavy aggregations; they are rate limited as
+# "reports" and share the plan's report_concurrency slots.
+REPORT_PATHS = re.compile(
+    r"^/(dashboard/(stats|report/|top-selling-items|calendar-events)|invoices/stats|items/stock-as-of|reports/)"
+)
+SEARCH_PATHS = re.compile(r"^/dashboard/search")
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, route_class: str, retry_after: float, reason: str = "rate"):
+        self.route_class = route_class
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+        super().__init__(f"{route_class} {reason} limit exceeded")
+
+
+def route_class(method: str, path: str, query_params=None) -> str:
+    """Route class for an API request; path is relative to API_V1_STR."""
+    if path.startswith("/auth/"):
+        return "auth"
+    if method in WRITE_METHODS:
+        return "writes"
+    if REPORT_PATHS.match(path):
+        return "reports"
+    if SEARCH_PATHS.match(path) or (query_params and query_params.get("search")):
+        return "search"
+    return "reads"
+
+
+def client_address(peer: str, forwarded_for: str = None) -> str:
+    """
+    The requesting client's address. X-Forwarded-For is only believed when the
+    peer is a trusted proxy (TRUSTED_PROXIES); it is read from the right, skipping
+    trusted hops, so a client cannot pick its own address by sending the header.
+    """
+    trusted = {proxy.strip() for proxy in settings.TRUSTED_PROXIES.split(",") if proxy.strip()}
+    address = peer or "unknown"
+    if not forwarded_for or not ("*" in trusted or address in trusted):
+        return address
+    hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+    # With "*" only the hop added by the proxy in front of us is believed
+    while hops:
+        address = hops.pop()
+        if "*" in trusted or address not in trusted:
+            break
+    return address
+
+
+def plan_limits(plan_key: str):
+    plan = SUBSCRIPTION_PLANS.get(plan_key, SUBSCRIPTION_PLANS["free"])
+    return plan["rate_limits"], plan["report_concurrency"]
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._buckets = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int):
+        """Take one token. Returns (allowed, seconds until a token is available)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+    def acquire(self, key: str, limit: int):
+        with self._lock:
+            if self._slots.get(key, 0) >= limit:
+                return None
+            self._slots[key] = self._slots.get(key, 0) + 1
+        return key
+
+    def release(self, key: str, lease):
+        with self._lock:
+            self._slots[key] = max(0, self._slots.get(key, 0) - 1)
+
+
+class MongoBackend:
+    """
+    Buckets and slots live in the `rate_limits` collection of the home database.
+    Refill is computed server-side against $$NOW so worker clocks never matter.
+    """
+
+    def collection(self):
+        return db.get_db()["rate_limits"]
+
+    def take(self, key: str, rate: float, burst: int):
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        doc = self.collection().find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {
+                    "tokens": {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed, rate]}]}]},
+                    "updated_at": "$$NOW",
+                }},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    # A full bucket carries no state, so idle buckets are purged by the TTL index
+                    "expires_at": {"$add": ["$$NOW", int(burst / rate * 1000) + 1000]},
+                }},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["allowed"]:
+            return True, 0
+        return False, (1 - doc["tokens"]) / rate
+
+    def acquire(self, key: str, limit: int):
+        """Claim a slot lease. Leases expire after WORKER_TIMEOUT so a killed worker cannot leak a slot."""
+        lease = str(uuid.uuid4())
+        lease_ms = settings.WORKER_TIMEOUT * 1000
+        doc = self.collection().find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"slots": {"$filter": {
+                    "input": {"$ifNull": ["$slots", []]},
+                    "cond": {"$gt": ["$$this.expires_at", "$$NOW"]},
+                }}}},
+                {"$set": {"slots": {"$cond": [
+                    {"$lt": [{"$size": "$slots"}, limit]},
+                    {"$concatArrays": ["$slots", [{"lease": lease, "expires_at": {"$add": ["$$NOW", lease_ms]}}]]},
+                    "$slots",
+                ]}}},
+                {"$set": {"expires_at": {"$add": ["$$NOW", lease_ms]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return lease if any(slot["lease"] == lease for slot in doc["slots"]) else None
+
+    def release(self, key: str, lease):
+        self.collection().update_one({"_id": key}, {"$pull": {"slots": {"lease": lease}}})
+
+
+class RateLimiter:
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = MongoBackend() if settings.RATE_LIMIT_BACKEND == "mongo" else MemoryBackend()
+        return self._backend
+
+    def check(self, subject: str, plan_key: str, cls: str):
+        """Take a token for subject (account_id or client address) or raise RateLimitExceeded."""
+        limits, _ = plan_limits(plan_key)
+        self.check_limit(subject, cls, limits[cls]["rate"], limits[cls]["burst"])
+
+    def check_limit(self, subject: str, cls: str, rate: float, burst: int):
+        """check with an explicit bucket size instead of a plan's."""
+        allowed, retry_after = self.backend.take(f"bucket:{cls}:{subject}", rate, burst)
+        if not allowed:
+            raise RateLimitExceeded(cls, retry_after)
+
+    def acquire_report_slot(self, subject: str, plan_key: str):
+        _, concurrency = plan_limits(plan_key)
+        key = f"slots:reports:{subject}"
+        lease = self.backend.acquire(key, concurrency)
+        if lease is None:
+            raise RateLimitExceeded("reports", 1, reason="concurrency")
+        return key, lease
+
+    def release_report_slot(self, key: str, lease):
+        self.backend.release(key, lease)
+
+
+limiter = RateLimiter()
@@ -0,0 +1,230 @@
+"""
+Consistency checks for denormalized balances.
+
+Stock: every change to items.current_stock is logged in stock_transactions
+(app.core.stock), so for each item
+
+    current_stock (sharded counters included) = opening_stock + sum(in) - sum(out)
+
+A write path that died between the stock update and the log, or an edit that
+bypassed apply_movements, shows up as a difference. The expected stock of every
+item of an account comes from one aggregation over the log.
+
+Corrections move current_stock to the expected stock and record the change as
+an "adjustment" entry in the log. Its type is neutral to the sums (like
+transfers), so the item stays consistent afterwards, and the entry keeps the
+previous and new stock for the audit trail.
+
+Party balances: customers.current_balance and weavers.current_balance are
+running totals kept by the invoice, bill and payment endpoints. party_ledgers
+rebuilds them from the documents in one aggregation per collection, and
+corrections are recorded in balance_adjustments.
+
+reconcile_stock.py and reconcile_balances.py run the checks across all accounts.
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import List
+
+from pymongo import ReturnDocument
+
+from app.core.snapshots import SIGNED_QUANTITY
+from app.core.stock import with_shards
+from app.core.stock_log import STOCK_TRANSACTIONS, log_transactions, meta_query
+
+
+def logged_stock(database, account_id: str, item_ids=None) -> dict:
+    """item_id -> signed sum of the item's logged movements."""
+    return {
+        row["_id"]: row["quantity"]
+        for row in database[STOCK_TRANSACTIONS].aggregate([
+            {"$match": meta_query(account_id, item_ids)},
+            {"$group": {"_id": "$meta.item_id", "quantity": {"$sum": SIGNED_QUANTITY}}}
+        ], allowDiskUse=True)
+    }
+
+
+def stock_drift(database, account_id: str, item_ids=None) -> List[dict]:
+    """Items whose current stock differs from opening stock plus their logged movements."""
+    query = {"account_id": account_id}
+    if item_ids:
+        query["item_id"] = {"$in": list(item_ids)}
+    items = with_shards(database, account_id, list(database["items"].find(
+        query,
+        projection={"item_id": 1, "item_name": 1, "opening_stock": 1, "current_stock": 1, "stock_shards": 1}
+    )))
+    moved = logged_stock(database, account_id, item_ids)
+    drift = []
+    for item in items:
+        opening = item.get("opening_stock") or 0
+        movements = moved.get(item["item_id"], 0)
+        expected = round(opening + movements, 6)
+        current = round(item.get("current_stock") or 0, 6)
+        if current != expected:
+            drift.append({
+                "account_id": account_id,
+                "item_id": item["item_id"],
+                "item_name": item.get("item_name", ""),
+                "opening_stock": opening,
+                "logged_movements": round(movements, 6),
+                "expected_stock": expected,
+                "current_stock": current,
+                "difference": round(current - expected, 6)
+            })
+    return drift
+
+
+def correct_stock_drift(database, account_id: str, drift: List[dict], notes: str = "Stock reconciliation") -> List[dict]:
+    """
+    Move each drifting item's current_stock by -difference and log it as an
+    adjustment. Returns the logged adjustments.
+    """
+    now = datetime.utcnow()
+    reconciliation_id = str(uuid.uuid4())
+    transactions = []
+    for row in drift:
+        item = database["items"].find_one_and_update(
+            {"item_id": row["item_id"], "account_id": account_id},
+            {"$inc": {"current_stock": -row["difference"]}, "$set": {"updated_at": now}},
+            projection={"current_stock": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not item:
+            continue
+        transactions.append({
+            "transaction_id": str(uuid.uuid4()),
+            "reconciliation_id": reconciliation_id,
+            "item_id": row["item_id"],
+            "item_name": row["item_name"],
+            "account_id": account_id,
+            "transaction_type": "adjustment",
+            "quantity": abs(row["difference"]),
+            "previous_stock": item["current_stock"] + row["difference"],
+            "new_stock": item["current_stock"],
+            "transaction_date": now,
+            "location_id": None,
+            "notes": f"{notes}: {row['current_stock']:g} -> {row['expected_stock']:g}"
+        })
+    log_transactions(database, transactions)
+    return transactions
+
+
+# Party balances
+
+def _totals(collection, pipeline) -> dict:
+    return {row["_id"]: row["amount"] for row in collection.aggregate(pipeline, allowDiskUse=True)}
+
+
+def party_ledgers(database, account_id: str) -> dict:
+    """
+    What customers and weavers owe, rebuilt from the documents:
+
+        customer = opening_balance + active invoices' grand_total - receipts
+        weaver   = opening_balance + bills' total_amount - vendor payments - payments made
+
+    Returns {"customers": {party_id: (charged, paid)}, "weavers": {...}}.
+    Cancelled invoices and cancelled payments do not count.
+    """
+    invoiced = _totals(database["invoices"], [
+        {"$match": {"account_id": account_id, "status": {"$ne": "cancelled"}}},
+        {"$group": {"_id": "$customer_id", "amount": {"$sum": "$grand_total"}}}
+    ])
+    # Receipts recorded on an invoice carry customer_id, those from /payments party_id
+    paid = defaultdict(float)
+    for row in database["payments"].aggregate([
+        {"$match": {"account_id": account_id, "status": {"$ne": "cancelled"}}},
+        {"$group": {
+            "_id": {"type": {"$ifNull": ["$payment_type", "receive"]}, "party": {"$ifNull": ["$party_id", "$customer_id"]}},
+            "amount": {"$sum": "$amount"}
+        }}
+    ], allowDiskUse=True):
+        party_type = "customers" if row["_id"]["type"] == "receive" else "weavers"
+        paid[(party_type, row["_id"]["party"])] += row["amount"]
+    billed = _totals(database["purchase_bills"], [
+        {"$match": {"account_id": account_id}},
+        {"$group": {"_id": "$weaver_id", "amount": {"$sum": "$total_amount"}}}
+    ])
+    for weaver_id, amount in _totals(database["vendor_payments"], [
+        {"$match": {"account_id": account_id}},
+        {"$group": {"_id": "$weaver_id", "amount": {"$sum": "$amount"}}}
+    ]).items():
+        paid[("weavers", weaver_id)] += amount
+
+    ledgers = {"customers": {}, "weavers": {}}
+    for party_type, charged in (("customers", invoiced), ("weavers", billed)):
+        parties = set(charged) | {party_id for kind, party_id in paid if kind == party_type}
+        for party_id in parties:
+            ledgers[party_type][party_id] = (charged.get(party_id, 0), paid.get((party_type, party_id), 0))
+    return ledgers
+
+
+PARTIES = {
+    "customers": ("customer_id", "customer_name"),
+    "weavers": ("weaver_id", "weaver_name"),
+}
+
+
+def balance_drift(database, account_id: str) -> List[dict]:
+    """Customers and weavers whose current_balance differs from their rebuilt ledger."""
+    ledgers = party_ledgers(database, account_id)
+    drift = []
+    for party_type, (id_field, name_field) in PARTIES.items():
+        for party in database[party_type].find(
+            {"account_id": account_id},
+            projection={id_field: 1, name_field: 1, "opening_balance": 1, "current_balance": 1}
+        ):
+            opening = party.get("opening_balance") or 0
+            charged, paid = ledgers[party_type].get(party[id_field], (0, 0))
+            expected = round(opening + charged - paid, 2)
+            current = round(party.get("current_balance") or 0, 2)
+            if current != expected:
+                drift.append({
+                    "account_id": account_id,
+                    "party_type": party_type,
+                    "party_id": party[id_field],
+                    "party_name": party.get(name_field, ""),
+                    "opening_balance": opening,
+                    "charged": round(charged, 2),
+                    "paid": round(paid, 2),
+                    "expected_balance": expected,
+                    "current_balance": current,
+                    "difference": round(current - expected, 2)
+                })
+    return drift
+
+
+def correct_balance_drift(database, account_id: str, drift: List[dict], notes: str = "Balance reconciliation") -> List[dict]:
+    """
+    Move each drifting party's current_balance by -difference, recording every
+    change in balance_adjustments. Returns the adjustments.
+    """
+    now = datetime.utcnow()
+    reconciliation_id = str(uuid.uuid4())
+    adjustments = []
+    for row in drift:
+        id_field, _ = PARTIES[row["party_type"]]
+        party = database[row["party_type"]].find_one_and_update(
+            {id_field: row["party_id"], "account_id": account_id},
+            {"$inc": {"current_balance": -row["difference"]}, "$set": {"updated_at": now}},
+            projection={"current_balance": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not party:
+            continue
+        adjustments.append({
+            "adjustment_id": str(uuid.uuid4()),
+            "reconciliation_id": reconciliation_id,
+            "account_id": account_id,
+            "party_type": row["party_type"],
+            "party_id": row["party_id"],
+            "party_name": row["party_name"],
+            "previous_balance": round(party["current_balance"] + row["difference"], 2),
+            "new_balance": round(party["current_balance"], 2),
+            "amount": -row["difference"],
+            "notes": notes,
+            "created_at": now
+        })
+    if adjustments:
+        database["balance_adjustments"].insert_many([dict(adjustment) for adjustment in adjustments])
+    return adjustments
@@ -0,0 +1,402 @@
+"""
+Recurring invoice schedules.
+
+A schedule (`recurring_invoices`) is an invoice template plus a frequency. The
+scheduler (recurring_worker.py) works through every tenant database in batches:
+
+1. Claim up to RECURRING_BATCH_SIZE due schedules (indexed `status, next_run_at`)
+   by stamping them with a lease. Other workers skip leased schedules, and the
+   lease of a crashed worker simply runs out.
+2. Load every customer and item the batch needs with one query each, and check
+   plan limits and stock for the whole batch at once.
+3. Reserve one block of invoice numbers per account (app.core.numbering).
+4. In one transaction, insert the invoices, apply the stock changes and advance
+   the schedules, each as a single bulk write; then append the stock log (a
+   time-series collection, which cannot be written inside the transaction).
+
+Every generated invoice carries (schedule_id, schedule_run_at), unique among
+invoices, so a period is billed at most once even if a batch is retried.
+"""
+import calendar
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+from app.core.aging import invalidate_aging
+from app.core.config import settings
+from app.core.database import db
+from app.core.plans import SUBSCRIPTION_PLANS
+from app.core.numbering import reserve_invoice_numbers
+from app.core.reservations import available_stock
+from app.core.stock import with_shards
+from app.core.stock_log import log_transactions
+from app.core.tenancy import tenants, is_cutover
+
+FREQUENCIES = ["daily", "weekly", "monthly", "quarterly", "yearly"]
+MONTHS_PER_PERIOD = {"monthly": 1, "quarterly": 3, "yearly": 12}
+
+
+class LeaseLost(Exception):
+    """Another worker claimed part of the batch after our lease ran out."""
+
+
+def add_months(value: datetime, months: int, anchor_day: int) -> datetime:
+    """value + months, on anchor_day clamped to the month's length (Jan 31 -> Feb 28 -> Mar 31)."""
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    return value.replace(year=year, month=month, day=min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+def next_occurrence(run_at: datetime, frequency: str, interval: int = 1, anchor_day: int = None) -> datetime:
+    if frequency == "daily":
+        return run_at + timedelta(days=interval)
+    if frequency == "weekly":
+        return run_at + timedelta(weeks=interval)
+    return add_months(run_at, MONTHS_PER_PERIOD[frequency] * interval, anchor_day or run_at.day)
+
+
+def first_occurrence_after(schedule, after: datetime) -> datetime:
+    """First run of the schedule at or after `after` (used when a paused schedule resumes)."""
+    run_at = schedule["next_run_at"] or schedule["start_date"]
+    while run_at < after:
+        run_at = next_occurrence(run_at, schedule["frequency"], schedule.get("interval", 1), schedule.get("anchor_day"))
+    return run_at
+
+
+def invoice_totals(items, discount: float = 0, shipping: float = 0):
+    """Same rounding as create_invoice."""
+    sub_total = sum(item["qty"] * item["rate"] for item in items)
+    total_tax = sum(item["qty"] * item["rate"] * (item.get("tax_percent", 0) / 100) for item in items)
+    grand_total = sub_total + total_tax - (discount or 0) + (shipping or 0)
+    return {
+        "sub_total": float(round(sub_total, 2)),
+        "total_tax": float(round(total_tax, 2)),
+        "grand_total": float(round(grand_total, 2)),
+        "discount_amount": float(round(discount or 0, 2)),
+        "shipping_charges": float(round(shipping or 0, 2)),
+    }
+
+
+def customer_snapshot(customer):
+    """Customer fields copied onto an invoice, as create_invoice does."""
+    return {
+        "customer_id": customer["customer_id"],
+        "customer_name": customer.get("customer_name", ""),
+        "customer_code": customer.get("customer_code", ""),
+        "customer_address": customer.get("billing_address", ""),
+        "customer_city": customer.get("billing_city", ""),
+        "customer_state": customer.get("billing_state", ""),
+        "customer_state_code": customer.get("state_code", ""),
+        "customer_pincode": customer.get("billing_zip", ""),
+        "customer_phone": customer.get("mobile_number", customer.get("billing_phone", "")),
+        "customer_email": customer.get("email", ""),
+        "customer_gstin": customer.get("gstin", ""),
+    }
+
+
+def placement_key(placement):
+    """(cluster, database) an account's data lives in; None cluster = the main one."""
+    if not placement:
+        return None, settings.DATABASE_NAME
+    uri = placement.get("mongo_uri")
+    return (None if not uri or uri == settings.MONGO_URI else uri), placement["database_name"]
+
+
+def tenant_databases():
+    """(key, database) for the home database and every distinct tenant placement."""
+    home = db.get_db()
+    seen = {placement_key(None)}
+    yield placement_key(None), home
+    for placement in home["tenant_placements"].find({}, projection={"_id": 0}):
+        key = placement_key(placement)
+        if key not in seen:
+            seen.add(key)
+            yield key, tenants.database_for(placement)
+
+
+def claim_due(database, batch_size: int, now: datetime):
+    """
+    Lease up to batch_size due schedules. Returns (lease token, schedules), with
+    no token when nothing was due. Schedules whose next run is past their
+    end_date are completed instead of returned.
+    """
+    schedules = database["recurring_invoices"]
+    due = {
+        "status": "active",
+        "next_run_at": {"$lte": now},
+        "$or": [{"lease_until": None}, {"lease_until": {"$lte": now}}]
+    }
+    ids = [doc["_id"] for doc in schedules.find(due, projection={"_id": 1}).sort("next_run_at", 1).limit(batch_size)]
+    if not ids:
+        return None, []
+    token = str(uuid.uuid4())
+    # The due filter is re-checked per document, so a schedule claimed by another
+    # worker in the meantime is not taken over
+    schedules.update_many(
+        {**due, "_id": {"$in": ids}},
+        {"$set": {"lease_owner": token, "lease_until": now + timedelta(seconds=settings.RECURRING_LEASE_SECONDS)}}
+    )
+    claimed = list(schedules.find({"_id": {"$in": ids}, "lease_owner": token}).sort("next_run_at", 1))
+    # end_date may have been moved before a pending run: that period is not billed
+    ended = [doc["_id"] for doc in claimed if doc.get("end_date") and doc["next_run_at"] > doc["end_date"]]
+    if ended:
+        schedules.update_many(
+            {"_id": {"$in": ended}, "lease_owner": token},
+            {"$set": {"status": "completed", "updated_at": now}, "$unset": {"lease_owner": "", "lease_until": ""}}
+        )
+    return token, [doc for doc in claimed if doc["_id"] not in ended]
+
+
+def validate_batch(database, schedules):
+    """
+    Check customers, items, stock and plan limits for the whole batch with one query
+    per collection. Returns (accepted [(schedule, customer)], failures {_id: error}).
+    Stock is checked cumulatively, so two schedules cannot both use the last units.
+    """
+    account_ids = list({s["account_id"] for s in schedules})
+    customers = {
+        (c["account_id"], c["customer_id"]): c
+        for c in database["customers"].find({
+            "account_id": {"$in": account_ids},
+            "customer_id": {"$in": list({s["customer_id"] for s in schedules})}
+        })
+    }
+    items = list(database["items"].find(
+        {
+            "account_id": {"$in": account_ids},
+            "item_id": {"$in": list({line["item_id"] for s in schedules for line in s["items"]})}
+        },
+        projection={"account_id": 1, "item_id": 1, "current_stock": 1, "reserved_stock": 1, "stock_shards": 1}
+    ))
+    for account_id in {i["account_id"] for i in items if i.get("stock_shards")}:
+        with_shards(database, account_id, [i for i in items if i["account_id"] == account_id])
+    stock = {(i["account_id"], i["item_id"]): available_stock(i) for i in items}
+    plans = {
+        a["account_id"]: SUBSCRIPTION_PLANS.get(a.get("subscription_type", "free"), SUBSCRIPTION_PLANS["free"])
+        for a in db.get_db()["accounts"].find({"account_id": {"$in": account_ids}}, projection={"account_id": 1, "subscription_type": 1})
+    }
+    invoice_counts = {
+        row["_id"]: row["count"]
+        for row in database["invoices"].aggregate([
+            {"$match": {"account_id": {"$in": account_ids}, "status": {"$ne": "cancelled"}}},
+            {"$group": {"_id": "$account_id", "count": {"$sum": 1}}}
+        ])
+    }
+
+    accepted, failures = [], {}
+    for schedule in schedules:
+        account_id = schedule["account_id"]
+        customer = customers.get((account_id, schedule["customer_id"]))
+        plan = plans.get(account_id)
+        needed = defaultdict(float)
+        for line in schedule["items"]:
+            needed[line["item_id"]] += line["qty"]
+        names = {line["item_id"]: line.get("item_name", line["item_id"]) for line in schedule["items"]}
+
+        error = None
+        if not customer:
+            error = f"Customer not found with ID: {schedule['customer_id']}"
+        elif not plan:
+            error = "Account not found"
+        elif plan["limits"]["invoices"] != -1 and invoice_counts.get(account_id, 0) + 1 >= plan["limits"]["invoices"]:
+            error = f"You have reached the limit for invoices in your {plan['name']} plan"
+        else:
+            for item_id, qty in needed.items():
+                available = stock.get((account_id, item_id))
+                if available is None:
+                    error = f"Item {names[item_id]} not found"
+                elif available < qty:
+                    error = f"Insufficient stock for {names[item_id]}. Available: {available}, Requested: {qty}"
+                if error:
+                    break
+
+        if error:
+            failures[schedule["_id"]] = error
+            continue
+        for item_id, qty in needed.items():
+            stock[(account_id, item_id)] -= qty
+        invoice_counts[account_id] = invoice_counts.get(account_id, 0) + 1
+        accepted.append((schedule, customer))
+    return accepted, failures
+
+
+def build_invoice(schedule, customer, invoice_number: str, now: datetime):
+    run_at = schedule["next_run_at"]
+    totals = invoice_totals(schedule["items"], schedule.get("discount_amount"), schedule.get("shipping_charges"))
+    due_in_days = schedule.get("due_in_days")
+    return {
+        "invoice_id": str(uuid.uuid4()),
+        "account_id": schedule["account_id"],
+        "user_id": schedule.get("user_id"),
+        "invoice_number": invoice_number,
+        **customer_snapshot(customer),
+        "invoice_date": run_at,
+        "due_date": run_at + timedelta(days=due_in_days) if due_in_days is not None else None,
+        "items": schedule["items"],
+        **totals,
+        "payment_status": "unpaid",
+        "amount_received": 0,
+        "balance_amount": totals["grand_total"],
+        "status": "active",
+        "notes": schedule.get("notes"),
+        "payment_terms": schedule.get("payment_terms"),
+        "schedule_id": schedule["schedule_id"],
+        "schedule_run_at": run_at,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def advance(schedule, token: str, invoice, now: datetime):
+    """Schedule update after a run: next period, or completed once past end_date."""
+    next_run = next_occurrence(
+        schedule["next_run_at"], schedule["frequency"], schedule.get("interval", 1), schedule.get("anchor_day")
+    )
+    fields = {
+        "next_run_at": next_run,
+        "last_run_at": schedule["next_run_at"],
+        "last_invoice_id": invoice["invoice_id"],
+        "last_invoice_number": invoice["invoice_number"],
+        "last_error": None,
+        "updated_at": now,
+    }
+    if schedule.get("end_date") and next_run > schedule["end_date"]:
+        fields["status"] = "completed"
+    return UpdateOne(
+        {"_id": schedule["_id"], "lease_owner": token},
+        {"$set": fields, "$inc": {"run_count": 1}, "$unset": {"lease_owner": "", "lease_until": ""}}
+    )
+
+
+def process_batch(database, token: str, schedules, now: datetime):
+    """Generate one invoice per claimed schedule. Returns (generated, failed)."""
+    accepted, failures = validate_batch(database, schedules)
+
+    numbers = {}
+    by_account = defaultdict(list)
+    for schedule, customer in accepted:
+        by_account[schedule["account_id"]].append((schedule, customer))
+    invoices = []
+    for account_id, entries in by_account.items():
+        numbers[account_id] = reserve_invoice_numbers(database, account_id, len(entries))
+        for (schedule, customer), number in zip(entries, numbers[account_id]):
+            invoices.append((schedule, build_invoice(schedule, customer, number, now)))
+
+    # Failed schedules keep their lease until the retry time, which doubles as backoff
+    retry_at = now + timedelta(minutes=settings.RECURRING_RETRY_MINUTES)
+    failure_ops = [
+        UpdateOne(
+            {"_id": schedule_id, "lease_owner": token},
+            {"$set": {"last_error": error, "last_error_at": now, "lease_until": retry_at}}
+        )
+        for schedule_id, error in failures.items()
+    ]
+    generated = []
+    movements = []
+
+    def apply(session):
+        generated.clear()
+        movements.clear()
+        schedule_ops = list(failure_ops)
+        fresh = []
+        if invoices:
+            # Periods already billed by an earlier, interrupted attempt
+            billed = {
+                (doc["schedule_id"], doc["schedule_run_at"])
+                for doc in database["invoices"].find(
+                    {"$or": [{"schedule_id": inv["schedule_id"], "schedule_run_at": inv["schedule_run_at"]} for _, inv in invoices]},
+                    projection={"schedule_id": 1, "schedule_run_at": 1},
+                    session=session
+                )
+            }
+            for schedule, invoice in invoices:
+                if (invoice["schedule_id"], invoice["schedule_run_at"]) not in billed:
+                    fresh.append(invoice)
+                schedule_ops.append(advance(schedule, token, invoice, now))
+        if fresh:
+            database["invoices"].insert_many([dict(inv) for inv in fresh], ordered=False, session=session)
+            owed = defaultdict(float)
+            for invoice in fresh:
+                owed[(invoice["account_id"], invoice["customer_id"])] += invoice["grand_total"]
+            database["customers"].bulk_write([
+                UpdateOne(
+                    {"customer_id": customer_id, "account_id": account_id},
+                    {"$inc": {"current_balance": amount}, "$set": {"updated_at": now}}
+                )
+                for (account_id, customer_id), amount in owed.items()
+            ], ordered=False, session=session)
+        sold = defaultdict(float)
+        for invoice in fresh:
+            for line in invoice["items"]:
+                sold[(invoice["account_id"], line["item_id"])] += line["qty"]
+        if sold:
+            database["items"].bulk_write([
+                UpdateOne(
+                    {"item_id": item_id, "account_id": account_id},
+                    {"$inc": {"current_stock": -qty}, "$set": {"updated_at": now}}
+                )
+                for (account_id, item_id), qty in sold.items()
+            ], ordered=False, session=session)
+            movements.extend(
+                {
+                    "transaction_id": str(uuid.uuid4()),
+                    "item_id": line["item_id"],
+                    "item_name": line.get("item_name"),
+                    "invoice_id": invoice["invoice_id"],
+                    "invoice_number": invoice["invoice_number"],
+                    "account_id": invoice["account_id"],
+                    "transaction_type": "out",
+                    "quantity": line["qty"],
+                    "transaction_date": now,
+                    "notes": f"Sold via recurring invoice {invoice['invoice_number']}"
+                }
+                for invoice in fresh for line in invoice["items"]
+            )
+        if schedule_ops:
+            result = database["recurring_invoices"].bulk_write(schedule_ops, ordered=False, session=session)
+            if result.matched_count != len(schedule_ops):
+                raise LeaseLost()
+        generated.extend(fresh)
+
+    db.run_in_transaction(database.client, apply)
+    # The stock log is a time-series collection, written once the batch has committed
+    log_transactions(database, movements)
+    for account_id in {invoice["account_id"] for invoice in generated}:
+        invalidate_aging(database, account_id, "receivables")
+    return len(generated), len(failures)
+
+
+def run_due_schedules(batch_size: int = None, now: datetime = None, should_stop=lambda: False):
+    """Process every due schedule in every tenant database. Returns counters for logging."""
+    batch_size = batch_size or settings.RECURRING_BATCH_SIZE
+    stats = {"batches": 0, "generated": 0, "failed": 0, "skipped": 0, "lease_lost": 0}
+    for key, database in tenant_databases():
+        while not should_stop():
+            run_now = now or datetime.utcnow()
+            token, schedules = claim_due(database, batch_size, run_now)
+            if not token:
+                break
+            if not schedules:
+                # Every claimed schedule had ended; claim the next batch
+                continue
+            # Copies left behind by migrate_tenant.py, or accounts mid-cutover, are
+            # not ours to bill; they stay leased and are looked at again later
+            runnable = []
+            for schedule in schedules:
+                placement = tenants.get_placement(schedule["account_id"])
+                if placement_key(placement) == key and not is_cutover(placement):
+                    runnable.append(schedule)
+            stats["skipped"] += len(schedules) - len(runnable)
+            stats["batches"] += 1
+            if not runnable:
+                continue
+            try:
+                generated, failed = process_batch(database, token, runnable, run_now)
+            except LeaseLost:
+                stats["lease_lost"] += 1
+                continue
+            stats["generated"] += generated
+            stats["failed"] += failed
+    return stats
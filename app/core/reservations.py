@@ -0,0 +1,220 @@
+"""
+Stock reservations.
+
+A reservation holds stock for a quotation or a not-yet-finalized (duplicated)
+invoice. Each item document keeps a running `reserved_stock` next to
+`current_stock`, so availability is always
+
+    available = current_stock - reserved_stock
+
+and reserving is a single guarded $inc on the item: O(1) no matter how many
+quotations are open. The `stock_reservations` documents record who holds what:
+
+    {"reservation_id", "account_id", "item_id", "item_name", "quantity",
+     "source_type": "quotation" | "invoice", "source_id", "source_number",
+     "status": "active" | "converted" | "released" | "expired",
+     "expires_at", "created_at", "closed_at", "purge_at"}
+
+Closing a reservation first flips its status (only one caller can win) and then
+returns its quantity to the item. Expired reservations are released lazily
+before an item is reserved again and by recurring_worker.py on every pass.
+Closed reservations are removed by the TTL index on purge_at after
+RESERVATION_HISTORY_DAYS.
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.core.line_edits import line_quantities
+
+RESERVATION_ACTIVE = "active"
+RESERVATION_CONVERTED = "converted"
+RESERVATION_RELEASED = "released"
+RESERVATION_EXPIRED = "expired"
+
+
+class InsufficientStock(Exception):
+    def __init__(self, item_id: str, item_name: str, requested: float, available: float = None):
+        self.item_id = item_id
+        self.item_name = item_name
+        self.requested = requested
+        self.available = available # None = item not found
+        if available is None:
+            message = f"Item {item_name} not found"
+        else:
+            message = f"Insufficient stock for {item_name}. Available: {available}, Requested: {requested}"
+        super().__init__(message)
+
+
+def available_stock(item) -> float:
+    return (item.get("current_stock") or 0) - (item.get("reserved_stock") or 0)
+
+
+def default_expiry(valid_until: datetime = None) -> datetime:
+    """A quotation holds stock until it lapses; anything else for RESERVATION_TTL_HOURS."""
+    now = datetime.utcnow()
+    if valid_until and valid_until > now:
+        return valid_until
+    return now + timedelta(hours=settings.RESERVATION_TTL_HOURS)
+
+
+def unreserve(database, account_id: str, quantities: dict):
+    """Give reserved quantities (item_id -> qty) back to the items' available stock."""
+    now = datetime.utcnow()
+    for item_id, qty in quantities.items():
+        if qty:
+            database["items"].update_one(
+                {"item_id": item_id, "account_id": account_id},
+                {"$inc": {"reserved_stock": -qty}, "$set": {"updated_at": now}}
+            )
+
+
+def reserve(database, account_id: str, lines, source_type: str, source_id: str, source_number: str = None,
+            expires_at: datetime = None):
+    """
+    Reserve every line's quantity, all or nothing. Raises InsufficientStock (after
+    undoing the lines already reserved) when an item lacks available stock.
+    For sharded items (app.core.stock) the guard sees stock as of the last fold.
+    """
+    quantities = {item_id: value for item_id, value in line_quantities(lines).items() if value[1] > 0}
+    if not quantities:
+        return []
+    release_expired(database, account_id, list(quantities))
+
+    now = datetime.utcnow()
+    held = {}
+    for item_id, (item_name, qty) in quantities.items():
+        item = database["items"].find_one_and_update(
+            {
+                "item_id": item_id,
+                "account_id": account_id,
+                "$expr": {"$gte": [
+                    {"$subtract": [{"$ifNull": ["$current_stock", 0]}, {"$ifNull": ["$reserved_stock", 0]}]},
+                    qty
+                ]}
+            },
+            {"$inc": {"reserved_stock": qty}, "$set": {"updated_at": now}},
+            projection={"_id": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not item:
+            unreserve(database, account_id, held)
+            current = database["items"].find_one(
+                {"item_id": item_id, "account_id": account_id},
+                projection={"current_stock": 1, "reserved_stock": 1}
+            )
+            raise InsufficientStock(item_id, item_name, qty, available_stock(current) if current else None)
+        held[item_id] = qty
+
+    reservations = [
+        {
+            "reservation_id": str(uuid.uuid4()),
+            "account_id": account_id,
+            "item_id": item_id,
+            "item_name": item_name,
+            "quantity": qty,
+            "source_type": source_type,
+            "source_id": source_id,
+            "source_number": source_number,
+            "status": RESERVATION_ACTIVE,
+            "expires_at": expires_at or default_expiry(),
+            "created_at": now
+        }
+        for item_id, (item_name, qty) in quantities.items()
+    ]
+    database["stock_reservations"].insert_many(reservations)
+    return reservations
+
+
+def held_by(database, account_id: str, source_type: str, source_id: str) -> dict:
+    """item_id -> quantity a source currently holds (counts as available to that source)."""
+    held = defaultdict(float)
+    for reservation in database["stock_reservations"].find(
+        {"account_id": account_id, "source_type": source_type, "source_id": source_id, "status": RESERVATION_ACTIVE},
+        projection={"item_id": 1, "quantity": 1}
+    ):
+        held[reservation["item_id"]] += reservation["quantity"]
+    return dict(held)
+
+
+def consume(lines, reserved: dict):
+    """
+    Split `reserved` (item_id -> qty, from take_source) over sold lines. Returns the
+    reservation each line uses, in line order; what is left in `reserved` was held
+    but not sold and must still be given back with unreserve().
+    """
+    used = []
+    for line in lines:
+        qty = min(line["qty"], reserved.get(line["item_id"], 0))
+        if qty:
+            reserved[line["item_id"]] -= qty
+        used.append(qty)
+    return used
+
+
+def close(database, reservation_query: dict, new_status: str, restore: bool = True) -> dict:
+    """
+    Close the active reservations matching reservation_query. Returns the quantity
+    per item taken out of `active`; with restore=False the caller releases it
+    itself (e.g. together with the stock deduction of a conversion).
+    """
+    now = datetime.utcnow()
+    closed = defaultdict(float)
+    account_id = None
+    for reservation in database["stock_reservations"].find({**reservation_query, "status": RESERVATION_ACTIVE}):
+        won = database["stock_reservations"].find_one_and_update(
+            {"_id": reservation["_id"], "status": RESERVATION_ACTIVE},
+            {"$set": {
+                "status": new_status,
+                "closed_at": now,
+                "purge_at": now + timedelta(days=settings.RESERVATION_HISTORY_DAYS)
+            }},
+            projection={"item_id": 1, "quantity": 1, "account_id": 1}
+        )
+        if won:
+            closed[won["item_id"]] += won["quantity"]
+            account_id = won["account_id"]
+    if restore and closed:
+        unreserve(database, account_id, closed)
+    return dict(closed)
+
+
+def release_source(database, account_id: str, source_type: str, source_id: str) -> dict:
+    """Release everything a quotation or invoice holds (declined, deleted, re-reserved)."""
+    return close(
+        database,
+        {"account_id": account_id, "source_type": source_type, "source_id": source_id},
+        RESERVATION_RELEASED
+    )
+
+
+def take_source(database, account_id: str, source_type: str, source_id: str) -> dict:
+    """
+    Mark a source's reservations converted and return item_id -> reserved qty. The
+    caller must release that quantity from reserved_stock, normally in the same
+    update as the stock deduction (StockMovement.reserved).
+    """
+    return close(
+        database,
+        {"account_id": account_id, "source_type": source_type, "source_id": source_id},
+        RESERVATION_CONVERTED,
+        restore=False
+    )
+
+
+def release_expired(database, account_id: str = None, item_ids=None, limit: int = 1000) -> int:
+    """Release active reservations past expires_at (optionally only for some items)."""
+    query = {"expires_at": {"$lte": datetime.utcnow()}}
+    if account_id:
+        query["account_id"] = account_id
+    if item_ids:
+        query["item_id"] = {"$in": list(item_ids)}
+    expired = list(database["stock_reservations"].find(
+        {**query, "status": RESERVATION_ACTIVE}, projection={"account_id": 1}
+    ).limit(limit))
+    for account in {doc["account_id"] for doc in expired}:
+        close(database, {**query, "account_id": account, "_id": {"$in": [doc["_id"] for doc in expired]}}, RESERVATION_EXPIRED)
+    return len(expired)
@@ -0,0 +1,223 @@
+"""
+Point-in-time stock via periodic snapshots.
+
+At every STOCK_SNAPSHOT_INTERVAL boundary (month, week or day start, UTC) the
+worker records each account's stock per item in stock_snapshots. A snapshot is
+compact: parallel arrays, split into chunks of STOCK_SNAPSHOT_CHUNK items.
+
+    {"_id": "<account_id>:<as_of>:<chunk>", "account_id", "as_of", "chunk",
+     "item_ids": [...], "stock": [...], "created_at"}
+
+Stock "as of" an instant counts every movement logged before it. A historical
+balance is then the nearest snapshot (before or after the instant, or the live
+stock) adjusted by the movements in between, so only a bounded tail of
+stock_transactions is ever read instead of the whole history:
+
+    stock(t) = snapshot(s) + sum(movements in [s, t))      s <= t
+    stock(t) = snapshot(s) - sum(movements in [t, s))      s >  t
+
+Snapshots are built forward from the log and never read live stock: the first
+one from opening stock plus every movement before it, each later one from the
+previous snapshot plus the movements in between. Stock is changed before its
+log entry is written, so live stock can include movements the log does not have
+yet; a boundary is only snapshotted STOCK_SNAPSHOT_LAG_SECONDS after it passed,
+by when its movements are logged.
+
+Transfers between locations and reconciliation adjustments (app.core.reconcile)
+are neutral for the item total.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core.stock import with_shards
+from app.core.stock_log import STOCK_TRANSACTIONS, meta_query
+
+SNAPSHOT_INTERVALS = ["daily", "weekly", "monthly"]
+
+# Signed effect of a log entry on the item total
+SIGNED_QUANTITY = {"$switch": {
+    "branches": [
+        {"case": {"$eq": ["$transaction_type", "in"]}, "then": "$quantity"},
+        {"case": {"$eq": ["$transaction_type", "out"]}, "then": {"$multiply": ["$quantity", -1]}},
+    ],
+    "default": 0
+}}
+
+
+def boundary_at_or_before(when: datetime, interval: str = None) -> datetime:
+    interval = interval or settings.STOCK_SNAPSHOT_INTERVAL
+    day = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "daily":
+        return day
+    if interval == "weekly":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_boundary(boundary: datetime, interval: str = None) -> datetime:
+    interval = interval or settings.STOCK_SNAPSHOT_INTERVAL
+    if interval == "daily":
+        return boundary + timedelta(days=1)
+    if interval == "weekly":
+        return boundary + timedelta(weeks=1)
+    return (boundary.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def movement_totals(database, account_id: str, start: datetime, end: datetime, item_ids=None, session=None) -> dict:
+    """item_id -> signed quantity moved in [start, end), one aggregation over the log (start None = from the beginning)."""
+    if start is not None and start >= end:
+        return {}
+    window = {"$lt": end} if start is None else {"$gte": start, "$lt": end}
+    match = {**meta_query(account_id, item_ids), "transaction_date": window}
+    return {
+        row["_id"]: row["quantity"]
+        for row in database[STOCK_TRANSACTIONS].aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$meta.item_id", "quantity": {"$sum": SIGNED_QUANTITY}}}
+        ], session=session)
+    }
+
+
+def live_stock(database, account_id: str, item_ids=None, session=None) -> dict:
+    """item_id -> current stock (sharded counters included)."""
+    query = {"account_id": account_id}
+    if item_ids:
+        query["item_id"] = {"$in": list(item_ids)}
+    items = list(database["items"].find(
+        query, projection={"item_id": 1, "current_stock": 1, "stock_shards": 1, "created_at": 1}, session=session
+    ))
+    return {item["item_id"]: item.get("current_stock") or 0 for item in with_shards(database, account_id, items)}
+
+
+def load_snapshot(database, account_id: str, as_of: datetime, item_ids=None, session=None) -> dict:
+    wanted = set(item_ids) if item_ids else None
+    stock = {}
+    for chunk in database["stock_snapshots"].find({"account_id": account_id, "as_of": as_of}, session=session):
+        for item_id, qty in zip(chunk["item_ids"], chunk["stock"]):
+            if wanted is None or item_id in wanted:
+                stock[item_id] = qty
+    return stock
+
+
+def take_snapshot(database, account_id: str, as_of: datetime, previous: datetime = None) -> int:
+    """
+    Record stock as of `as_of`: the `previous` snapshot (or opening stock, for a
+    first snapshot) plus what moved in between. Items created later, or deleted
+    since, are left out. Rewriting an existing snapshot is harmless. Returns the
+    number of items recorded.
+    """
+    now = datetime.utcnow()
+    stock = defaultdict(float)
+    if previous:
+        stock.update(load_snapshot(database, account_id, previous))
+        created = {"account_id": account_id, "created_at": {"$gte": previous, "$lt": as_of}}
+    else:
+        created = {"account_id": account_id, "$or": [{"created_at": {"$lt": as_of}}, {"created_at": None}]}
+    for item in database["items"].find(created, projection={"item_id": 1, "opening_stock": 1}):
+        stock[item["item_id"]] += item.get("opening_stock") or 0
+    for item_id, moved in movement_totals(database, account_id, previous, as_of).items():
+        stock[item_id] += moved
+    existing = {
+        doc["item_id"] for doc in database["items"].find(
+            {"account_id": account_id, "$or": [{"created_at": {"$lt": as_of}}, {"created_at": None}]},
+            projection={"item_id": 1}
+        )
+    }
+    entries = sorted((item_id, round(qty, 6)) for item_id, qty in stock.items() if item_id in existing)
+
+    size = settings.STOCK_SNAPSHOT_CHUNK
+    chunks = [entries[i:i + size] for i in range(0, len(entries), size)] or [[]]
+    for number, chunk in enumerate(chunks):
+        database["stock_snapshots"].replace_one(
+            {"_id": f"{account_id}:{as_of.isoformat()}:{number}"},
+            {
+                "account_id": account_id,
+                "as_of": as_of,
+                "chunk": number,
+                "item_ids": [item_id for item_id, _ in chunk],
+                "stock": [qty for _, qty in chunk],
+                "created_at": now
+            },
+            upsert=True
+        )
+    # A rewrite with fewer chunks leaves none of the old ones behind
+    database["stock_snapshots"].delete_many({"account_id": account_id, "as_of": as_of, "chunk": {"$gte": len(chunks)}})
+    return len(entries)
+
+
+def take_due_snapshots(database, now: datetime = None, limit: int = 24) -> int:
+    """
+    Snapshot every account in the database at each boundary it is missing, from
+    its last snapshot (or just the latest boundary, for a first snapshot) up to
+    the last boundary older than STOCK_SNAPSHOT_LAG_SECONDS.
+    Returns the number of snapshots written.
+    """
+    now = now or datetime.utcnow()
+    # Movements just before a boundary may not be logged yet
+    latest = boundary_at_or_before(now - timedelta(seconds=settings.STOCK_SNAPSHOT_LAG_SECONDS))
+    written = 0
+    for account_id in database["items"].distinct("account_id"):
+        last = database["stock_snapshots"].find_one(
+            {"account_id": account_id}, projection={"as_of": 1}, sort=[("as_of", -1)]
+        )
+        previous = last["as_of"] if last else None
+        boundary = next_boundary(previous) if last else latest
+        for _ in range(limit):
+            if boundary > latest:
+                break
+            take_snapshot(database, account_id, boundary, previous)
+            written += 1
+            previous, boundary = boundary, next_boundary(boundary)
+    return written
+
+
+def stock_as_of(database, account_id: str, when: datetime, item_ids=None, session=None):
+    """
+    item_id -> stock as of `when`, from the closest snapshot or the live stock.
+    Returns (stock, base) where base is the snapshot time used (None = live stock).
+    """
+    now = datetime.utcnow()
+    before = database["stock_snapshots"].find_one(
+        {"account_id": account_id, "as_of": {"$lte": when}}, projection={"as_of": 1}, sort=[("as_of", -1)], session=session
+    )
+    after = database["stock_snapshots"].find_one(
+        {"account_id": account_id, "as_of": {"$gt": when}}, projection={"as_of": 1}, sort=[("as_of", 1)], session=session
+    )
+    candidates = [(when - before["as_of"], before["as_of"])] if before else []
+    if after:
+        candidates.append((after["as_of"] - when, after["as_of"]))
+    if when < now:
+        candidates.append((now - when, None))
+    if not candidates:
+        # Asking about the future: the live stock is the best answer
+        return live_stock(database, account_id, item_ids, session), None
+    _, base = min(candidates, key=lambda candidate: candidate[0])
+
+    stock = defaultdict(float)
+    if base is None:
+        stock.update(live_stock(database, account_id, item_ids, session))
+        moved = movement_totals(database, account_id, when, now, item_ids, session)
+        sign = -1
+    else:
+        stock.update(load_snapshot(database, account_id, base, item_ids, session))
+        if base <= when:
+            moved, sign = movement_totals(database, account_id, base, when, item_ids, session), 1
+            # Items created since the snapshot start from their opening stock
+            query = {"account_id": account_id, "created_at": {"$gte": base, "$lte": when}}
+            if item_ids:
+                query["item_id"] = {"$in": list(item_ids)}
+            for item in database["items"].find(query, projection={"item_id": 1, "opening_stock": 1}, session=session):
+                stock[item["item_id"]] += item.get("opening_stock") or 0
+        else:
+            moved, sign = movement_totals(database, account_id, when, base, item_ids, session), -1
+    for item_id, qty in moved.items():
+        stock[item_id] += sign * qty
+
+    # Items created after `when` did not exist yet
+    created_later = {
+        doc["item_id"] for doc in database["items"].find(
+            {"account_id": account_id, "created_at": {"$gt": when}}, projection={"item_id": 1}, session=session
+        )
+    }
+    return {item_id: round(qty, 6) for item_id, qty in stock.items() if item_id not in created_later}, base
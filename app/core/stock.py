@@ -0,0 +1,221 @@
+"""
+Stock movements.
+
+Every change to an item's current_stock goes through apply_movements: one
+find_one_and_update per movement applies the $inc and returns the new stock in
+the same atomic step, so previous_stock/new_stock in the log are exact even under
+concurrent edits, and the whole batch is logged (app.core.stock_log) with a
+single insert_many.
+
+Hot items can opt into sharded counters (items.stock_shards = N). Their
+movements $inc one of N documents in stock_counters, picked at random, instead
+of the item itself, so concurrent invoices stop queueing on a single document.
+An item's stock is then
+
+    current_stock + sum(stock_counters.delta)
+
+read with one aggregation (with_shards), and fold_stock_counters moves the
+pending deltas back into current_stock (recurring_worker.py runs it every pass).
+The items list folds stock_counters.updated_at into its sync version, so cached
+item lists see sharded movements before they are folded.
+Sharded movements are logged without previous_stock/new_stock: the running total
+is not known without reading every shard.
+"""
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+
+from app.core.config import settings
+from app.core.database import db as db_core
+from app.core.locations import move_location_stock
+from app.core.stock_log import log_transactions
+
+STOCK_COUNTERS = "stock_counters"
+
+
+class StockMovement(NamedTuple):
+    item_id: str
+    item_name: str
+    quantity: float # Signed: positive adds stock, negative removes it
+    notes: Optional[str] = None # Overrides the batch note for this movement
+    reserved: float = 0 # Reservation consumed by this movement, released from reserved_stock in the same update
+    unit_cost: Optional[float] = None # Purchase rate of stock received, for valuation (app.core.valuation)
+
+
+def apply_movements(database, account_id: str, movements: List[StockMovement], reference: dict, notes: str,
+                    upsert: bool = False, session=None, location_id: str = None) -> List[dict]:
+    """
+    Apply signed stock movements and log them. reference holds the source document's
+    id/number fields (invoice_id, bill_id, po_id, ...) copied onto each transaction.
+    upsert creates a missing item, only for movements that add stock. With a
+    location_id the location's stock (app.core.locations) moves too. Returns the
+    transactions. With a session they are not logged yet: the log cannot join a
+    multi-document transaction, so the caller passes them to log_transactions
+    after committing.
+    """
+    now = datetime.utcnow()
+    sharded = sharded_items(database, account_id)
+    transactions = []
+    for movement in movements:
+        if movement.quantity == 0:
+            continue
+        if movement.item_id in sharded:
+            _shard_inc(database, account_id, movement, sharded[movement.item_id], now, session)
+            item, new_stock = None, None
+        else:
+            inc = {"current_stock": movement.quantity}
+            if movement.reserved:
+                inc["reserved_stock"] = -movement.reserved
+            item = database["items"].find_one_and_update(
+                {"item_id": movement.item_id, "account_id": account_id},
+                {"$inc": inc, "$set": {"updated_at": now}},
+                projection={"current_stock": 1},
+                upsert=upsert and movement.quantity > 0,
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            new_stock = item.get("current_stock", 0) if item else None
+        if location_id:
+            move_location_stock(
+                database, account_id, location_id, movement.item_id, movement.item_name, movement.quantity, now, session
+            )
+        transactions.append({
+            "transaction_id": str(uuid.uuid4()),
+            "item_id": movement.item_id,
+            "item_name": movement.item_name,
+            **reference,
+            "account_id": account_id,
+            "transaction_type": "in" if movement.quantity > 0 else "out",
+            "quantity": abs(movement.quantity),
+            "previous_stock": new_stock - movement.quantity if item else None,
+            "new_stock": new_stock,
+            "transaction_date": now,
+            "location_id": location_id,
+            "unit_cost": movement.unit_cost,
+            "notes": movement.notes or notes
+        })
+    if session is None:
+        log_transactions(database, transactions)
+    return transactions
+
+
+# Sharded counters
+
+_sharded_cache = {}
+
+
+def sharded_items(database, account_id: str) -> dict:
+    """
+    item_id -> shard count for the account's sharded items, cached per worker for
+    STOCK_SHARD_CACHE_SECONDS. A stale entry only changes where a delta is written,
+    never the total, so switching an item in or out of sharding needs no coordination.
+    """
+    key = (database.name, account_id)
+    now = time.monotonic()
+    cached = _sharded_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+    sharded = {
+        doc["item_id"]: doc["stock_shards"]
+        for doc in database["items"].find(
+            {"account_id": account_id, "stock_shards": {"$gt": 0}},
+            projection={"item_id": 1, "stock_shards": 1}
+        )
+    }
+    _sharded_cache[key] = (now + settings.STOCK_SHARD_CACHE_SECONDS, sharded)
+    return sharded
+
+
+def invalidate_sharded_items(database, account_id: str):
+    _sharded_cache.pop((database.name, account_id), None)
+
+
+def _shard_inc(database, account_id: str, movement: StockMovement, shards: int, now: datetime, session=None):
+    shard = random.randrange(shards)
+    database[STOCK_COUNTERS].update_one(
+        {"_id": f"{account_id}:{movement.item_id}:{shard}"},
+        {
+            "$inc": {"delta": movement.quantity},
+            "$set": {"account_id": account_id, "item_id": movement.item_id, "shard": shard, "updated_at": now}
+        },
+        upsert=True,
+        session=session
+    )
+    if movement.reserved:
+        # Reservations are rare next to sales; they stay on the item document
+        database["items"].update_one(
+            {"item_id": movement.item_id, "account_id": account_id},
+            {"$inc": {"reserved_stock": -movement.reserved}, "$set": {"updated_at": now}},
+            session=session
+        )
+
+
+def shards_changed_since(database, account_id: str, since: datetime) -> list:
+    """Items whose shard counters moved since the given time (their item document may not have)."""
+    return database[STOCK_COUNTERS].distinct("item_id", {"account_id": account_id, "updated_at": {"$gte": since}})
+
+
+def pending_deltas(database, account_id: str, item_ids) -> dict:
+    """item_id -> stock moved into shards and not folded yet."""
+    if not item_ids:
+        return {}
+    return {
+        row["_id"]: row["delta"]
+        for row in database[STOCK_COUNTERS].aggregate([
+            {"$match": {"account_id": account_id, "item_id": {"$in": list(item_ids)}}},
+            {"$group": {"_id": "$item_id", "delta": {"$sum": "$delta"}}}
+        ])
+    }
+
+
+def with_shards(database, account_id: str, items: List[dict]) -> List[dict]:
+    """Add pending shard deltas to the current_stock of sharded item documents (in place)."""
+    pending = pending_deltas(database, account_id, [item["item_id"] for item in items if item.get("stock_shards")])
+    for item in items:
+        if pending.get(item["item_id"]):
+            item["current_stock"] = (item.get("current_stock") or 0) + pending[item["item_id"]]
+    return items
+
+
+def fold_stock_counters(database, account_id: str = None, item_id: str = None, limit: int = 1000) -> int:
+    """
+    Move pending shard deltas into items.current_stock, one transaction per item.
+    Shards are decremented by what was read rather than reset, so deltas written
+    meanwhile are kept. Returns the number of items folded.
+    """
+    query = {"delta": {"$ne": 0}}
+    if account_id:
+        query["account_id"] = account_id
+    if item_id:
+        query["item_id"] = item_id
+    pending = list(database[STOCK_COUNTERS].aggregate([
+        {"$match": query},
+        {"$group": {"_id": {"account_id": "$account_id", "item_id": "$item_id"}}},
+        {"$limit": limit}
+    ]))
+
+    for group in pending:
+        item_query = {"account_id": group["_id"]["account_id"], "item_id": group["_id"]["item_id"]}
+
+        def fold(session):
+            shards = list(database[STOCK_COUNTERS].find(
+                {**item_query, "delta": {"$ne": 0}}, projection={"delta": 1}, session=session
+            ))
+            if not shards:
+                return
+            database[STOCK_COUNTERS].bulk_write(
+                [UpdateOne({"_id": shard["_id"]}, {"$inc": {"delta": -shard["delta"]}}) for shard in shards],
+                ordered=False, session=session
+            )
+            database["items"].update_one(
+                item_query,
+                {"$inc": {"current_stock": sum(shard["delta"] for shard in shards)}, "$set": {"updated_at": datetime.utcnow()}},
+                session=session
+            )
+
+        db_core.run_in_transaction(database.client, fold)
+    return len(pending)
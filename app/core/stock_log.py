@@ -0,0 +1,93 @@
+"""
+Storage of the stock movement log.
+
+stock_transactions is a MongoDB time-series collection (5.0+):
+
+    timeField  transaction_date
+    metaField  meta = {"account_id", "item_id"}
+
+so one item's movements are stored together in compressed buckets and a
+date-range read of an item touches only its own buckets. The rules for writers
+and readers:
+
+- Write only through log_transactions, which moves account_id/item_id into meta.
+  Never inside a multi-document transaction (time-series collections cannot be
+  written in one): callers log after their transaction commits.
+- Log entries are immutable. Corrections are new movements, never updates.
+- Filter on meta.account_id / meta.item_id, not on the top-level names, or every
+  bucket is unpacked. flatten() restores the top-level fields for API responses.
+
+migrate_stock_transactions.py converts an existing regular collection.
+"""
+import base64
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import CollectionInvalid
+
+STOCK_TRANSACTIONS = "stock_transactions"
+TIMESERIES_OPTIONS = {"timeField": "transaction_date", "metaField": "meta", "granularity": "hours"}
+
+
+def ensure_stock_transactions(database) -> bool:
+    """Create stock_transactions as a time-series collection unless it exists. Returns True if created."""
+    if database.list_collection_names(filter={"name": STOCK_TRANSACTIONS}):
+        return False
+    try:
+        database.create_collection(STOCK_TRANSACTIONS, timeseries=TIMESERIES_OPTIONS)
+    except CollectionInvalid:
+        # Created by another process meanwhile
+        return False
+    return True
+
+
+def is_time_series(database, name: str = STOCK_TRANSACTIONS) -> bool:
+    info = next(iter(database.list_collections(filter={"name": name})), None)
+    return bool(info) and info.get("type") == "timeseries"
+
+
+def to_stored(transaction: dict) -> dict:
+    doc = {key: value for key, value in transaction.items() if key not in ("account_id", "item_id", "meta")}
+    doc["meta"] = {"account_id": transaction["account_id"], "item_id": transaction["item_id"]}
+    return doc
+
+
+def log_transactions(database, transactions) -> int:
+    """Append movements (dicts with top-level account_id and item_id) to the log."""
+    if not transactions:
+        return 0
+    database[STOCK_TRANSACTIONS].insert_many([to_stored(t) for t in transactions], ordered=False)
+    return len(transactions)
+
+
+def meta_query(account_id: str, item_id=None) -> dict:
+    query = {"meta.account_id": account_id}
+    if item_id:
+        query["meta.item_id"] = {"$in": list(item_id)} if isinstance(item_id, (list, set, tuple)) else item_id
+    return query
+
+
+def flatten(doc: dict) -> dict:
+    meta = doc.pop("meta", None) or {}
+    doc.setdefault("account_id", meta.get("account_id"))
+    doc.setdefault("item_id", meta.get("item_id"))
+    return doc
+
+
+def encode_cursor(doc: dict) -> str:
+    """Opaque keyset cursor after doc, for newest-first pages."""
+    raw = f"{doc['transaction_date'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def cursor_query(cursor: str) -> dict:
+    """Filter for the movements older than the cursor's; ValueError on a malformed cursor."""
+    try:
+        when, oid = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        when, oid = datetime.fromisoformat(when), ObjectId(oid)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return {"$or": [
+        {"transaction_date": {"$lt": when}},
+        {"transaction_date": when, "_id": {"$lt": oid}},
+    ]}
@@ -0,0 +1,71 @@
+"""
+Delta-sync helpers for master-data list endpoints (items, customers, weavers, categories).
+
+The frontend cache (static/js/main.js `masterData`) revalidates with If-None-Match and,
+when something changed, asks only for records with `updated_at >= updated_since`.
+"""
+import hashlib
+from datetime import datetime
+from fastapi import Request, Response
+
+SYNC_EXCLUDED_PARAMS = {"updated_since"}
+
+
+def _latest_update(collection, account_id):
+    latest = collection.find_one(
+        {"account_id": account_id, "updated_at": {"$exists": True}},
+        sort=[("updated_at", -1)],
+        projection={"updated_at": 1, "_id": 0}
+    )
+    return latest["updated_at"] if latest else None
+
+
+def collection_version(collection, account_id, active_only=True, related=None):
+    """Cheap change marker for one tenant's collection: (latest updated_at, document count).
+    The count covers the records a full list returns (active ones unless active_only is
+    False), so the client can compare it with its cache after merging a delta. related
+    is a collection whose updates change the listed records without touching them
+    (stock_counters for items); its latest updated_at counts too."""
+    latest_at = _latest_update(collection, account_id)
+    if related is not None:
+        related_at = _latest_update(related, account_id)
+        if related_at and (not latest_at or related_at > latest_at):
+            latest_at = related_at
+    query = {"account_id": account_id}
+    if active_only:
+        query["status"] = {"$ne": "inactive"}
+    total = collection.count_documents(query)
+    return latest_at, total
+
+
+def sync_etag(request: Request, account_id: str, latest_at, total):
+    """Weak ETag over the tenant's collection version and the non-delta query parameters,
+    so a delta request with an unchanged collection revalidates to 304."""
+    params = sorted((k, v) for k, v in request.query_params.multi_items() if k not in SYNC_EXCLUDED_PARAMS)
+    raw = f"{account_id}|{latest_at.isoformat() if latest_at else ''}|{total}|{params}"
+    return 'W/"%s"' % hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def begin_sync(request: Request, collection, account_id: str, active_only: bool = True, related=None):
+    """Returns (headers, not_modified_response). When the client's If-None-Match
+    still matches, the caller should return the 304 response without querying."""
+    latest_at, total = collection_version(collection, account_id, active_only, related)
+    etag = sync_etag(request, account_id, latest_at, total)
+    headers = {
+        "ETag": etag,
+        "X-Total-Count": str(total),
+        "X-Sync-Timestamp": latest_at.isoformat() if latest_at else "",
+        "Cache-Control": "private, no-cache",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return headers, Response(status_code=304, headers=headers)
+    return headers, None
+
+
+def delta_query(account_id: str, updated_since: datetime, also: dict = None):
+    """Changed-record query. Inactive records are included so deactivations propagate.
+    also matches records changed through a related collection (see collection_version)."""
+    changed = {"updated_at": {"$gte": updated_since}}
+    if also:
+        return {"account_id": account_id, "$or": [changed, also]}
+    return {"account_id": account_id, **changed}
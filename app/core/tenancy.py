@@ -0,0 +1,140 @@
+"""
+Tenant placement directory.
+
+Every account lives in the shared database (settings.DATABASE_NAME) unless the
+`tenant_placements` collection of that home database says otherwise:
+
+    {
+        "account_id": "...",
+        "database_name": "billing_acme",   # where the account's business collections live
+        "mongo_uri": None,                 # None = the main cluster, else a dedicated cluster
+        "state": "active" | "cutover",     # cutover: migrate_tenant.py is flipping the entry
+        "target": {...},                   # only during cutover
+        "updated_at": datetime
+    }
+
+Global collections (users, accounts, sessions, rate limits, idempotency keys, the
+directory itself) stay in the home database; TenantDatabase routes every other
+collection to the placement.
+Placements are cached per worker for TENANT_DIRECTORY_CACHE_SECONDS.
+"""
+import threading
+import time
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.database import db, report_read_preference
+
+GLOBAL_COLLECTIONS = {"users", "accounts", "sessions", "tenant_placements", "rate_limits", "idempotency_keys"}
+PLACEMENT_ACTIVE = "active"
+PLACEMENT_CUTOVER = "cutover"
+
+
+class TenantDatabase:
+    """
+    Drop-in for a pymongo Database in the routers: `database["invoices"]` resolves to
+    the account's placement, `database["users"]` to the home database.
+    """
+
+    def __init__(self, home, tenant, placement=None):
+        self.home = home
+        self.tenant = tenant
+        self.placement = placement
+
+    def __getitem__(self, name):
+        return self.home[name] if name in GLOBAL_COLLECTIONS else self.tenant[name]
+
+    def get_collection(self, name, **kwargs):
+        target = self.home if name in GLOBAL_COLLECTIONS else self.tenant
+        return target.get_collection(name, **kwargs)
+
+    @property
+    def client(self):
+        """Client owning the tenant's data (sessions and transactions must be started on it)."""
+        return self.tenant.client
+
+    @property
+    def name(self):
+        return self.tenant.name
+
+
+class TenantDirectory:
+    def __init__(self):
+        self._cache = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def collection(self):
+        return db.get_db()["tenant_placements"]
+
+    def get_placement(self, account_id: str):
+        """Directory entry for account_id, or None when it lives in the home database."""
+        now = time.monotonic()
+        cached = self._cache.get(account_id)
+        if cached and cached[0] > now:
+            return cached[1]
+        placement = self.collection().find_one({"account_id": account_id}, projection={"_id": 0})
+        self._cache[account_id] = (now + settings.TENANT_DIRECTORY_CACHE_SECONDS, placement)
+        return placement
+
+    def invalidate(self, account_id: str = None):
+        if account_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(account_id, None)
+
+    def get_client(self, mongo_uri: str = None):
+        """Main client, or a lazily opened (per worker) client for a dedicated cluster."""
+        if not mongo_uri or mongo_uri == settings.MONGO_URI:
+            return db.client
+        with self._lock:
+            if mongo_uri not in self._clients:
+                self._clients[mongo_uri] = db.open_client(mongo_uri)
+            return self._clients[mongo_uri]
+
+    def database_for(self, placement, read_preference=None):
+        """pymongo Database for a placement (None = home)."""
+        if not placement:
+            client, name = db.client, settings.DATABASE_NAME
+        else:
+            client, name = self.get_client(placement.get("mongo_uri")), placement["database_name"]
+        if not client:
+            raise Exception("Database client not initialized. Check your MongoDB connection.")
+        if read_preference is not None:
+            return client.get_database(name, read_preference=read_preference)
+        return client[name]
+
+    def tenant_db(self, account_id: str, placement=None) -> TenantDatabase:
+        placement = placement if placement is not None else self.get_placement(account_id)
+        return TenantDatabase(db.get_db(), self.database_for(placement), placement)
+
+    def tenant_report_db(self, account_id: str) -> TenantDatabase:
+        placement = self.get_placement(account_id)
+        return TenantDatabase(
+            db.get_report_db(),
+            self.database_for(placement, read_preference=report_read_preference()),
+            placement
+        )
+
+    def set_placement(self, account_id: str, **fields):
+        fields["updated_at"] = datetime.utcnow()
+        self.collection().update_one(
+            {"account_id": account_id},
+            {"$set": fields, "$setOnInsert": {"account_id": account_id}},
+            upsert=True
+        )
+        self.invalidate(account_id)
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+        self._cache.clear()
+
+
+def is_cutover(placement) -> bool:
+    return bool(placement) and placement.get("state") == PLACEMENT_CUTOVER
+
+
+tenants = TenantDirectory()
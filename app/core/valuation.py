@@ -0,0 +1,313 @@
+"""
+Inventory valuation from actual purchase costs.
+
+The stock log (app.core.stock_log) is the input: stock received on purchase
+bills and PO receipts is logged with the line's rate as unit_cost. A worker pass
+(recurring_worker.py) feeds each account's new log entries, item by item in date
+order, into a compact cost state per item in item_costs:
+
+    {"_id": "<account_id>:<item_id>", "account_id", "item_id", "method",
+     "quantity", "value", "avg_cost", "layers": [[qty, cost], ...], "as_of"}
+
+- weighted_average: a receipt moves avg_cost to the blended cost; an issue takes
+  stock out at avg_cost.
+- fifo: receipts queue a layer (layers, oldest first); an issue consumes layers
+  from the front. avg_cost is value / quantity.
+
+Stock coming back without a cost (cancelled invoices, reduced bill lines) and
+stock issued beyond what was costed are valued at avg_cost. An item starts from
+its opening stock at opening_stock_rate (else purchase_price). Transfers between
+locations do not change the value.
+
+The cost of every sale lands in cost_of_sales, one document per item and day:
+
+    {"_id": "<account_id>:<item_id>:<YYYY-MM-DD>", "account_id", "item_id", "day", "quantity", "cost"}
+
+so inventory value is one $group over item_costs and margins one over
+cost_of_sales; nothing replays history at read time. The log is written after
+the stock update commits, so a pass only takes entries older than
+VALUATION_LAG_SECONDS and remembers where it stopped (valuation_runs.watermark).
+Each item_costs document carries its own as_of too: a pass that dies halfway is
+simply repeated, and entries an item has already absorbed are skipped.
+"""
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from pymongo import ReplaceOne, UpdateOne
+
+from app.core.config import settings
+from app.core.database import db as db_core
+from app.core.stock_log import STOCK_TRANSACTIONS, meta_query
+
+VALUATION_METHODS = ["weighted_average", "fifo"]
+ITEM_COSTS = "item_costs"
+COST_OF_SALES = "cost_of_sales"
+VALUATION_RUNS = "valuation_runs"
+
+WRITE_CHUNK = 500 # Items whose cost state is written per transaction
+
+
+def new_state(account_id: str, item_id: str, method: str, opening_stock: float = 0, cost: float = 0) -> dict:
+    state = {
+        "_id": f"{account_id}:{item_id}",
+        "account_id": account_id,
+        "item_id": item_id,
+        "method": method,
+        "quantity": 0.0,
+        "value": 0.0,
+        "avg_cost": cost or 0.0,
+        "layers": [],
+        "as_of": None
+    }
+    if opening_stock:
+        receive(state, opening_stock, cost)
+    return state
+
+
+def opening_cost(item: dict) -> float:
+    return item.get("opening_stock_rate") or item.get("purchase_price") or 0.0
+
+
+def _settle(state: dict):
+    quantity = round(state["quantity"], 6)
+    state["quantity"] = quantity
+    if state["method"] == "fifo":
+        state["layers"] = [layer for layer in state["layers"] if round(layer[0], 6) > 0]
+        if quantity > 0:
+            state["value"] = round(sum(qty * cost for qty, cost in state["layers"]), 6)
+            state["avg_cost"] = round(state["value"] / quantity, 6)
+            return
+    state["value"] = round(quantity * state["avg_cost"], 6)
+
+
+def receive(state: dict, quantity: float, cost: float = None):
+    """Add stock at `cost` (None = at the current average cost)."""
+    cost = state["avg_cost"] if cost is None else cost
+    if state["quantity"] <= 0:
+        # Stock issued ahead of any receipt was costed at avg_cost; the receipt resets it
+        state["quantity"] += quantity
+        state["avg_cost"] = cost
+        state["layers"] = [[state["quantity"], cost]] if state["method"] == "fifo" and state["quantity"] > 0 else []
+    elif state["method"] == "fifo":
+        state["quantity"] += quantity
+        if state["layers"] and state["layers"][-1][1] == cost:
+            state["layers"][-1][0] += quantity
+        else:
+            state["layers"].append([quantity, cost])
+    else:
+        value = state["quantity"] * state["avg_cost"] + quantity * cost
+        state["quantity"] += quantity
+        if state["quantity"] > 0:
+            state["avg_cost"] = round(value / state["quantity"], 6)
+    _settle(state)
+
+
+def issue(state: dict, quantity: float) -> float:
+    """Take stock out; returns its cost."""
+    cost = 0.0
+    if state["method"] == "fifo":
+        remaining = quantity
+        while remaining > 0 and state["layers"]:
+            layer = state["layers"][0]
+            taken = min(layer[0], remaining)
+            cost += taken * layer[1]
+            layer[0] -= taken
+            remaining -= taken
+            if layer[0] <= 0:
+                state["avg_cost"] = layer[1]
+                state["layers"].pop(0)
+        cost += remaining * state["avg_cost"]
+    else:
+        cost = quantity * state["avg_cost"]
+    state["quantity"] -= quantity
+    _settle(state)
+    return round(cost, 6)
+
+
+def apply_entry(state: dict, entry: dict):
+    """
+    Feed one log entry into the state. Returns (quantity sold, cost of sales) for
+    invoice movements, negative for a cancelled sale, else None.
+    """
+    quantity = entry.get("quantity") or 0
+    if entry.get("transaction_type") == "in":
+        cost = state["avg_cost"] if entry.get("unit_cost") is None else entry["unit_cost"]
+        receive(state, quantity, cost)
+        return (-quantity, -round(quantity * cost, 6)) if entry.get("invoice_id") else None
+    if entry.get("transaction_type") == "out":
+        cost = issue(state, quantity)
+        return (quantity, cost) if entry.get("invoice_id") else None
+    return None
+
+
+def account_method(database, account_id: str) -> str:
+    run = database[VALUATION_RUNS].find_one({"_id": account_id}, projection={"method": 1})
+    return (run or {}).get("method") or settings.INVENTORY_VALUATION_METHOD
+
+
+def value_account(database, account_id: str, now: datetime = None) -> int:
+    """
+    Bring the account's item costs up to now - VALUATION_LAG_SECONDS. The first
+    pass starts every item from its opening stock and replays the whole log.
+    Returns the number of log entries valued.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.VALUATION_LAG_SECONDS)
+    database[VALUATION_RUNS].update_one(
+        {"_id": account_id},
+        {"$setOnInsert": {"method": settings.INVENTORY_VALUATION_METHOD, "watermark": None}},
+        upsert=True
+    )
+    # One worker per account at a time: the cost_of_sales $inc must not be applied twice
+    run = database[VALUATION_RUNS].find_one_and_update(
+        {"_id": account_id, "$or": [{"leased_until": None}, {"leased_until": {"$lt": now}}]},
+        {"$set": {"leased_until": now + timedelta(seconds=settings.VALUATION_LEASE_SECONDS)}}
+    )
+    if not run:
+        return 0
+    method = run.get("method") or settings.INVENTORY_VALUATION_METHOD
+    watermark = run.get("watermark")
+    if watermark and watermark >= cutoff:
+        database[VALUATION_RUNS].update_one({"_id": account_id}, {"$set": {"leased_until": None}})
+        return 0
+
+    item_query = {"account_id": account_id}
+    if watermark:
+        item_query["created_at"] = {"$gt": watermark, "$lte": cutoff}
+    items = {
+        item["item_id"]: item for item in database["items"].find(
+            item_query, projection={"item_id": 1, "opening_stock": 1, "opening_stock_rate": 1, "purchase_price": 1}
+        )
+    }
+
+    log_query = {**meta_query(account_id), "transaction_date": {"$lte": cutoff}}
+    if watermark:
+        log_query["transaction_date"]["$gt"] = watermark
+    entries = database[STOCK_TRANSACTIONS].find(
+        log_query,
+        projection={"meta": 1, "transaction_type": 1, "quantity": 1, "unit_cost": 1, "invoice_id": 1, "transaction_date": 1}
+    ).sort([("meta.item_id", 1), ("transaction_date", 1)])
+
+    valued = 0
+    pending = []
+    seen = set()
+
+    def flush():
+        states = {
+            doc["item_id"]: doc for doc in database[ITEM_COSTS].find(
+                {"_id": {"$in": [f"{account_id}:{item_id}" for item_id, _ in pending]}}
+            )
+        }
+        missing = [item_id for item_id, _ in pending if item_id not in states and item_id not in items]
+        if missing:
+            items.update({
+                item["item_id"]: item for item in database["items"].find(
+                    {"account_id": account_id, "item_id": {"$in": missing}},
+                    projection={"item_id": 1, "opening_stock": 1, "opening_stock_rate": 1, "purchase_price": 1}
+                )
+            })
+        writes, sales = [], []
+        for item_id, item_entries in pending:
+            state = states.get(item_id)
+            if state is None:
+                item = items.get(item_id, {})
+                state = new_state(account_id, item_id, method, item.get("opening_stock") or 0, opening_cost(item))
+            for entry in item_entries:
+                if state["as_of"] and entry["transaction_date"] <= state["as_of"]:
+                    continue
+                sale = apply_entry(state, entry)
+                if sale:
+                    sales.append(UpdateOne(
+                        {"_id": f"{account_id}:{item_id}:{entry['transaction_date']:%Y-%m-%d}"},
+                        {
+                            "$inc": {"quantity": sale[0], "cost": sale[1]},
+                            "$setOnInsert": {
+                                "account_id": account_id,
+                                "item_id": item_id,
+                                "day": entry["transaction_date"].replace(hour=0, minute=0, second=0, microsecond=0)
+                            }
+                        },
+                        upsert=True
+                    ))
+            state["as_of"] = cutoff
+            state["updated_at"] = now
+            writes.append(ReplaceOne({"_id": state["_id"]}, state, upsert=True))
+
+        def write(session):
+            database[ITEM_COSTS].bulk_write(writes, ordered=False, session=session)
+            if sales:
+                database[COST_OF_SALES].bulk_write(sales, ordered=False, session=session)
+
+        db_core.run_in_transaction(database.client, write)
+        pending.clear()
+        database[VALUATION_RUNS].update_one(
+            {"_id": account_id},
+            {"$set": {"leased_until": datetime.utcnow() + timedelta(seconds=settings.VALUATION_LEASE_SECONDS)}}
+        )
+
+    for item_id, group in groupby(entries, key=lambda entry: entry["meta"]["item_id"]):
+        group = list(group)
+        pending.append((item_id, group))
+        seen.add(item_id)
+        valued += len(group)
+        if len(pending) >= WRITE_CHUNK:
+            flush()
+    # New items without movements still carry their opening stock
+    for item_id in items:
+        if item_id not in seen:
+            pending.append((item_id, []))
+            if len(pending) >= WRITE_CHUNK:
+                flush()
+    if pending:
+        flush()
+
+    database[VALUATION_RUNS].update_one(
+        {"_id": account_id},
+        {"$set": {"watermark": cutoff, "leased_until": None, "updated_at": now}}
+    )
+    return valued
+
+
+def value_due_accounts(database, now: datetime = None) -> int:
+    """value_account for every account in the database. Returns the number of log entries valued."""
+    return sum(value_account(database, account_id, now) for account_id in database["items"].distinct("account_id"))
+
+
+def reset_valuation(database, account_id: str, method: str = None):
+    """Forget the account's costs so the next pass replays the log (e.g. to switch method)."""
+    database[ITEM_COSTS].delete_many({"account_id": account_id})
+    database[COST_OF_SALES].delete_many({"account_id": account_id})
+    database[VALUATION_RUNS].replace_one(
+        {"_id": account_id},
+        {"method": method or account_method(database, account_id), "watermark": None, "updated_at": datetime.utcnow()},
+        upsert=True
+    )
+
+
+def inventory_value(database, account_id: str, session=None):
+    """Total value of the account's stock, or None if it has never been valued."""
+    if not database[VALUATION_RUNS].find_one({"_id": account_id, "watermark": {"$ne": None}}, session=session):
+        return None
+    result = list(database[ITEM_COSTS].aggregate([
+        {"$match": {"account_id": account_id}},
+        {"$group": {"_id": None, "value": {"$sum": "$value"}}}
+    ], session=session))
+    return result[0]["value"] if result else 0.0
+
+
+def cost_of_sales(database, account_id: str, start: datetime = None, end: datetime = None, session=None) -> dict:
+    """item_id -> {"quantity", "cost"} of goods sold on days in [start, end]."""
+    match = {"account_id": account_id}
+    if start or end:
+        match["day"] = {}
+        if start:
+            match["day"]["$gte"] = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        if end:
+            match["day"]["$lte"] = end
+    return {
+        row["_id"]: {"quantity": row["quantity"], "cost": row["cost"]}
+        for row in database[COST_OF_SALES].aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$item_id", "quantity": {"$sum": "$quantity"}, "cost": {"$sum": "$cost"}}}
+        ], session=session)
+    }
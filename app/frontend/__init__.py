@@ -34,6 +34,13 @@ def create_app():
 
     app.register_blueprint(vendor_payments_bp)
 
+    # Rewrite static URLs to their fingerprinted names during the static build (app.frontend.build)
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        manifest = app.config.get('ASSET_MANIFEST')
+        if endpoint == 'static' and manifest and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+
     @app.route('/favicon.ico')
     def favicon():
         return send_from_directory(os.path.join(app.root_path, 'static', 'images'),
@@ -0,0 +1,126 @@
+"""
+Static build of the frontend.
+
+Every Flask view only renders a data-less page shell (all data is fetched by JS),
+so the shells can be rendered once at build time. The build:
+
+1. Copies static/ and fingerprints main.js, ui-controller.js and style.css
+   with a content hash (e.g. js/main.3f2a9c1d.js) so they can be cached forever.
+2. Renders every GET page through the Flask app with the fingerprinted URLs.
+   Routes with URL parameters are rendered once with a placeholder that
+   app.frontend.static_site substitutes per request.
+3. Writes gzip (and brotli, when the optional `brotli` package is installed)
+   variants next to every text file.
+
+Output layout (dist_dir):
+    manifest.json   {"js/main.js": "js/main.3f2a9c1d.js", ...}
+    routes.json     [{"path": "/items/view/<item_id>", "file": "pages/...html", "params": [...]}]
+    static/...      assets (+ .gz / .br)
+    pages/...       pre-rendered HTML shells (+ .gz / .br)
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip variants are always produced
+    brotli = None
+
+FINGERPRINTED_ASSETS = ["js/main.js", "js/ui-controller.js", "css/style.css"]
+COMPRESSIBLE_EXTENSIONS = (".js", ".css", ".html", ".svg", ".json", ".txt")
+SKIPPED_ENDPOINTS = {"static", "favicon"}
+
+
+def route_placeholder(param):
+    """Marker rendered in place of a URL parameter, replaced when the page is served."""
+    return f"__route_{param}__"
+
+
+def content_hash(path, length=8):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:length]
+
+
+def fingerprint_assets(static_src, static_out):
+    """Copy the static tree and add content-hashed copies of the core assets."""
+    shutil.copytree(static_src, static_out)
+    manifest = {}
+    for rel_path in FINGERPRINTED_ASSETS:
+        src = os.path.join(static_src, rel_path)
+        if not os.path.exists(src):
+            continue
+        base, ext = os.path.splitext(rel_path)
+        hashed = f"{base}.{content_hash(src)}{ext}"
+        shutil.copyfile(src, os.path.join(static_out, hashed))
+        manifest[rel_path] = hashed
+    return manifest
+
+
+def render_pages(app, pages_out):
+    """Render every parameterless or placeholder-filled GET route to a static file."""
+    os.makedirs(pages_out, exist_ok=True)
+    adapter = app.url_map.bind("localhost")
+    client = app.test_client()
+    routes = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint in SKIPPED_ENDPOINTS or "GET" not in (rule.methods or ()):
+            continue
+        params = sorted(rule.arguments)
+        url = adapter.build(rule.endpoint, {p: route_placeholder(p) for p in params})
+        response = client.get(url)
+        if response.status_code != 200:
+            print(f"Skipping {rule.rule}: HTTP {response.status_code}")
+            continue
+        file_name = f"pages/{rule.endpoint}.html"
+        with open(os.path.join(pages_out, f"{rule.endpoint}.html"), "wb") as f:
+            f.write(response.data)
+        routes.append({"path": rule.rule, "file": file_name, "params": params})
+    return routes
+
+
+def precompress(root):
+    """Write .gz (and .br) variants next to every compressible file under root."""
+    count = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path + ".gz", "wb") as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(path + ".br", "wb") as f:
+                    f.write(brotli.compress(data, quality=11))
+            count += 1
+    return count
+
+
+def build_site(dist_dir, api_url):
+    """Build the static frontend into dist_dir. Returns the asset manifest."""
+    from app.frontend import create_app
+
+    app = create_app()
+    app.config["API_URL"] = api_url
+
+    if os.path.exists(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    manifest = fingerprint_assets(app.static_folder, os.path.join(dist_dir, "static"))
+    app.config["ASSET_MANIFEST"] = manifest
+    routes = render_pages(app, os.path.join(dist_dir, "pages"))
+
+    with open(os.path.join(dist_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    with open(os.path.join(dist_dir, "routes.json"), "w") as f:
+        json.dump(routes, f, indent=2)
+
+    compressed = precompress(os.path.join(dist_dir, "static")) + precompress(os.path.join(dist_dir, "pages"))
+    print(f"Built {len(routes)} pages and {len(manifest)} fingerprinted assets into {dist_dir} "
+          f"({compressed} files precompressed{'' if brotli else ', brotli not installed'})")
+    return manifest
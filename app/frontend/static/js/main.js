@@ -7,14 +7,43 @@
 const auth = {
     setToken: (token) => localStorage.setItem('access_token', token),
     getToken: () => localStorage.getItem('access_token'),
-    removeToken: () => localStorage.removeItem('access_token'),
+    setRefreshToken: (token) => {
+        if (token) localStorage.setItem('refresh_token', token);
+    },
+    getRefreshToken: () => localStorage.getItem('refresh_token'),
+    setTokens: (data) => {
+        auth.setToken(data.access_token);
+        auth.setRefreshToken(data.refresh_token);
+    },
+    removeToken: () => {
+        localStorage.removeItem('access_token');
+        localStorage.removeItem('refresh_token');
+        localStorage.removeItem('account_id');
+        localStorage.removeItem('causal_token');
+    },
     isAuthenticated: () => !!localStorage.getItem('access_token'),
     logout: () => {
+        const refreshToken = auth.getRefreshToken();
+        if (refreshToken) {
+            // Best effort: revoke the server-side session; keepalive lets it outlive the redirect
+            fetch(`${API_URL}/auth/logout`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ refresh_token: refreshToken }),
+                keepalive: true
+            }).catch(() => {});
+        }
+        if (typeof masterData !== 'undefined') masterData.clear();
         auth.removeToken();
         window.location.href = '/';
     }
 };
 
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+}
+
 // Add auth header to requests
 axios.interceptors.request.use(
     config => {
@@ -22,6 +51,16 @@ axios.interceptors.request.use(
         if (token) {
             config.headers['Authorization'] = 'Bearer ' + token;
         }
+        // One key per logical create: retries of this config (e.g. after a token refresh)
+        // reuse it, so the API replays the first result instead of creating a duplicate
+        if ((config.method || '').toLowerCase() === 'post' && !config.headers['Idempotency-Key']) {
+            config.headers['Idempotency-Key'] = newIdempotencyKey();
+        }
+        // Lets report endpoints served from secondaries wait for this user's last write
+        const causalToken = localStorage.getItem('causal_token');
+        if (causalToken) {
+            config.headers['X-Causal-Token'] = causalToken;
+        }
         return config;
     },
     error => {
@@ -29,16 +68,217 @@ axios.interceptors.request.use(
     }
 );
 
+// Silent token refresh
+// One refresh request per tab at a time; concurrent 401s wait for the same promise.
+let refreshPromise = null;
+
+function refreshAccessToken() {
+    if (!refreshPromise) {
+        const refreshToken = auth.getRefreshToken();
+        // A throttled refresh is retried after Retry-After instead of signing the user out
+        const post = (attempt) => axios.post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken }).catch(error => {
+            if (error.response && error.response.status === 429 && attempt < 3) {
+                const retryAfter = parseInt(error.response.headers['retry-after'] || '1', 10);
+                return new Promise(resolve => setTimeout(resolve, retryAfter * 1000)).then(() => post(attempt + 1));
+            }
+            throw error;
+        });
+        refreshPromise = (refreshToken
+            ? post(0).then(response => {
+                auth.setTokens(response.data);
+                return response.data.access_token;
+            }).catch(error => {
+                // Another tab may have rotated the shared token in the meantime
+                const current = auth.getRefreshToken();
+                if (current && current !== refreshToken && auth.getToken()) {
+                    return auth.getToken();
+                }
+                throw error;
+            })
+            : Promise.reject(new Error('No refresh token'))
+        ).finally(() => {
+            refreshPromise = null;
+        });
+    }
+    return refreshPromise;
+}
+
 // Handle 401 errors
 axios.interceptors.response.use(
-    response => response,
-    error => {
+    response => {
+        const causalToken = response.headers && response.headers['x-causal-token'];
+        if (causalToken) localStorage.setItem('causal_token', causalToken);
+        return response;
+    },
+    async error => {
+        const config = error.config || {};
+        // Rate limited reads: honour Retry-After once (short waits only), then surface the error
+        if (error.response && error.response.status === 429 && !config._rateRetried
+            && (config.method || 'get').toLowerCase() === 'get') {
+            const retryAfter = parseInt(error.response.headers['retry-after'] || '1', 10);
+            if (retryAfter <= 5) {
+                config._rateRetried = true;
+                await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+                return axios(config);
+            }
+        }
         if (error.response && error.response.status === 401) {
+            const isAuthCall = /\/auth\/(login|signup|refresh|logout)$/.test(config.url || '');
+            if (!isAuthCall && !config._retried && auth.getRefreshToken()) {
+                config._retried = true;
+                try {
+                    const token = await refreshAccessToken();
+                    config.headers = config.headers || {};
+                    config.headers['Authorization'] = 'Bearer ' + token;
+                    return axios(config);
+                } catch (refreshError) {
+                    // Still throttled: keep the session, the next request tries again
+                    if (refreshError.response && refreshError.response.status === 429) {
+                        return Promise.reject(refreshError);
+                    }
+                    // otherwise fall through to logout
+                }
+            }
             // Only redirect if not already on login/signup page
-            if (!window.location.pathname.match(/^\/($|signup)/)) {
+            if (!isAuthCall && !window.location.pathname.match(/^\/($|signup)/)) {
                 auth.logout();
             }
         }
         return Promise.reject(error);
     }
 );
+
+// Master Data Cache
+// Caches items, customers, weavers and categories in IndexedDB (one database per account)
+// and keeps them fresh with ETag revalidation plus `?updated_since=` delta pulls.
+const masterData = (() => {
+    const COLLECTIONS = {
+        items: { key: 'item_id', sort: (a, b) => (a.item_name || '').localeCompare(b.item_name || '') },
+        customers: { key: 'customer_id', sort: (a, b) => new Date(b.created_at) - new Date(a.created_at), params: { limit: 0 } },
+        weavers: { key: 'weaver_id', sort: (a, b) => new Date(b.created_at) - new Date(a.created_at), params: { limit: 0 } },
+        // The full category list includes inactive ones (X-Total-Count counts them too)
+        categories: { key: 'category_id', sort: (a, b) => (a.category_name || '').localeCompare(b.category_name || ''), includesInactive: true }
+    };
+    const inflight = {};
+    let dbPromise = null;
+
+    const request = (req) => new Promise((resolve, reject) => {
+        req.onsuccess = () => resolve(req.result);
+        req.onerror = () => reject(req.error);
+    });
+
+    async function accountId() {
+        let id = localStorage.getItem('account_id');
+        if (!id) {
+            const resp = await axios.get(`${API_URL}/users/me`);
+            id = resp.data.account_id;
+            localStorage.setItem('account_id', id);
+        }
+        return id;
+    }
+
+    async function openDb() {
+        if (!dbPromise) {
+            dbPromise = accountId().then(id => new Promise((resolve, reject) => {
+                const req = indexedDB.open(`billing-cache-${id}`, 1);
+                req.onupgradeneeded = () => {
+                    const database = req.result;
+                    Object.entries(COLLECTIONS).forEach(([name, cfg]) => database.createObjectStore(name, { keyPath: cfg.key }));
+                    database.createObjectStore('meta');
+                };
+                req.onsuccess = () => resolve(req.result);
+                req.onerror = () => reject(req.error);
+            }));
+        }
+        return dbPromise;
+    }
+
+    async function readAll(name) {
+        const database = await openDb();
+        const tx = database.transaction([name, 'meta'], 'readonly');
+        const [records, meta] = await Promise.all([
+            request(tx.objectStore(name).getAll()),
+            request(tx.objectStore('meta').get(name))
+        ]);
+        return { records, meta: meta || {} };
+    }
+
+    async function write(name, records, meta, replace) {
+        const database = await openDb();
+        const tx = database.transaction([name, 'meta'], 'readwrite');
+        const store = tx.objectStore(name);
+        if (replace) store.clear();
+        records.forEach(r => store.put(r));
+        tx.objectStore('meta').put(meta, name);
+        return new Promise((resolve, reject) => {
+            tx.oncomplete = resolve;
+            tx.onerror = () => reject(tx.error);
+        });
+    }
+
+    async function fetchRecords(name, cached) {
+        const cfg = COLLECTIONS[name];
+        const delta = !!cached.meta.sync_timestamp;
+        const params = { ...(cfg.params || {}) };
+        if (delta) params.updated_since = cached.meta.sync_timestamp;
+        const headers = cached.meta.etag ? { 'If-None-Match': cached.meta.etag } : {};
+
+        const resp = await axios.get(`${API_URL}/${name}/`, {
+            params, headers, validateStatus: s => (s >= 200 && s < 300) || s === 304
+        });
+        if (resp.status === 304) return cached.records;
+
+        const meta = {
+            etag: resp.headers['etag'] || null,
+            sync_timestamp: resp.headers['x-sync-timestamp'] || null,
+            synced_at: new Date().toISOString()
+        };
+        if (!delta) {
+            await write(name, resp.data, meta, true);
+            return resp.data;
+        }
+
+        const merged = new Map(cached.records.map(r => [r[cfg.key], r]));
+        resp.data.forEach(r => merged.set(r[cfg.key], r));
+        const total = parseInt(resp.headers['x-total-count'] || '-1', 10);
+        const counted = cfg.includesInactive ? merged.size
+            : Array.from(merged.values()).filter(r => r.status !== 'inactive').length;
+        if (total >= 0 && total !== counted) {
+            // Hard deletes cannot be expressed as a delta: fall back to a full resync.
+            return fetchRecords(name, { records: [], meta: {} });
+        }
+        await write(name, resp.data, meta, false);
+        return Array.from(merged.values());
+    }
+
+    async function sync(name) {
+        if (!inflight[name]) {
+            inflight[name] = readAll(name)
+                .then(cached => fetchRecords(name, cached))
+                .finally(() => { delete inflight[name]; });
+        }
+        return inflight[name];
+    }
+
+    return {
+        // Returns the active records of a master collection, revalidated against the API.
+        get: async (name, { includeInactive = false } = {}) => {
+            if (!COLLECTIONS[name]) throw new Error(`Unknown master collection: ${name}`);
+            let records;
+            try {
+                records = window.indexedDB ? await sync(name) : (await axios.get(`${API_URL}/${name}/`, { params: COLLECTIONS[name].params })).data;
+            } catch (error) {
+                if (error.response) throw error;
+                // IndexedDB unavailable (private mode, quota): use the API directly.
+                records = (await axios.get(`${API_URL}/${name}/`, { params: COLLECTIONS[name].params })).data;
+            }
+            const visible = includeInactive || name === 'categories' ? records : records.filter(r => r.status !== 'inactive');
+            return visible.slice().sort(COLLECTIONS[name].sort);
+        },
+        clear: () => {
+            const id = localStorage.getItem('account_id');
+            dbPromise = null;
+            if (id && window.indexedDB) indexedDB.deleteDatabase(`billing-cache-${id}`);
+        }
+    };
+})();
@@ -0,0 +1,120 @@
+"""
+Serves the pre-built frontend (see app.frontend.build) directly from the FastAPI app,
+so the UI needs no separate Flask process.
+
+- Fingerprinted assets are served with `Cache-Control: immutable` and a one-year max-age.
+- Precompressed .br / .gz variants are picked from the request's Accept-Encoding.
+- Page shells are held in memory; routes with URL parameters get their placeholder
+  replaced per request (a bytes.replace instead of a Jinja render).
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse, Response
+
+from app.frontend.build import route_placeholder
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+ASSET_CACHE = "public, max-age=3600"
+PAGE_CACHE = "no-cache"
+SAFE_PARAM = re.compile(r"^[A-Za-z0-9_\-]{1,128}$")
+
+
+def accepted_encodings(request: Request):
+    header = request.headers.get("accept-encoding", "")
+    return {part.split(";")[0].strip().lower() for part in header.split(",") if part.strip()}
+
+
+def flask_rule_to_path(rule):
+    """'/items/view/<item_id>' or '/x/<string:id>' -> '/items/view/{item_id}'"""
+    return re.sub(r"<(?:[^:<>]+:)?([^<>]+)>", r"{\1}", rule)
+
+
+class StaticSite:
+    def __init__(self, dist_dir):
+        self.dist_dir = os.path.abspath(dist_dir)
+        self.static_dir = os.path.join(self.dist_dir, "static")
+        with open(os.path.join(self.dist_dir, "manifest.json")) as f:
+            self.immutable_files = set(json.load(f).values())
+        with open(os.path.join(self.dist_dir, "routes.json")) as f:
+            self.routes = json.load(f)
+        self.pages = {}
+        for route in self.routes:
+            with open(os.path.join(self.dist_dir, route["file"]), "rb") as f:
+                body = f.read()
+            self.pages[route["path"]] = {
+                "params": route["params"],
+                "body": body,
+                "gzip": self._read_optional(route["file"] + ".gz"),
+                "br": self._read_optional(route["file"] + ".br"),
+                "etag": '"%s"' % hashlib.sha1(body).hexdigest()[:16],
+            }
+
+    def _read_optional(self, rel_path):
+        path = os.path.join(self.dist_dir, rel_path)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    async def serve_asset(self, request: Request):
+        rel_path = request.path_params["path"]
+        path = os.path.abspath(os.path.join(self.static_dir, rel_path))
+        if not path.startswith(self.static_dir + os.sep) or not os.path.isfile(path):
+            return Response(status_code=404)
+
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE if rel_path in self.immutable_files else ASSET_CACHE,
+            "Vary": "Accept-Encoding",
+        }
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        encodings = accepted_encodings(request)
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding in encodings and os.path.exists(path + suffix):
+                headers["Content-Encoding"] = encoding
+                return FileResponse(path + suffix, media_type=media_type, headers=headers)
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    def page_endpoint(self, route_path):
+        page = self.pages[route_path]
+
+        async def serve_page(request: Request):
+            headers = {"Cache-Control": PAGE_CACHE, "Vary": "Accept-Encoding"}
+            encodings = accepted_encodings(request)
+
+            if not page["params"]:
+                if request.headers.get("if-none-match") == page["etag"]:
+                    return Response(status_code=304, headers={"ETag": page["etag"]})
+                headers["ETag"] = page["etag"]
+                for encoding in ("br", "gzip"):
+                    if encoding in encodings and page[encoding] is not None:
+                        headers["Content-Encoding"] = encoding
+                        return Response(page[encoding], media_type="text/html", headers=headers)
+                return Response(page["body"], media_type="text/html", headers=headers)
+
+            body = page["body"]
+            for param in page["params"]:
+                value = request.path_params.get(param, "")
+                if not SAFE_PARAM.match(value):
+                    return Response(status_code=404)
+                body = body.replace(route_placeholder(param).encode(), value.encode())
+            if "gzip" in encodings:
+                headers["Content-Encoding"] = "gzip"
+                body = gzip.compress(body, compresslevel=5)
+            return Response(body, media_type="text/html", headers=headers)
+
+        return serve_page
+
+
+def mount_static_site(app: FastAPI, dist_dir: str):
+    """Register the pre-built UI's asset and page routes on the FastAPI app."""
+    site = StaticSite(dist_dir)
+    app.add_route("/static/{path:path}", site.serve_asset, methods=["GET", "HEAD"])
+    for route in site.routes:
+        app.add_route(flask_rule_to_path(route["path"]), site.page_endpoint(route["path"]), methods=["GET", "HEAD"])
+    return site
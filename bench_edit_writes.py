@@ -0,0 +1,158 @@
+"""
+Write-count benchmark for invoice edits.
+
+Replays typical edits of an N-line invoice against a scratch database, once with
+the old revert-everything/re-apply-everything loop and once with the line diff
+(app/core/line_edits.py). For each edit it reports the write commands sent to
+MongoDB, the documents they touched, the stock_transactions added, and the time taken.
+A command listener does the counting, so the numbers are exact.
+
+Usage:
+    python bench_edit_writes.py --lines 40
+    python bench_edit_writes.py --lines 40 --database billing_bench --keep
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from pymongo import MongoClient, monitoring
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.core.line_edits import diff_lines, apply_stock_diff
+from app.core.stock_log import ensure_stock_transactions, to_stored, meta_query
+
+WRITE_COMMANDS = {"insert", "update", "delete", "findAndModify"}
+ACCOUNT_ID = "bench-account"
+
+
+class WriteCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.commands = 0
+        self.documents = 0
+
+    def started(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            self.commands += 1
+            body = event.command
+            self.documents += len(body.get("documents") or body.get("updates") or body.get("deletes") or [None])
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def legacy_edit(database, invoice, new_items):
+    """The pre-diff update_invoice stock handling, kept here as the baseline."""
+    for old_item in invoice["items"]:
+        database["items"].update_one(
+            {"item_id": old_item["item_id"], "account_id": ACCOUNT_ID},
+            {"$inc": {"current_stock": old_item["qty"]}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+        database["stock_transactions"].insert_one(to_stored({
+            "transaction_id": str(uuid.uuid4()), "item_id": old_item["item_id"], "item_name": old_item["item_name"],
+            "invoice_id": invoice["invoice_id"], "account_id": ACCOUNT_ID, "transaction_type": "in",
+            "quantity": old_item["qty"], "transaction_date": datetime.utcnow(), "notes": "Stock reverted for invoice update"
+        }))
+    for new_item in new_items:
+        database["items"].find_one({"item_id": new_item["item_id"], "account_id": ACCOUNT_ID})
+        database["items"].update_one(
+            {"item_id": new_item["item_id"], "account_id": ACCOUNT_ID},
+            {"$inc": {"current_stock": -new_item["qty"]}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+        database["stock_transactions"].insert_one(to_stored({
+            "transaction_id": str(uuid.uuid4()), "item_id": new_item["item_id"], "item_name": new_item["item_name"],
+            "invoice_id": invoice["invoice_id"], "account_id": ACCOUNT_ID, "transaction_type": "out",
+            "quantity": new_item["qty"], "transaction_date": datetime.utcnow(), "notes": "Stock deducted for invoice update"
+        }))
+    database["invoices"].update_one({"invoice_id": invoice["invoice_id"]}, {"$set": {"items": new_items}})
+
+
+def diff_edit(database, invoice, new_items):
+    changes = diff_lines(invoice["items"], new_items)
+    if any(change.delta > 0 for change in changes):
+        # Stock check for increased lines, one query as in update_invoice
+        list(database["items"].find({"item_id": {"$in": [c.item_id for c in changes if c.delta > 0]}, "account_id": ACCOUNT_ID}))
+    apply_stock_diff(database, ACCOUNT_ID, changes, -1, {"invoice_id": invoice["invoice_id"]}, "Stock adjusted for invoice update")
+    database["invoices"].update_one({"invoice_id": invoice["invoice_id"]}, {"$set": {"items": new_items}})
+
+
+def scenarios(items):
+    """(label, new lines) pairs, each applied to the original invoice lines."""
+    base = [dict(line) for line in items]
+    one_qty = [dict(line) for line in items]
+    one_qty[0]["qty"] += 1
+    added = base + [{"item_id": "bench-extra", "item_name": "Extra", "qty": 1, "rate": 10}]
+    removed = base[1:]
+    all_qty = [{**line, "qty": line["qty"] + 1} for line in items]
+    return [
+        ("notes only (lines unchanged)", base),
+        ("one quantity changed", one_qty),
+        ("one line added", added),
+        ("one line removed", removed),
+        ("every quantity changed", all_qty),
+    ]
+
+
+def clear(database):
+    for name in ("items", "invoices"):
+        database[name].delete_many({"account_id": ACCOUNT_ID})
+    database["stock_transactions"].delete_many(meta_query(ACCOUNT_ID))
+
+
+def seed(database, lines):
+    clear(database)
+    item_docs = [
+        {"item_id": f"bench-{i}", "item_name": f"Item {i}", "account_id": ACCOUNT_ID, "current_stock": 10_000}
+        for i in range(lines)
+    ] + [{"item_id": "bench-extra", "item_name": "Extra", "account_id": ACCOUNT_ID, "current_stock": 10_000}]
+    database["items"].insert_many(item_docs)
+    invoice = {
+        "invoice_id": str(uuid.uuid4()), "account_id": ACCOUNT_ID,
+        "items": [{"item_id": f"bench-{i}", "item_name": f"Item {i}", "qty": 2, "rate": 10} for i in range(lines)]
+    }
+    database["invoices"].insert_one(dict(invoice))
+    return invoice
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count MongoDB writes per invoice edit: full revert vs line diff.")
+    parser.add_argument("--lines", type=int, default=40, help="Lines on the benchmark invoice")
+    parser.add_argument("--database", default="billing_bench_edits", help="Scratch database (its bench documents are replaced)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch documents afterwards")
+    args = parser.parse_args()
+
+    counter = WriteCounter()
+    client = MongoClient(settings.MONGO_URI, event_listeners=[counter])
+    database = client[args.database]
+    ensure_stock_transactions(database)
+
+    print(f"{args.lines}-line invoice")
+    print(f"{'edit':<30} {'engine':<8} {'commands':>9} {'docs':>6} {'stock tx':>9} {'ms':>7}")
+    for label, new_items in scenarios(seed(database, args.lines)["items"]):
+        for engine, edit in (("legacy", legacy_edit), ("diff", diff_edit)):
+            invoice = seed(database, args.lines)
+            counter.reset()
+            started = time.perf_counter()
+            edit(database, invoice, new_items)
+            elapsed = (time.perf_counter() - started) * 1000
+            commands, documents = counter.commands, counter.documents
+            logged = database["stock_transactions"].count_documents(meta_query(ACCOUNT_ID))
+            print(f"{label:<30} {engine:<8} {commands:>9} {documents:>6} {logged:>9} {elapsed:>7.1f}")
+
+    if not args.keep:
+        clear(database)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
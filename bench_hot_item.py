@@ -0,0 +1,114 @@
+"""
+Hot-item benchmark for sharded stock counters.
+
+Creates one item with plenty of stock, then fires concurrent POST /invoices, every
+one selling that item, first with the item unsharded (every sale $incs the same
+document) and then with items.stock_shards set. Reports invoices/sec, latency
+percentiles, and whether the item's final stock matches the units sold.
+
+The account needs an invoice allowance for the run (the enterprise plan is
+unlimited), and rate limiting should be off (RATE_LIMIT_ENABLED=false) or the
+429s will dominate the numbers.
+
+Usage:
+    python bench_hot_item.py --invoices 400 --concurrency 32 --shards 16
+"""
+import argparse
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def current_stock(base_url, headers, item_id):
+    return requests.get(f"{base_url}/items/{item_id}", headers=headers).json()["current_stock"]
+
+
+def run(base_url, headers, customer, item, invoices, concurrency, qty):
+    sessions = threading.local()
+    line = {"item_id": item["item_id"], "item_name": item["item_name"], "qty": qty, "rate": 10, "tax_percent": 0}
+    body = {
+        "customer_id": customer["customer_id"], "customer_name": customer["customer_name"],
+        "items": [line], "sub_total": qty * 10, "total_tax": 0, "grand_total": qty * 10
+    }
+
+    def one_invoice(_):
+        if not hasattr(sessions, "s"):
+            sessions.s = requests.Session()
+        started = time.perf_counter()
+        resp = sessions.s.post(f"{base_url}/invoices/", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json=body)
+        return resp.status_code, time.perf_counter() - started, resp.json().get("invoice_id") if resp.status_code == 200 else None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_invoice, range(invoices)))
+    return results, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare concurrent invoice throughput on one item with and without sharded stock.")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--email", default="admin@billing.com")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--invoices", type=int, default=400, help="Invoices per run")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--shards", type=int, default=16, help="stock_shards for the sharded run")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark invoices and item afterwards")
+    args = parser.parse_args()
+
+    resp = requests.post(f"{args.base_url}/auth/login", data={"username": args.email, "password": args.password})
+    if resp.status_code != 200:
+        print(f"Login failed with HTTP {resp.status_code}")
+        return
+    headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+    suffix = uuid.uuid4().hex[:6]
+    customer = requests.post(f"{args.base_url}/customers/", headers=headers, json={"customer_name": f"Bench Customer {suffix}"}).json()
+    item = requests.post(f"{args.base_url}/items/", headers=headers, json={
+        "item_name": f"Bench Hot Item {suffix}", "sku": f"BENCH-{suffix}", "opening_stock": 1_000_000, "selling_price": 10
+    }).json()
+    if "item_id" not in item or "customer_id" not in customer:
+        print(f"Setup failed: {item} {customer}")
+        return
+
+    created = []
+    print(f"{'mode':<14} {'ok':>6} {'errors':>7} {'inv/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  stock check")
+    for shards in (0, args.shards):
+        requests.put(f"{args.base_url}/items/{item['item_id']}", headers=headers, json={"stock_shards": shards})
+        before = current_stock(args.base_url, headers, item["item_id"])
+        results, elapsed = run(args.base_url, headers, customer, item, args.invoices, args.concurrency, 1)
+        after = current_stock(args.base_url, headers, item["item_id"])
+
+        ok = [lat for code, lat, _ in results if code == 200]
+        created += [invoice_id for _, _, invoice_id in results if invoice_id]
+        errors = statistics.mode([code for code, _, _ in results if code != 200]) if len(ok) < len(results) else None
+        label = f"{shards} shards" if shards else "unsharded"
+        check = "ok" if before - after == len(ok) else f"MISMATCH ({before} -> {after}, sold {len(ok)})"
+        print(f"{label:<14} {len(ok):>6} {len(results) - len(ok):>7} {len(ok) / elapsed:>8.1f} "
+              f"{percentile(ok, 50) * 1000:>8.0f} {percentile(ok, 95) * 1000:>8.0f} {percentile(ok, 99) * 1000:>8.0f}  {check}")
+        if errors:
+            print(f"  most common error: HTTP {errors} (403 = plan invoice limit, 429 = rate limit)")
+
+    if not args.keep:
+        for invoice_id in created:
+            requests.delete(f"{args.base_url}/invoices/{invoice_id}", headers=headers)
+        requests.put(f"{args.base_url}/items/{item['item_id']}", headers=headers, json={"stock_shards": 0})
+        requests.delete(f"{args.base_url}/items/{item['item_id']}", headers=headers)
+        requests.delete(f"{args.base_url}/customers/{customer['customer_id']}", headers=headers)
+
+
+if __name__ == "__main__":
+    main()
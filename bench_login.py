@@ -0,0 +1,113 @@
+"""
+Login throughput benchmark.
+
+Fires concurrent logins at /auth/login while a second group of clients keeps calling a
+normal API endpoint, then reports logins/sec and the latency percentiles of that
+concurrent API traffic. Run it before and after changing PASSWORD_HASH_ROUNDS or
+PASSWORD_HASH_WORKERS to see the impact of the morning login spike.
+
+Usage:
+    python bench_login.py --logins 500 --login-concurrency 32 --api-concurrency 8
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def login(session, base_url, email, password):
+    started = time.perf_counter()
+    resp = session.post(f"{base_url}/auth/login", data={"username": email, "password": password})
+    return resp.status_code, time.perf_counter() - started
+
+
+def api_load(base_url, token, endpoint, stop, latencies, errors):
+    session = requests.Session()
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            resp = session.get(f"{base_url}{endpoint}", headers=headers, timeout=30)
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+        except requests.RequestException:
+            errors.append("conn")
+        latencies.append(time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark login throughput and its impact on API latency.")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--email", default="admin@billing.com")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--logins", type=int, default=300)
+    parser.add_argument("--login-concurrency", type=int, default=32)
+    parser.add_argument("--api-concurrency", type=int, default=8)
+    parser.add_argument("--api-endpoint", default="/dashboard/notifications")
+    args = parser.parse_args()
+
+    resp = requests.post(f"{args.base_url}/auth/login", data={"username": args.email, "password": args.password})
+    if resp.status_code != 200:
+        print(f"Warm-up login failed with HTTP {resp.status_code}")
+        return
+    token = resp.json()["access_token"]
+
+    # 1. Baseline API latency without login pressure
+    baseline, baseline_errors = [], []
+    stop = threading.Event()
+    threads = [threading.Thread(target=api_load, args=(args.base_url, token, args.api_endpoint, stop, baseline, baseline_errors))
+               for _ in range(args.api_concurrency)]
+    for t in threads:
+        t.start()
+    time.sleep(5)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    # 2. Login spike with concurrent API traffic
+    under_load, load_errors = [], []
+    stop = threading.Event()
+    threads = [threading.Thread(target=api_load, args=(args.base_url, token, args.api_endpoint, stop, under_load, load_errors))
+               for _ in range(args.api_concurrency)]
+    for t in threads:
+        t.start()
+
+    sessions = threading.local()
+
+    def one_login(_):
+        if not hasattr(sessions, "s"):
+            sessions.s = requests.Session()
+        return login(sessions.s, args.base_url, args.email, args.password)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.login_concurrency) as pool:
+        results = list(pool.map(one_login, range(args.logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for t in threads:
+        t.join()
+
+    ok = [lat for code, lat in results if code == 200]
+    print(f"Logins:        {len(ok)}/{args.logins} succeeded in {elapsed:.2f}s -> {len(ok) / elapsed:.1f} logins/sec")
+    print(f"Login latency: p50 {percentile(ok, 50) * 1000:.0f} ms, p99 {percentile(ok, 99) * 1000:.0f} ms")
+    for label, values, errors in (("API baseline", baseline, baseline_errors), ("API under login spike", under_load, load_errors)):
+        if values:
+            print(f"{label:<22} n={len(values):<6} p50 {statistics.median(values) * 1000:.0f} ms, "
+                  f"p99 {percentile(values, 99) * 1000:.0f} ms, errors {len(errors)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Pre-render the frontend page shells and fingerprint static assets.
+
+Usage:
+    python build_frontend.py                      # API on the same origin (/api/v1)
+    python build_frontend.py --api-url https://billing-api.onrender.com/api/v1
+
+Then either serve dist/frontend from the API (SERVE_FRONTEND=true) or from any CDN
+that honours the generated .gz/.br variants.
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.frontend.build import build_site
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the static frontend.")
+    parser.add_argument("--out", default=settings.FRONTEND_DIST_DIR)
+    parser.add_argument("--api-url", default=os.getenv("APP_API_URL", settings.API_V1_STR))
+    args = parser.parse_args()
+    build_site(args.out, args.api_url)
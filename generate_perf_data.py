@@ -0,0 +1,453 @@
+"""
+High-volume synthetic data generator for performance testing.
+
+Produces consistent multi-tenant data sets (customers, weavers, categories, items,
+invoices with lines, payments, purchase bills, vendor payments and the matching
+stock_transactions) using one worker process per tenant and insert_many batches.
+
+Tenant sizes and item popularity follow Zipf-like distributions so a handful of
+"hot" tenants and "hot" items dominate traffic, like a real textile market.
+
+Consistency rules (what the reconciliation tools expect):
+    items.current_stock        = opening_stock + sum(in) - sum(out) in stock_transactions
+    customers.current_balance  = opening_balance + sum(active invoice grand_total) - sum(receipts)
+    weavers.current_balance    = opening_balance + sum(bill total_amount) - sum(vendor payments)
+
+Usage:
+    python generate_perf_data.py --tenants 200 --invoices 1000000 --workers 8 --drop
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.core.stock_log import STOCK_TRANSACTIONS, ensure_stock_transactions, to_stored
+
+COLLECTIONS = [
+    "accounts", "organizations", "users", "categories", "customers", "weavers", "items",
+    "invoices", "payments", "purchase_bills", "vendor_payments", "stock_transactions",
+]
+
+FIRST_NAMES = ["Arun", "Priya", "Karthik", "Meena", "Suresh", "Lakshmi", "Vijay", "Divya",
+               "Ramesh", "Anitha", "Senthil", "Kavitha", "Ganesh", "Revathi", "Murugan", "Deepa"]
+LAST_NAMES = ["Kumar", "Raj", "Sundaram", "Iyer", "Pillai", "Nair", "Reddy", "Shetty",
+              "Menon", "Rao", "Chettiar", "Naidu"]
+FABRICS = ["Silk", "Cotton", "Linen", "Chiffon", "Georgette", "Crepe", "Organza", "Tussar"]
+PRODUCTS = ["Saree", "Dhoti", "Shawl", "Dupatta", "Kurta Fabric", "Towel", "Bedsheet", "Lungi"]
+COLOURS = ["Red", "Maroon", "Gold", "Green", "Blue", "Ivory", "Black", "Pink", "Mustard", "Teal"]
+PAYMENT_MODES = ["cash", "bank", "upi", "cheque"]
+
+
+def zipf_weights(n, skew):
+    """Unnormalised Zipf weights 1/rank^skew for ranks 1..n."""
+    return [1.0 / ((rank + 1) ** skew) for rank in range(n)]
+
+
+def cumulative(weights):
+    total = 0.0
+    out = []
+    for w in weights:
+        total += w
+        out.append(total)
+    return out
+
+
+def person_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+class BatchWriter:
+    """Buffers documents per collection and flushes them with insert_many."""
+
+    def __init__(self, database, batch_size):
+        self.database = database
+        self.batch_size = batch_size
+        self.buffers = {}
+        self.counts = {}
+
+    def add(self, collection, doc):
+        if collection == STOCK_TRANSACTIONS:
+            doc = to_stored(doc)
+        buf = self.buffers.setdefault(collection, [])
+        buf.append(doc)
+        if len(buf) >= self.batch_size:
+            self.flush(collection)
+
+    def flush(self, collection=None):
+        names = [collection] if collection else list(self.buffers)
+        for name in names:
+            buf = self.buffers.get(name)
+            if buf:
+                self.database[name].insert_many(buf, ordered=False)
+                self.counts[name] = self.counts.get(name, 0) + len(buf)
+                self.buffers[name] = []
+
+
+def plan_tenants(args):
+    """Split the invoice budget across tenants with a Zipf skew."""
+    weights = zipf_weights(args.tenants, args.tenant_skew)
+    total = sum(weights)
+    plans = []
+    for index, w in enumerate(weights):
+        invoices = max(args.min_invoices, int(round(args.invoices * w / total)))
+        plans.append({
+            "index": index,
+            "account_id": f"perf_{index:05d}_{uuid.uuid4().hex[:8]}",
+            "invoices": invoices,
+            "customers": max(5, invoices // 20),
+            "weavers": max(3, invoices // 200),
+            "items": max(10, min(args.max_items, invoices // 10)),
+            "categories": max(3, min(50, invoices // 2000)),
+        })
+    return plans
+
+
+def generate_tenant(job):
+    """Worker entry point: generate and insert every document for one tenant."""
+    plan, args, hashed_password = job
+    rng = random.Random(args.seed * 100003 + plan["index"])
+    client = MongoClient(args.uri)
+    database = client[args.database]
+    writer = BatchWriter(database, args.batch_size)
+
+    account_id = plan["account_id"]
+    now = datetime.utcnow()
+    start = now - timedelta(days=args.days)
+    span_seconds = args.days * 86400
+
+    # 1. Tenant root documents
+    plan_type = "enterprise" if plan["index"] < 10 else rng.choice(["free", "pro", "enterprise"])
+    writer.add("accounts", {
+        "account_id": account_id,
+        "subscription_type": plan_type,
+        "status": "active",
+        "created_at": start,
+    })
+    writer.add("organizations", {
+        "organization_id": str(uuid.uuid4()),
+        "account_id": account_id,
+        "company_name": f"{rng.choice(LAST_NAMES)} Textiles {plan['index']}",
+        "created_at": start,
+    })
+    writer.add("users", {
+        "user_id": str(uuid.uuid4()),
+        "account_id": account_id,
+        "email": f"owner{plan['index']}@perf.billing.com",
+        "full_name": person_name(rng),
+        "hashed_password": hashed_password,
+        "role": "owner",
+        "is_active": True,
+        "created_at": start,
+    })
+
+    # 2. Master data (kept in memory, inserted at the end with final balances/stock)
+    categories = [{
+        "category_id": str(uuid.uuid4()),
+        "account_id": account_id,
+        "category_name": f"{FABRICS[i % len(FABRICS)]} {PRODUCTS[(i // len(FABRICS)) % len(PRODUCTS)]} {i}",
+        "description": "",
+        "status": "active",
+        "created_at": start,
+        "updated_at": start,
+    } for i in range(plan["categories"])]
+
+    customers = []
+    for i in range(plan["customers"]):
+        opening = round(rng.uniform(0, 5000), 2) if rng.random() < 0.2 else 0.0
+        customers.append({
+            "customer_id": str(uuid.uuid4()),
+            "account_id": account_id,
+            "customer_code": f"C{str(i + 1).zfill(3)}",
+            "customer_type": rng.choice(["business", "individual"]),
+            "customer_name": person_name(rng),
+            "mobile_number": f"9{rng.randint(100000000, 999999999)}",
+            "billing_city": rng.choice(["Chennai", "Salem", "Erode", "Madurai", "Kanchipuram"]),
+            "currency": "INR",
+            "opening_balance": opening,
+            "current_balance": opening,
+            "payment_terms": "net_15",
+            "status": "active",
+            "created_at": start,
+            "updated_at": start,
+        })
+
+    weavers = []
+    for i in range(plan["weavers"]):
+        opening = round(rng.uniform(0, 10000), 2) if rng.random() < 0.2 else 0.0
+        weavers.append({
+            "weaver_id": str(uuid.uuid4()),
+            "account_id": account_id,
+            "weaver_code": f"W{str(i + 1).zfill(3)}",
+            "weaver_name": f"{person_name(rng)} Looms",
+            "contact_number": f"9{rng.randint(100000000, 999999999)}",
+            "vendor_type": "manufacturer",
+            "opening_balance": opening,
+            "current_balance": opening,
+            "status": "active",
+            "created_at": start,
+            "updated_at": start,
+        })
+
+    items = []
+    item_weights = zipf_weights(plan["items"], args.item_skew)
+    weight_total = sum(item_weights)
+    expected_lines = plan["invoices"] * 3
+    for i in range(plan["items"]):
+        purchase_price = round(rng.uniform(100, 5000), 2)
+        # Size opening stock to the expected demand so hot items stay sellable.
+        expected_qty = expected_lines * item_weights[i] / weight_total * 5
+        opening = float(int(expected_qty * 0.6) + rng.randint(10, 100))
+        items.append({
+            "item_id": str(uuid.uuid4()),
+            "account_id": account_id,
+            "item_name": f"{rng.choice(FABRICS)} {rng.choice(PRODUCTS)} {rng.choice(COLOURS)} {i}",
+            "item_type": "goods",
+            "sku": f"SKU-{plan['index']}-{i:05d}",
+            "category_id": rng.choice(categories)["category_id"],
+            "hsn_code": rng.choice(["5007", "5208", "5309", "6214"]),
+            "unit": "PCS",
+            "tax_preference": "taxable",
+            "tax_rate": rng.choice([5.0, 12.0, 18.0]),
+            "purchase_price": purchase_price,
+            "selling_price": round(purchase_price * rng.uniform(1.2, 1.8), 2),
+            "reorder_level": rng.randint(5, 50),
+            "opening_stock": opening,
+            "opening_stock_rate": purchase_price,
+            "current_stock": opening,
+            "status": "active",
+            "created_at": start,
+            "updated_at": start,
+        })
+    item_cum = cumulative(item_weights)
+    items_by_id = {item["item_id"]: item for item in items}
+    customer_cum = cumulative(zipf_weights(len(customers), 1.0))
+
+    # 3. Transactions, generated in chronological order so stock never goes negative
+    bill_every = max(1, args.invoices_per_bill)
+    inv_seq = pay_seq = bill_seq = vpay_seq = 0
+    for n in range(plan["invoices"]):
+        ts = start + timedelta(seconds=span_seconds * n / plan["invoices"])
+
+        if n % bill_every == 0:
+            bill_seq += 1
+            weaver = rng.choice(weavers)
+            lines = []
+            for item in rng.choices(items, cum_weights=item_cum, k=rng.randint(1, 4)):
+                qty = float(rng.randint(10, 60))
+                amount = round(qty * item["purchase_price"], 2)
+                tax = round(amount * item["tax_rate"] / 100, 2)
+                lines.append({
+                    "item_id": item["item_id"], "item_name": item["item_name"], "qty": qty,
+                    "unit": "PCS", "rate": item["purchase_price"], "tax_rate": item["tax_rate"],
+                    "tax_amount": tax, "amount": round(amount + tax, 2),
+                })
+                item["current_stock"] += qty
+            subtotal = round(sum(l["qty"] * l["rate"] for l in lines), 2)
+            tax_total = round(sum(l["tax_amount"] for l in lines), 2)
+            total = round(subtotal + tax_total, 2)
+            bill_id = str(uuid.uuid4())
+            bill_number = f"BILL-{str(bill_seq).zfill(4)}"
+            paid = 0.0
+            roll = rng.random()
+            if roll < 0.5:
+                paid = total
+            elif roll < 0.75:
+                paid = round(total * rng.uniform(0.2, 0.8), 2)
+            writer.add("purchase_bills", {
+                "bill_id": bill_id, "account_id": account_id, "bill_number": bill_number,
+                "weaver_id": weaver["weaver_id"], "weaver_name": weaver["weaver_name"],
+                "weaver_code": weaver["weaver_code"], "bill_date": ts,
+                "due_date": ts + timedelta(days=rng.choice([15, 30, 45])),
+                "items": lines, "subtotal": subtotal, "tax_amount": tax_total,
+                "discount_amount": 0.0, "total_amount": total, "paid_amount": paid,
+                "balance_amount": round(total - paid, 2),
+                "payment_status": "paid" if paid >= total else ("partial" if paid > 0 else "unpaid"),
+                "status": "approved", "created_at": ts, "updated_at": ts,
+            })
+            weaver["current_balance"] += total
+            for line in lines:
+                writer.add("stock_transactions", {
+                    "transaction_id": str(uuid.uuid4()), "item_id": line["item_id"],
+                    "item_name": line["item_name"], "bill_id": bill_id, "bill_number": bill_number,
+                    "account_id": account_id, "transaction_type": "in", "quantity": line["qty"],
+                    "transaction_date": ts, "notes": f"Purchased via bill {bill_number}",
+                })
+            if paid > 0:
+                vpay_seq += 1
+                writer.add("vendor_payments", {
+                    "payment_id": str(uuid.uuid4()), "account_id": account_id,
+                    "payment_number": f"VPAY-{str(vpay_seq).zfill(3)}",
+                    "weaver_id": weaver["weaver_id"], "weaver_name": weaver["weaver_name"],
+                    "bill_id": bill_id, "bill_number": bill_number,
+                    "payment_date": ts + timedelta(days=rng.randint(0, 20)), "amount": paid,
+                    "payment_mode": "bank_transfer", "created_at": ts,
+                })
+                weaver["current_balance"] -= paid
+
+        # Invoice lines draw on hot items; quantities are clamped to stock on hand.
+        lines = []
+        seen = set()
+        for item in rng.choices(items, cum_weights=item_cum, k=rng.randint(1, 5)):
+            if item["item_id"] in seen:
+                continue
+            seen.add(item["item_id"])
+            qty = float(min(rng.randint(1, 10), int(item["current_stock"])))
+            if qty <= 0:
+                continue
+            amount = qty * item["selling_price"]
+            tax = round(amount * item["tax_rate"] / 100, 2)
+            lines.append({
+                "item_id": item["item_id"], "item_name": item["item_name"], "qty": qty,
+                "unit": "PCS", "rate": item["selling_price"], "tax_percent": item["tax_rate"],
+                "tax_amount": tax, "total": round(amount + tax, 2), "hsn_code": item["hsn_code"],
+            })
+            item["current_stock"] -= qty
+        if not lines:
+            continue
+
+        inv_seq += 1
+        customer = customers[rng.choices(range(len(customers)), cum_weights=customer_cum)[0]]
+        sub_total = round(sum(l["qty"] * l["rate"] for l in lines), 2)
+        total_tax = round(sum(l["tax_amount"] for l in lines), 2)
+        grand_total = round(sub_total + total_tax, 2)
+        invoice_id = str(uuid.uuid4())
+        invoice_number = f"INV-{str(inv_seq).zfill(4)}"
+        cancelled = rng.random() < args.cancel_rate
+        received = 0.0
+        if not cancelled:
+            roll = rng.random()
+            if roll < 0.55:
+                received = grand_total
+            elif roll < 0.75:
+                received = round(grand_total * rng.uniform(0.1, 0.9), 2)
+        balance = 0.0 if cancelled else round(grand_total - received, 2)
+        writer.add("invoices", {
+            "invoice_id": invoice_id, "account_id": account_id, "invoice_number": invoice_number,
+            "customer_id": customer["customer_id"], "customer_name": customer["customer_name"],
+            "customer_code": customer["customer_code"], "invoice_date": ts,
+            "due_date": ts + timedelta(days=rng.choice([0, 15, 30])), "items": lines,
+            "sub_total": sub_total, "total_tax": total_tax, "grand_total": grand_total,
+            "discount_amount": 0.0, "shipping_charges": 0.0,
+            "payment_status": "paid" if received >= grand_total else ("partial" if received > 0 else "unpaid"),
+            "amount_received": received, "balance_amount": balance,
+            "status": "cancelled" if cancelled else "active",
+            "created_at": ts, "updated_at": ts,
+        })
+        for line in lines:
+            writer.add("stock_transactions", {
+                "transaction_id": str(uuid.uuid4()), "item_id": line["item_id"],
+                "item_name": line["item_name"], "invoice_id": invoice_id,
+                "invoice_number": invoice_number, "account_id": account_id,
+                "transaction_type": "out", "quantity": line["qty"], "transaction_date": ts,
+                "notes": f"Sold via invoice {invoice_number}",
+            })
+        if cancelled:
+            for line in lines:
+                writer.add("stock_transactions", {
+                    "transaction_id": str(uuid.uuid4()), "item_id": line["item_id"],
+                    "item_name": line["item_name"], "invoice_id": invoice_id,
+                    "invoice_number": invoice_number, "account_id": account_id,
+                    "transaction_type": "in", "quantity": line["qty"], "transaction_date": ts,
+                    "notes": f"Stock reverted due to invoice cancellation: {invoice_number}",
+                })
+                items_by_id[line["item_id"]]["current_stock"] += line["qty"]
+            continue
+
+        customer["current_balance"] += grand_total
+        if received > 0:
+            pay_seq += 1
+            writer.add("payments", {
+                "payment_id": str(uuid.uuid4()), "account_id": account_id,
+                "payment_number": f"PAY-{str(pay_seq).zfill(4)}",
+                "party_id": customer["customer_id"], "party_name": customer["customer_name"],
+                "amount": received, "payment_date": ts + timedelta(days=rng.randint(0, 10)),
+                "payment_mode": rng.choice(PAYMENT_MODES), "invoice_id": invoice_id,
+                "payment_type": "receive", "created_at": ts,
+            })
+            customer["current_balance"] -= received
+
+    for category in categories:
+        writer.add("categories", category)
+    for customer in customers:
+        customer["current_balance"] = round(customer["current_balance"], 2)
+        writer.add("customers", customer)
+    for weaver in weavers:
+        weaver["current_balance"] = round(weaver["current_balance"], 2)
+        writer.add("weavers", weaver)
+    for item in items:
+        writer.add("items", item)
+
+    writer.flush()
+    client.close()
+    return account_id, writer.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate high-volume multi-tenant billing data.")
+    parser.add_argument("--uri", default=settings.MONGO_URI)
+    parser.add_argument("--database", default=f"{settings.DATABASE_NAME}_perf",
+                        help="Target database (defaults to <DATABASE_NAME>_perf to protect real data)")
+    parser.add_argument("--tenants", type=int, default=100)
+    parser.add_argument("--invoices", type=int, default=200000, help="Total invoices across all tenants")
+    parser.add_argument("--min-invoices", type=int, default=20, help="Floor per tenant")
+    parser.add_argument("--max-items", type=int, default=5000, help="Cap on items per tenant")
+    parser.add_argument("--tenant-skew", type=float, default=1.1, help="Zipf exponent for tenant sizes")
+    parser.add_argument("--item-skew", type=float, default=1.2, help="Zipf exponent for item popularity")
+    parser.add_argument("--invoices-per-bill", type=int, default=8)
+    parser.add_argument("--cancel-rate", type=float, default=0.03)
+    parser.add_argument("--days", type=int, default=730, help="History span in days")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--password", default="perf123", help="Password for generated owner users")
+    parser.add_argument("--drop", action="store_true", help="Drop target collections first")
+    args = parser.parse_args()
+
+    from app.core.security import get_password_hash
+    hashed_password = get_password_hash(args.password)
+
+    if args.drop:
+        client = MongoClient(args.uri)
+        for name in COLLECTIONS:
+            client[args.database][name].drop()
+        client.close()
+        print(f"Dropped {len(COLLECTIONS)} collections in {args.database}")
+
+    # Workers would otherwise create stock_transactions as a regular collection
+    client = MongoClient(args.uri)
+    ensure_stock_transactions(client[args.database])
+    client.close()
+
+    plans = plan_tenants(args)
+    print(f"Generating {sum(p['invoices'] for p in plans)} invoices for {len(plans)} tenants "
+          f"into {args.database} with {args.workers} workers...")
+    print(f"Largest tenant: {plans[0]['invoices']} invoices, smallest: {plans[-1]['invoices']}")
+
+    started = time.time()
+    totals = {}
+    jobs = [(plan, args, hashed_password) for plan in plans]
+    with multiprocessing.Pool(args.workers) as pool:
+        for done, (account_id, counts) in enumerate(pool.imap_unordered(generate_tenant, jobs), 1):
+            for name, count in counts.items():
+                totals[name] = totals.get(name, 0) + count
+            print(f"[{done}/{len(jobs)}] {account_id}: {sum(counts.values())} documents")
+
+    elapsed = time.time() - started
+    grand_total = sum(totals.values())
+    print("\nGeneration complete:")
+    for name in COLLECTIONS:
+        print(f"  {name:<20} {totals.get(name, 0):>12,}")
+    print(f"  {'total':<20} {grand_total:>12,}  ({grand_total / max(elapsed, 0.001):,.0f} docs/s, {elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
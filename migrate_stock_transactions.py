@@ -0,0 +1,131 @@
+"""
+Convert stock_transactions to a time-series collection (see app/core/stock_log.py).
+
+    python migrate_stock_transactions.py                  # every tenant database
+    python migrate_stock_transactions.py --drop-legacy    # and drop the old collections afterwards
+
+For each database that still has a regular stock_transactions collection:
+1. Rename it to stock_transactions_legacy and create the time-series collection
+   in its place, so the API's new movements go straight into the new storage.
+   (If a write sneaks in between and recreates a regular collection, that one is
+   renamed aside as well and copied too.)
+2. Copy the legacy documents in _id order, moving account_id/item_id into meta.
+   Progress is saved in the `migrations` collection after every batch and
+   transaction_ids already present are skipped, so an interrupted run can simply
+   be started again.
+3. With --drop-legacy, drop each legacy collection once it is fully copied.
+
+MongoDB 5.0+ is required (6.0+ for the secondary index on transaction_id).
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import db
+from app.core.init_db import ensure_tenant_indexes
+from app.core.recurring import tenant_databases
+from app.core.stock_log import STOCK_TRANSACTIONS, ensure_stock_transactions, is_time_series, to_stored
+from app.core.tenancy import tenants
+
+LEGACY_PREFIX = f"{STOCK_TRANSACTIONS}_legacy"
+
+
+def legacy_collections(database):
+    return sorted(name for name in database.list_collection_names() if name.startswith(LEGACY_PREFIX))
+
+
+def swap_in_time_series(database):
+    """Move any regular stock_transactions aside until the time-series collection is in place."""
+    while not is_time_series(database):
+        if database.list_collection_names(filter={"name": STOCK_TRANSACTIONS}):
+            taken = set(legacy_collections(database))
+            name = LEGACY_PREFIX if LEGACY_PREFIX not in taken else f"{LEGACY_PREFIX}_{int(time.time())}"
+            database[STOCK_TRANSACTIONS].rename(name)
+            print(f"  renamed {STOCK_TRANSACTIONS} -> {name}")
+        ensure_stock_transactions(database)
+
+
+def stored(doc):
+    """Legacy document in time-series shape (None if it cannot be attributed to an item)."""
+    if not doc.get("account_id") or not doc.get("item_id"):
+        return None
+    if not isinstance(doc.get("transaction_date"), datetime):
+        doc["transaction_date"] = doc["_id"].generation_time.replace(tzinfo=None)
+    return {**to_stored(doc), "_id": doc["_id"]}
+
+
+def copy_legacy(database, name, batch_size):
+    progress = database["migrations"]
+    key = f"stock_transactions_timeseries:{name}"
+    state = progress.find_one({"_id": key}) or {}
+    if state.get("done"):
+        return 0, 0
+    query = {"_id": {"$gt": state["last_id"]}} if state.get("last_id") else {}
+    copied = skipped = 0
+    batch = []
+
+    def flush():
+        nonlocal copied, skipped
+        docs = [doc for doc in (stored(doc) for doc in batch) if doc]
+        skipped += len(batch) - len(docs)
+        have = {
+            doc["transaction_id"] for doc in database[STOCK_TRANSACTIONS].find(
+                {"transaction_id": {"$in": [doc["transaction_id"] for doc in docs if doc.get("transaction_id")]}},
+                projection={"transaction_id": 1}
+            )
+        }
+        fresh = [doc for doc in docs if doc.get("transaction_id") not in have]
+        if fresh:
+            database[STOCK_TRANSACTIONS].insert_many(fresh, ordered=False)
+        copied += len(fresh)
+        progress.update_one({"_id": key}, {"$set": {"last_id": batch[-1]["_id"], "updated_at": datetime.utcnow()}}, upsert=True)
+
+    for doc in database[name].find(query).sort("_id", 1).batch_size(batch_size):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+    progress.update_one({"_id": key}, {"$set": {"done": True, "updated_at": datetime.utcnow()}}, upsert=True)
+    return copied, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert stock_transactions to a time-series collection.")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--drop-legacy", action="store_true", help="Drop legacy collections once copied")
+    args = parser.parse_args()
+
+    db.connect()
+    if not db.client:
+        sys.exit("Could not connect to MongoDB")
+
+    for _, database in tenant_databases():
+        legacy = legacy_collections(database)
+        if is_time_series(database) and not legacy:
+            print(f"{database.name}: already time-series")
+            continue
+        print(f"{database.name}:")
+        started = time.time()
+        swap_in_time_series(database)
+        ensure_tenant_indexes(database)
+        for name in legacy_collections(database):
+            copied, skipped = copy_legacy(database, name, args.batch_size)
+            print(f"  copied {copied:,} documents from {name}"
+                  f"{f' (skipped {skipped:,} without account_id/item_id)' if skipped else ''}")
+            if args.drop_legacy:
+                database[name].drop()
+                print(f"  dropped {name}")
+        print(f"  done in {time.time() - started:.1f}s")
+
+    tenants.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
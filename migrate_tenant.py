@@ -0,0 +1,242 @@
+"""
+Online move of one tenant to a new placement (see app/core/tenancy.py).
+
+    python migrate_tenant.py <account_id> --to-database billing_acme
+    python migrate_tenant.py <account_id> --to-database billing_acme --to-uri "mongodb+srv://..."
+    python migrate_tenant.py <account_id> --to-home        # move back into the shared database
+
+Phases:
+1. Note the source cluster's operation time, then bulk-copy every account-scoped
+   document (ReplaceOne upserts in batches, so a rerun is safe).
+2. Catch up: replay the source change stream from that operation time onto the
+   target until it goes quiet. The API keeps serving reads and writes meanwhile.
+3. Cutover: mark the directory entry "cutover". API writes for this account get a
+   503 with Retry-After; reads keep going to the source. After every worker's
+   directory cache has expired, drain the stream once more and flip the entry to
+   the target.
+4. Optionally (--drop-source) delete the account's documents from the source.
+
+Change streams need a replica set (Atlas clusters are). They do not cover
+time-series collections, so the stock log (app/core/stock_log.py) is copied
+separately: up to the start time in phase 1, and the rest once writes are paused
+in phase 3, skipping transaction_ids the target already has.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReplaceOne
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.core.database import db
+from app.core.init_db import ensure_tenant_indexes
+from app.core.stock_log import STOCK_TRANSACTIONS, is_time_series, meta_query, to_stored
+from app.core.tenancy import GLOBAL_COLLECTIONS, PLACEMENT_ACTIVE, PLACEMENT_CUTOVER, tenants
+
+# Margin for clock skew between API hosts and this script when splitting the stock log copy
+STOCK_LOG_OVERLAP = timedelta(minutes=5)
+
+
+def tenant_collections(database):
+    return sorted(
+        name for name in database.list_collection_names()
+        if name not in GLOBAL_COLLECTIONS and not name.startswith("system.")
+    )
+
+
+def source_operation_time(database):
+    """Cluster operation time right now; the change stream replays everything after it."""
+    with database.client.start_session(causal_consistency=True) as session:
+        database["accounts"].find_one({"_id": None}, session=session)
+        return session.operation_time
+
+
+def stock_log_query(account_id, database):
+    # Sources that were not converted yet keep account_id at the top level
+    return meta_query(account_id) if is_time_series(database) else {"account_id": account_id}
+
+
+def copy_stock_log(account_id, source, target, batch_size, since=None, until=None):
+    """Insert the account's stock log entries (optionally a date range) the target lacks."""
+    query = stock_log_query(account_id, source)
+    if since or until:
+        query["transaction_date"] = {}
+        if since:
+            query["transaction_date"]["$gte"] = since
+        if until:
+            query["transaction_date"]["$lt"] = until
+    count = 0
+    batch = []
+
+    def flush():
+        have = {
+            doc["transaction_id"] for doc in target[STOCK_TRANSACTIONS].find(
+                {**meta_query(account_id), "transaction_id": {"$in": [doc["transaction_id"] for doc in batch]}},
+                projection={"transaction_id": 1}
+            )
+        }
+        fresh = [doc for doc in batch if doc["transaction_id"] not in have]
+        if fresh:
+            target[STOCK_TRANSACTIONS].insert_many(fresh, ordered=False)
+        return len(fresh)
+
+    for doc in source[STOCK_TRANSACTIONS].find(query).batch_size(batch_size):
+        if "meta" not in doc:
+            doc = {**to_stored(doc), "_id": doc["_id"]}
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            count += flush()
+            batch = []
+    if batch:
+        count += flush()
+    return count
+
+
+def bulk_copy(account_id, source, target, batch_size, stock_log_until=None):
+    copied = {}
+    for name in tenant_collections(source):
+        if name == STOCK_TRANSACTIONS:
+            count = copy_stock_log(account_id, source, target, batch_size, until=stock_log_until)
+            if count:
+                copied[name] = count
+                print(f"  copied {name:<20} {count:>10,}")
+            continue
+        ops = []
+        count = 0
+        for doc in source[name].find({"account_id": account_id}).batch_size(batch_size):
+            ops.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+            if len(ops) >= batch_size:
+                target[name].bulk_write(ops, ordered=False)
+                count += len(ops)
+                ops = []
+        if ops:
+            target[name].bulk_write(ops, ordered=False)
+            count += len(ops)
+        if count:
+            copied[name] = count
+            print(f"  copied {name:<20} {count:>10,}")
+    return copied
+
+
+def open_change_stream(account_id, source, start_at):
+    # Deletes carry no fullDocument, so they are matched by _id against the target in apply_changes.
+    pipeline = [{"$match": {"$or": [
+        {"fullDocument.account_id": account_id},
+        {"operationType": "delete"},
+    ]}}]
+    return source.watch(pipeline, full_document="updateLookup", start_at_operation_time=start_at)
+
+
+def apply_changes(stream, target, idle_polls=3):
+    """Replay change events onto the target until the stream has been empty idle_polls times."""
+    applied = 0
+    idle = 0
+    while idle < idle_polls:
+        change = stream.try_next()
+        if change is None:
+            idle += 1
+            time.sleep(0.2)
+            continue
+        idle = 0
+        name = change["ns"]["coll"]
+        if name in GLOBAL_COLLECTIONS or name == STOCK_TRANSACTIONS:
+            continue
+        key = change["documentKey"]["_id"]
+        operation = change["operationType"]
+        if operation == "delete":
+            applied += target[name].delete_one({"_id": key}).deleted_count
+        elif operation in ("insert", "update", "replace") and change.get("fullDocument"):
+            target[name].replace_one({"_id": key}, change["fullDocument"], upsert=True)
+            applied += 1
+    return applied
+
+
+def drop_source(account_id, source):
+    for name in tenant_collections(source):
+        query = stock_log_query(account_id, source) if name == STOCK_TRANSACTIONS else {"account_id": account_id}
+        result = source[name].delete_many(query)
+        if result.deleted_count:
+            print(f"  removed {name:<20} {result.deleted_count:>10,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move one tenant to a new database or cluster without downtime.")
+    parser.add_argument("account_id")
+    parser.add_argument("--to-database", help="Target database name")
+    parser.add_argument("--to-uri", default=None, help="Target cluster URI (default: the main cluster)")
+    parser.add_argument("--to-home", action="store_true", help=f"Move back into {settings.DATABASE_NAME}")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--drop-source", action="store_true", help="Delete the tenant's documents from the source afterwards")
+    args = parser.parse_args()
+
+    if args.to_home:
+        target_placement = {"database_name": settings.DATABASE_NAME, "mongo_uri": None}
+    elif args.to_database:
+        target_placement = {"database_name": args.to_database, "mongo_uri": args.to_uri}
+    else:
+        parser.error("one of --to-database or --to-home is required")
+
+    db.connect()
+    if not db.client:
+        sys.exit("Could not connect to MongoDB")
+
+    home = db.get_db()
+    if not home["accounts"].find_one({"account_id": args.account_id}):
+        sys.exit(f"Account {args.account_id} not found")
+
+    current = tenants.get_placement(args.account_id)
+    if current and current.get("state") == PLACEMENT_CUTOVER:
+        sys.exit("A cutover for this account is already in progress; finish or clear it first")
+    source = tenants.database_for(current)
+    target = tenants.database_for(target_placement)
+    if (source.client.address, source.name) == (target.client.address, target.name):
+        sys.exit("Account already lives in the target placement")
+
+    print(f"Moving {args.account_id}: {source.name} -> {target.name}"
+          f"{' on ' + args.to_uri if args.to_uri else ''}")
+    started = time.time()
+    ensure_tenant_indexes(target)
+
+    print("Phase 1: bulk copy")
+    start_at = source_operation_time(source)
+    stock_log_split = datetime.utcnow()
+    with open_change_stream(args.account_id, source, start_at) as stream:
+        copied = bulk_copy(args.account_id, source, target, args.batch_size, stock_log_until=stock_log_split)
+        print(f"  {sum(copied.values()):,} documents in {time.time() - started:.1f}s")
+
+        print("Phase 2: catching up on changes made during the copy")
+        print(f"  applied {apply_changes(stream, target):,} changes")
+
+        print("Phase 3: cutover (writes for this account pause briefly)")
+        cutover_started = time.time()
+        tenants.set_placement(args.account_id, state=PLACEMENT_CUTOVER, target=target_placement,
+                              database_name=source.name, mongo_uri=(current or {}).get("mongo_uri"))
+        # Workers may still hold the pre-cutover placement for one cache period
+        time.sleep(settings.TENANT_DIRECTORY_CACHE_SECONDS + 1)
+        try:
+            print(f"  applied {apply_changes(stream, target):,} late changes")
+            late = copy_stock_log(args.account_id, source, target, args.batch_size, since=stock_log_split - STOCK_LOG_OVERLAP)
+            print(f"  copied {late:,} stock log entries written during the move")
+        except Exception:
+            # Leave the account writable on the source rather than stuck in cutover
+            tenants.set_placement(args.account_id, state=PLACEMENT_ACTIVE, target=None)
+            raise
+
+    tenants.set_placement(args.account_id, state=PLACEMENT_ACTIVE, target=None, **target_placement)
+    print(f"  flipped directory entry; writes paused for {time.time() - cutover_started:.1f}s")
+
+    if args.drop_source:
+        print("Phase 4: removing source copy")
+        drop_source(args.account_id, source)
+
+    tenants.close()
+    db.close()
+    print(f"Done in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Recompute inventory costs from the whole stock log (see app/core/valuation.py).
+
+    python rebuild_valuation.py                                  # every account, current method
+    python rebuild_valuation.py --account <account_id> --method fifo
+
+Use it to switch an account between weighted_average and fifo, or after
+correcting purchase rates on old bills. The account's item costs and cost of
+sales are dropped and replayed from opening stock; until the replay finishes the
+dashboard shows the account's inventory value from item master prices.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import db
+from app.core.recurring import tenant_databases
+from app.core.tenancy import tenants
+from app.core.valuation import VALUATION_METHODS, reset_valuation, value_account
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute inventory costs from the stock log.")
+    parser.add_argument("--account", help="Only this account (default: every account)")
+    parser.add_argument("--method", choices=VALUATION_METHODS, help="Switch to this method (default: keep the account's)")
+    args = parser.parse_args()
+
+    db.connect()
+    if not db.client:
+        sys.exit("Could not connect to MongoDB")
+
+    for _, database in tenant_databases():
+        accounts = database["items"].distinct("account_id")
+        if args.account:
+            accounts = [account_id for account_id in accounts if account_id == args.account]
+        for account_id in accounts:
+            started = time.time()
+            reset_valuation(database, account_id, args.method)
+            valued = value_account(database, account_id)
+            print(f"{database.name}/{account_id}: valued {valued:,} movements in {time.time() - started:.1f}s")
+
+    tenants.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Customer and weaver balance check (see app/core/reconcile.py).
+
+    python reconcile_balances.py                          # report drift for every account
+    python reconcile_balances.py --account <account_id>
+    python reconcile_balances.py --fix                    # and correct it
+    python reconcile_balances.py --workers 8 --report balance_drift.csv
+
+Accounts are checked concurrently in worker processes. Each rebuilds every
+customer's and weaver's balance from invoices, purchase bills, payments and
+vendor payments (one aggregation per collection) and compares it with
+current_balance. Drifting parties go to a CSV report; the dashboard's payables
+figure is the sum of weavers.current_balance, so this is where it is checked.
+
+With --fix, drift is recomputed after --settle seconds and only parties showing
+the same difference both times are corrected (a payment saved mid-check is not
+mistaken for drift). Every correction is recorded in balance_adjustments.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import db
+from app.core.reconcile import balance_drift, correct_balance_drift
+from app.core.tenancy import tenants
+
+REPORT_FIELDS = [
+    "account_id", "party_type", "party_id", "party_name", "opening_balance", "charged", "paid",
+    "expected_balance", "current_balance", "difference", "fixed"
+]
+
+
+def connect_worker():
+    # A client inherited across fork is not safe to use; every worker opens its own
+    db.connect()
+
+
+def check_account(job):
+    """Worker entry point: (account_id, drift rows, seconds, error)."""
+    account_id, args = job
+    started = time.time()
+    try:
+        database = tenants.tenant_db(account_id)
+        drift = balance_drift(database, account_id)
+        if drift and args.fix:
+            time.sleep(args.settle)
+            again = {(row["party_type"], row["party_id"]): row["difference"] for row in balance_drift(database, account_id)}
+            stable = [row for row in drift if again.get((row["party_type"], row["party_id"])) == row["difference"]]
+            fixed = {(a["party_type"], a["party_id"]) for a in correct_balance_drift(database, account_id, stable)}
+            for row in drift:
+                row["fixed"] = (row["party_type"], row["party_id"]) in fixed
+        return account_id, drift, time.time() - started, None
+    except Exception as e:
+        return account_id, [], time.time() - started, str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild customer and weaver balances and compare them with current_balance.")
+    parser.add_argument("--account", help="Only this account (default: every account)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--fix", action="store_true", help="Correct drifting balances (recorded in balance_adjustments)")
+    parser.add_argument("--settle", type=float, default=5, help="Seconds before re-checking drift prior to a fix")
+    parser.add_argument("--report", default=f"balance_reconciliation_{datetime.utcnow():%Y%m%d_%H%M%S}.csv")
+    args = parser.parse_args()
+
+    db.connect()
+    if not db.client:
+        sys.exit("Could not connect to MongoDB")
+    accounts = [args.account] if args.account else db.get_db()["accounts"].distinct("account_id")
+    db.close()
+
+    started = time.time()
+    drifting = failed = 0
+    off_by = 0.0
+    with open(args.report, "w", newline="") as report:
+        writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        with multiprocessing.Pool(args.workers, initializer=connect_worker) as pool:
+            jobs = [(account_id, args) for account_id in accounts]
+            for done, (account_id, drift, seconds, error) in enumerate(pool.imap_unordered(check_account, jobs), 1):
+                if error:
+                    failed += 1
+                    print(f"[{done}/{len(jobs)}] {account_id}: FAILED ({error})")
+                    continue
+                writer.writerows(drift)
+                drifting += len(drift)
+                off_by += sum(abs(row["difference"]) for row in drift)
+                if drift:
+                    fixed = sum(1 for row in drift if row.get("fixed"))
+                    print(f"[{done}/{len(jobs)}] {account_id}: {len(drift)} balances drifting"
+                          f"{f', {fixed} fixed' if args.fix else ''} ({seconds:.1f}s)")
+
+    print(f"\nChecked {len(accounts)} accounts in {time.time() - started:.1f}s: "
+          f"{drifting} drifting balances (off by {off_by:,.2f} in total), {failed} failed. Report: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
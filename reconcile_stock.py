@@ -0,0 +1,103 @@
+"""
+Stock integrity check (see app/core/reconcile.py).
+
+    python reconcile_stock.py                          # report drift for every account
+    python reconcile_stock.py --account <account_id>
+    python reconcile_stock.py --fix                    # and correct it
+    python reconcile_stock.py --workers 8 --report stock_drift.csv
+
+Accounts are checked in parallel worker processes, each with its own database
+connection. Per account one aggregation over stock_transactions gives every
+item's expected stock (opening_stock + sum of logged movements), compared with
+items.current_stock. Drifting items go to a CSV report.
+
+An invoice or bill saved while the check runs can look like drift for a moment
+(its stock is updated before its movements are logged). With --fix, drifting
+items are therefore checked again after --settle seconds and corrected only if
+they show the same difference both times. Corrections are logged as
+"adjustment" stock transactions.
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import db
+from app.core.reconcile import correct_stock_drift, stock_drift
+from app.core.tenancy import tenants
+
+REPORT_FIELDS = [
+    "account_id", "item_id", "item_name", "opening_stock", "logged_movements",
+    "expected_stock", "current_stock", "difference", "fixed"
+]
+
+
+def connect_worker():
+    # A client inherited across fork is not safe to use; every worker opens its own
+    db.connect()
+
+
+def check_account(job):
+    """Worker entry point: (account_id, drift rows, seconds, error)."""
+    account_id, args = job
+    started = time.time()
+    try:
+        database = tenants.tenant_db(account_id)
+        drift = stock_drift(database, account_id)
+        if drift and args.fix:
+            time.sleep(args.settle)
+            again = {row["item_id"]: row for row in stock_drift(database, account_id, [row["item_id"] for row in drift])}
+            stable = [row for row in drift if again.get(row["item_id"], {}).get("difference") == row["difference"]]
+            fixed = {t["item_id"] for t in correct_stock_drift(database, account_id, stable)}
+            for row in drift:
+                row["fixed"] = row["item_id"] in fixed
+        return account_id, drift, time.time() - started, None
+    except Exception as e:
+        return account_id, [], time.time() - started, str(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare items.current_stock with the stock movement log.")
+    parser.add_argument("--account", help="Only this account (default: every account)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--fix", action="store_true", help="Correct drifting items with logged adjustments")
+    parser.add_argument("--settle", type=float, default=5, help="Seconds before re-checking drift prior to a fix")
+    parser.add_argument("--report", default=f"stock_reconciliation_{datetime.utcnow():%Y%m%d_%H%M%S}.csv")
+    args = parser.parse_args()
+
+    db.connect()
+    if not db.client:
+        sys.exit("Could not connect to MongoDB")
+    accounts = [args.account] if args.account else db.get_db()["accounts"].distinct("account_id")
+    db.close()
+
+    started = time.time()
+    drifting = failed = 0
+    with open(args.report, "w", newline="") as report:
+        writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        with multiprocessing.Pool(args.workers, initializer=connect_worker) as pool:
+            jobs = [(account_id, args) for account_id in accounts]
+            for done, (account_id, drift, seconds, error) in enumerate(pool.imap_unordered(check_account, jobs), 1):
+                if error:
+                    failed += 1
+                    print(f"[{done}/{len(jobs)}] {account_id}: FAILED ({error})")
+                    continue
+                writer.writerows(drift)
+                drifting += len(drift)
+                if drift:
+                    fixed = sum(1 for row in drift if row.get("fixed"))
+                    print(f"[{done}/{len(jobs)}] {account_id}: {len(drift)} items drifting"
+                          f"{f', {fixed} fixed' if args.fix else ''} ({seconds:.1f}s)")
+
+    print(f"\nChecked {len(accounts)} accounts in {time.time() - started:.1f}s: "
+          f"{drifting} drifting items, {failed} failed. Report: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
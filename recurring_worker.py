@@ -0,0 +1,97 @@
+"""
+Recurring invoice scheduler (see app/core/recurring.py).
+
+    python recurring_worker.py                 # poll every RECURRING_POLL_SECONDS
+    python recurring_worker.py --once          # generate everything due now and exit (cron)
+    python recurring_worker.py --batch-size 500
+
+Any number of workers can run side by side, on one host or many: schedules are
+claimed with leases, so each period is billed by exactly one of them.
+Each pass also releases expired stock reservations (app/core/reservations.py)
+and folds sharded stock counters back into items.current_stock (app/core/stock.py).
+After each STOCK_SNAPSHOT_INTERVAL boundary it records stock snapshots (app/core/snapshots.py).
+Every pass values new stock movements at purchase cost (app/core/valuation.py).
+SIGTERM/SIGINT finish the current batch and exit.
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.core.database import db
+from app.core.recurring import run_due_schedules, tenant_databases
+from app.core.reservations import release_expired
+from app.core.stock import fold_stock_counters
+from app.core.snapshots import boundary_at_or_before, take_due_snapshots
+from app.core.tenancy import tenants
+from app.core.valuation import value_due_accounts
+
+stopping = False
+
+
+def request_stop(signum, frame):
+    global stopping
+    stopping = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate invoices for due recurring schedules.")
+    parser.add_argument("--once", action="store_true", help="Process due schedules once and exit")
+    parser.add_argument("--batch-size", type=int, default=settings.RECURRING_BATCH_SIZE)
+    parser.add_argument("--poll", type=int, default=settings.RECURRING_POLL_SECONDS, help="Seconds between passes")
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    db.connect()
+    if not db.client:
+        sys.exit("Could not connect to MongoDB")
+
+    snapshot_boundary = None
+    while not stopping:
+        started = time.time()
+        try:
+            expired = folded = snapshots = valued = 0
+            boundary = boundary_at_or_before(datetime.utcnow())
+            for _, database in tenant_databases():
+                expired += release_expired(database)
+                folded += fold_stock_counters(database)
+                if boundary != snapshot_boundary:
+                    snapshots += take_due_snapshots(database)
+                valued += value_due_accounts(database)
+            snapshot_boundary = boundary
+            if expired:
+                print(f"{datetime.utcnow():%Y-%m-%d %H:%M:%S} released {expired} expired stock reservations")
+            if folded:
+                print(f"{datetime.utcnow():%Y-%m-%d %H:%M:%S} folded stock counters of {folded} items")
+            if snapshots:
+                print(f"{datetime.utcnow():%Y-%m-%d %H:%M:%S} wrote {snapshots} stock snapshots")
+            if valued:
+                print(f"{datetime.utcnow():%Y-%m-%d %H:%M:%S} valued {valued} stock movements")
+            stats = run_due_schedules(args.batch_size, should_stop=lambda: stopping)
+        except Exception as e:
+            # Leases of a failed batch expire on their own; the next pass retries it
+            print(f"{datetime.utcnow():%Y-%m-%d %H:%M:%S} pass failed: {e}")
+        else:
+            if stats["batches"]:
+                print(f"{datetime.utcnow():%Y-%m-%d %H:%M:%S} generated {stats['generated']} invoices "
+                      f"in {stats['batches']} batches ({stats['failed']} failed, {stats['skipped']} skipped, "
+                      f"{stats['lease_lost']} lost leases) in {time.time() - started:.1f}s")
+        if args.once:
+            break
+        deadline = time.time() + args.poll
+        while not stopping and time.time() < deadline:
+            time.sleep(1)
+
+    tenants.close()
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
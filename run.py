@@ -1,3 +1,4 @@
+# Local development runner. For production use serve.py (gunicorn worker pools).
 import uvicorn
 import os
 import threading
@@ -0,0 +1,159 @@
+"""
+Production launcher: runs the FastAPI API and the Flask UI as two separate
+gunicorn worker pools instead of two threads in one process (see run.py).
+
+    python serve.py            # API + UI
+    python serve.py api        # API pool only (e.g. one Render service each)
+    python serve.py web        # UI pool only
+
+Each pool is its own gunicorn master, so the usual signals apply per pool and
+are forwarded from this process to both masters:
+    HUP   graceful reload: start fresh workers, then retire the old ones
+    TERM  graceful shutdown (workers get WORKER_GRACEFUL_TIMEOUT seconds)
+    TTIN / TTOU  add / remove one worker
+
+Workers are recycled after WORKER_MAX_REQUESTS (+ jitter) requests to bound
+memory growth. One-off startup work (ensure_indexes, ensure_admin_exists) runs once here,
+before any worker is forked.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+
+
+class GunicornApplication(BaseApplication):
+    """Embeds a gunicorn master around an importable WSGI/ASGI app path."""
+
+    def __init__(self, app_uri, options):
+        self.app_uri = app_uri
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from gunicorn.util import import_app
+        return import_app(self.app_uri)
+
+
+def default_api_workers():
+    # Async uvicorn workers: one per core keeps the event loops busy without oversubscribing.
+    return settings.API_WORKERS or max(2, multiprocessing.cpu_count())
+
+
+def default_web_workers():
+    # The UI only renders page shells, so a small threaded pool is enough.
+    return settings.WEB_WORKERS or max(2, multiprocessing.cpu_count() // 2)
+
+
+def common_options(args):
+    return {
+        "max_requests": settings.WORKER_MAX_REQUESTS,
+        "max_requests_jitter": settings.WORKER_MAX_REQUESTS_JITTER,
+        "timeout": settings.WORKER_TIMEOUT,
+        "graceful_timeout": settings.WORKER_GRACEFUL_TIMEOUT,
+        "keepalive": 5,
+        "reload": args.reload,
+        "loglevel": args.log_level,
+        "accesslog": "-",
+        "errorlog": "-",
+    }
+
+
+def run_api(args):
+    options = common_options(args)
+    options.update({
+        "bind": args.api_bind,
+        "workers": args.api_workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "proc_name": "billing-api",
+    })
+    GunicornApplication("app.backend.main:app", options).run()
+
+
+def run_web(args):
+    options = common_options(args)
+    options.update({
+        "bind": args.web_bind,
+        "workers": args.web_workers,
+        "threads": settings.WEB_THREADS,
+        "worker_class": "gthread",
+        "proc_name": "billing-web",
+    })
+    GunicornApplication("wsgi:app", options).run()
+
+
+def run_startup_tasks():
+    """Run bootstrap work once in the launcher, then stop workers from repeating it."""
+    from app.core.database import db
+    from app.core.init_db import ensure_admin_exists, ensure_indexes
+    from app.core.tenancy import tenants
+
+    db.connect()
+    if db.client:
+        ensure_indexes()
+        ensure_admin_exists()
+    # Never carry a MongoClient across fork(); each worker connects on its own startup.
+    tenants.close()
+    db.close()
+    db.client = None
+
+    settings.RUN_STARTUP_TASKS = False
+    os.environ["RUN_STARTUP_TASKS"] = "false"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Billing Software with gunicorn worker pools.")
+    parser.add_argument("target", nargs="?", choices=["all", "api", "web"], default="all")
+    parser.add_argument("--api-bind", default=settings.API_BIND)
+    parser.add_argument("--web-bind", default=settings.WEB_BIND)
+    parser.add_argument("--api-workers", type=int, default=default_api_workers())
+    parser.add_argument("--web-workers", type=int, default=default_web_workers())
+    parser.add_argument("--reload", action="store_true", help="Restart workers on code changes (development)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if args.target in ("all", "api") and settings.RUN_STARTUP_TASKS:
+        run_startup_tasks()
+
+    if args.target == "api":
+        run_api(args)
+        return
+    if args.target == "web":
+        run_web(args)
+        return
+
+    print(f"Starting API on {args.api_bind} ({args.api_workers} workers) "
+          f"and UI on {args.web_bind} ({args.web_workers} workers)...")
+    masters = [
+        multiprocessing.Process(target=run_api, args=(args,), name="billing-api"),
+        multiprocessing.Process(target=run_web, args=(args,), name="billing-web"),
+    ]
+    for master in masters:
+        master.start()
+
+    def forward(signum, frame):
+        for master in masters:
+            if master.is_alive():
+                os.kill(master.pid, signum)
+
+    for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU):
+        signal.signal(signum, forward)
+
+    for master in masters:
+        master.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import requests
+import uuid
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+BUCKETS = ["not_due", "0-30", "31-60", "61-90", "90+"]
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def check(label, ok):
+    print(f"{'SUCCESS' if ok else 'FAILED'}: {label}")
+
+def test_aging_shape(headers, report):
+    resp = requests.get(f"{BASE_URL}/reports/{report}-aging", headers=headers)
+    if resp.status_code != 200:
+        check(f"{report} aging ({resp.status_code}: {resp.text})", False)
+        return None
+    aging = resp.json()
+    check(f"{report} buckets present", sorted(aging["buckets"]) == sorted(BUCKETS))
+    check(f"{report} bucket totals add up ({aging['total']})", abs(sum(aging["buckets"].values()) - aging["total"]) < 0.05)
+    check(f"{report} party totals add up", abs(sum(p["total"] for p in aging["parties"]) - aging["total"]) < 0.05)
+    return aging
+
+def test_payment_invalidates(headers):
+    before = test_aging_shape(headers, "receivables")
+    if not before or not before["parties"]:
+        print("SKIPPED: need an open invoice")
+        return
+    party = before["parties"][0]
+    amount = 1.0
+    resp = requests.post(f"{BASE_URL}/payments/", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+        "party_id": party["party_id"], "party_name": party["party_name"], "amount": amount,
+        "payment_type": "receive", "payment_mode": "cash"
+    })
+    if resp.status_code != 200:
+        check(f"payment recorded ({resp.status_code}: {resp.text})", False)
+        return
+    # The receivables report only moves for payments against an invoice; the cache must at least be dropped
+    after = requests.get(f"{BASE_URL}/reports/receivables-aging", headers=headers).json()
+    check("report recomputed after a payment", after["as_of"] != before["as_of"])
+    requests.delete(f"{BASE_URL}/payments/{resp.json()['payment_id']}", headers=headers)
+
+if __name__ == "__main__":
+    headers = login()
+    test_aging_shape(headers, "payables")
+    test_payment_invalidates(headers)
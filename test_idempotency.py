@@ -0,0 +1,73 @@
+import requests
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def build_invoice(headers):
+    customers = requests.get(f"{BASE_URL}/customers/", headers=headers).json()
+    items = [i for i in requests.get(f"{BASE_URL}/items/", headers=headers).json() if i.get("current_stock", 0) >= 1]
+    if not customers or not items:
+        return None
+    customer, item = customers[0], items[0]
+    rate = float(item.get("selling_price") or 100)
+    tax = round(rate * 0.18, 2)
+    return {
+        "customer_id": customer["customer_id"],
+        "customer_name": customer.get("customer_name", ""),
+        "items": [{"item_id": item["item_id"], "item_name": item["item_name"], "qty": 1, "rate": rate,
+                   "tax_percent": 18, "tax_amount": tax, "total": rate + tax}],
+        "sub_total": rate,
+        "total_tax": tax,
+        "grand_total": rate + tax
+    }
+
+def test_concurrent_retries(headers, payload, parallel=5):
+    print(f"Posting the same invoice {parallel} times in parallel with one Idempotency-Key...")
+    key = str(uuid.uuid4())
+    stock_before = stock_of(headers, payload["items"][0]["item_id"])
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        responses = list(pool.map(
+            lambda _: requests.post(f"{BASE_URL}/invoices/", json=payload,
+                                    headers={**headers, "Idempotency-Key": key}),
+            range(parallel)
+        ))
+    invoice_ids = {r.json().get("invoice_id") for r in responses if r.status_code == 200}
+    replayed = sum(1 for r in responses if r.headers.get("Idempotent-Replayed") == "true")
+    stock_after = stock_of(headers, payload["items"][0]["item_id"])
+    print(f"Status codes: {[r.status_code for r in responses]}, replayed: {replayed}")
+    if len(invoice_ids) == 1 and stock_before - stock_after == 1:
+        print(f"SUCCESS: one invoice ({invoice_ids.pop()}) and one stock deduction")
+    else:
+        print(f"FAILED: invoices {invoice_ids}, stock {stock_before} -> {stock_after}")
+
+def test_key_reuse_with_other_body(headers, payload):
+    print("Reusing a key with a different body...")
+    key = str(uuid.uuid4())
+    first = requests.post(f"{BASE_URL}/invoices/", json=payload, headers={**headers, "Idempotency-Key": key})
+    changed = {**payload, "notes": "different"}
+    second = requests.post(f"{BASE_URL}/invoices/", json=changed, headers={**headers, "Idempotency-Key": key})
+    if first.status_code == 200 and second.status_code == 422:
+        print("SUCCESS: mismatched reuse rejected with 422")
+    else:
+        print(f"FAILED: {first.status_code} then {second.status_code}")
+
+def stock_of(headers, item_id):
+    return requests.get(f"{BASE_URL}/items/{item_id}", headers=headers).json().get("current_stock")
+
+if __name__ == "__main__":
+    headers = login()
+    payload = build_invoice(headers)
+    if payload is None:
+        print("SKIPPED: need at least one customer and one item in stock")
+    else:
+        test_concurrent_retries(headers, payload)
+        test_key_reuse_with_other_body(headers, payload)
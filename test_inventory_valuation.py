@@ -0,0 +1,59 @@
+import requests
+import uuid
+from datetime import datetime, timedelta
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def check(label, ok):
+    print(f"{'SUCCESS' if ok else 'FAILED'}: {label}")
+
+def test_purchase_cost_logged(headers):
+    weavers = requests.get(f"{BASE_URL}/weavers/", headers=headers).json()
+    items = requests.get(f"{BASE_URL}/items/", headers=headers).json()
+    if not weavers or not items:
+        print("SKIPPED: need a weaver and an item")
+        return
+    weaver, item = weavers[0], items[0]
+    now = datetime.utcnow()
+    bill = requests.post(f"{BASE_URL}/purchase-bills/", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+        "weaver_id": weaver["weaver_id"], "weaver_name": weaver.get("weaver_name", ""), "weaver_code": weaver.get("weaver_code", ""),
+        "bill_date": now.isoformat(), "due_date": (now + timedelta(days=30)).isoformat(),
+        "items": [{"item_id": item["item_id"], "item_name": item["item_name"], "qty": 2, "rate": 123.5}],
+        "subtotal": 247, "total_amount": 247
+    })
+    if bill.status_code != 200:
+        check(f"purchase bill created ({bill.status_code}: {bill.text})", False)
+        return
+    movements = requests.get(f"{BASE_URL}/items/{item['item_id']}/movements", headers=headers, params={"limit": 5}).json()
+    latest = next((m for m in movements["movements"] if m.get("bill_id") == bill.json()["bill_id"]), {})
+    check(f"receipt logged with the bill rate as unit cost ({latest.get('unit_cost')})", latest.get("unit_cost") == 123.5)
+    requests.delete(f"{BASE_URL}/purchase-bills/{bill.json()['bill_id']}", headers=headers)
+
+def test_margin_report(headers):
+    resp = requests.get(f"{BASE_URL}/dashboard/report/margin", headers=headers)
+    if resp.status_code != 200:
+        check(f"margin report ({resp.status_code}: {resp.text})", False)
+        return
+    report = resp.json()
+    check("margin report totals add up",
+          round(report["revenue"] - report["cost"], 2) == report["margin"]
+          and round(sum(row["revenue"] for row in report["items"]), 2) == report["revenue"])
+
+    bad = requests.get(f"{BASE_URL}/dashboard/report/margin", headers=headers, params={"start_date": "last week"})
+    check(f"invalid date rejected ({bad.status_code})", bad.status_code == 400)
+
+    stats = requests.get(f"{BASE_URL}/dashboard/stats", headers=headers).json()
+    check(f"dashboard inventory value ({stats.get('inventory_value')})", isinstance(stats.get("inventory_value"), (int, float)))
+
+if __name__ == "__main__":
+    headers = login()
+    test_purchase_cost_logged(headers)
+    test_margin_report(headers)
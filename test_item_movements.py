@@ -0,0 +1,53 @@
+import requests
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def check(label, ok):
+    print(f"{'SUCCESS' if ok else 'FAILED'}: {label}")
+
+def test_movement_history_pages(headers):
+    items = requests.get(f"{BASE_URL}/items/", headers=headers).json()
+    if not items:
+        print("SKIPPED: no items")
+        return
+    item_id = items[0]["item_id"]
+
+    seen, cursor, pages = [], None, 0
+    while pages < 20:
+        params = {"limit": 5}
+        if cursor:
+            params["cursor"] = cursor
+        resp = requests.get(f"{BASE_URL}/items/{item_id}/movements", headers=headers, params=params)
+        if resp.status_code != 200:
+            check(f"movement page {pages + 1} ({resp.status_code}: {resp.text})", False)
+            return
+        page = resp.json()
+        seen.extend(page["movements"])
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    if not seen:
+        print("SKIPPED: item has no stock movements")
+        return
+
+    ids = [m["transaction_id"] for m in seen]
+    dates = [m["transaction_date"] for m in seen]
+    check(f"{len(seen)} movements over {pages} pages, no duplicates", len(ids) == len(set(ids)))
+    check("newest first across pages", dates == sorted(dates, reverse=True))
+    check("every movement belongs to the item", all(m["item_id"] == item_id for m in seen))
+
+    bad = requests.get(f"{BASE_URL}/items/{item_id}/movements", headers=headers, params={"cursor": "not-a-cursor"})
+    check(f"malformed cursor rejected ({bad.status_code})", bad.status_code == 400)
+
+if __name__ == "__main__":
+    headers = login()
+    test_movement_history_pages(headers)
@@ -0,0 +1,97 @@
+import requests
+import uuid
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def open_invoices(headers, customer_id):
+    invoices = requests.get(f"{BASE_URL}/invoices/", headers=headers).json()
+    return [i for i in invoices if i.get("customer_id") == customer_id
+            and i.get("status") == "active" and i.get("balance_amount", 0) > 0]
+
+def test_fifo_allocation(headers):
+    invoices = requests.get(f"{BASE_URL}/invoices/", headers=headers).json()
+    invoice = next((i for i in invoices if i.get("status") == "active" and i.get("balance_amount", 0) > 0), None)
+    if not invoice:
+        print("SKIPPED: need an active invoice with an outstanding balance")
+        return
+    customer_id = invoice["customer_id"]
+    outstanding = open_invoices(headers, customer_id)
+    total_due = round(sum(i["balance_amount"] for i in outstanding), 2)
+    customer_before = requests.get(f"{BASE_URL}/customers/{customer_id}", headers=headers).json()
+
+    # Pay everything plus 10 extra: every invoice settles, 10 stays as an advance
+    amount = round(total_due + 10, 2)
+    print(f"Allocating {amount} across {len(outstanding)} open invoices (FIFO)...")
+    resp = requests.post(f"{BASE_URL}/payments/allocate", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+        "party_id": customer_id, "party_name": invoice.get("customer_name", ""), "amount": amount
+    })
+    if resp.status_code != 200:
+        print(f"FAILED: {resp.status_code} {resp.text}")
+        return
+    result = resp.json()
+    for line in result["lines"]:
+        print(f"  {line.get('invoice_number') or 'advance'}: {line['amount']} "
+              f"({line.get('balance_before')} -> {line.get('balance_after')}, {line.get('payment_status')})")
+
+    due_dates = [l["due_date"] for l in result["lines"] if l.get("invoice_id") and l.get("due_date")]
+    print(f"{'SUCCESS' if due_dates == sorted(due_dates) else 'FAILED'}: oldest due date allocated first")
+    print(f"{'SUCCESS' if abs(result['unallocated_amount'] - 10) < 1e-6 else 'FAILED'}: unallocated = {result['unallocated_amount']}")
+    remaining = open_invoices(headers, customer_id)
+    print(f"{'SUCCESS' if not remaining else 'FAILED'}: {len(remaining)} invoices still open")
+    customer_after = requests.get(f"{BASE_URL}/customers/{customer_id}", headers=headers).json()
+    delta = customer_before.get("current_balance", 0) - customer_after.get("current_balance", 0)
+    print(f"{'SUCCESS' if abs(delta - amount) < 1e-6 else 'FAILED'}: customer balance reduced by {delta}")
+
+def test_explicit_split_rejected(headers):
+    invoices = requests.get(f"{BASE_URL}/invoices/", headers=headers).json()
+    invoice = next((i for i in invoices if i.get("status") == "active" and i.get("balance_amount", 0) > 0), None)
+    if not invoice:
+        print("SKIPPED: need an active invoice with an outstanding balance")
+        return
+    too_much = invoice["balance_amount"] + 1
+    resp = requests.post(f"{BASE_URL}/payments/allocate", headers=headers, json={
+        "party_id": invoice["customer_id"], "party_name": invoice.get("customer_name", ""), "amount": too_much,
+        "allocations": [{"invoice_id": invoice["invoice_id"], "amount": too_much}]
+    })
+    print(f"{'SUCCESS' if resp.status_code == 400 else 'FAILED'}: over-allocation rejected ({resp.status_code})")
+
+def test_mixed_date_types(headers):
+    # A duplicated invoice stores invoice_date as a "YYYY-MM-DD" string and may have no
+    # due date; FIFO must still order it against invoices with datetime due dates
+    customers = requests.get(f"{BASE_URL}/customers/", headers=headers).json()
+    items = [i for i in requests.get(f"{BASE_URL}/items/", headers=headers).json() if i.get("current_stock", 0) >= 2]
+    if not customers or not items:
+        print("SKIPPED: need a customer and an item with stock")
+        return
+    customer, item = customers[0], items[0]
+    line = {"item_id": item["item_id"], "item_name": item["item_name"], "qty": 1, "rate": 100, "tax_percent": 0, "amount": 100}
+    base = {"customer_id": customer["customer_id"], "customer_name": customer.get("customer_name", ""), "items": [line],
+            "sub_total": 100, "total_tax": 0, "grand_total": 100}
+    undated = requests.post(f"{BASE_URL}/invoices/", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json=base)
+    dated = requests.post(f"{BASE_URL}/invoices/", headers={**headers, "Idempotency-Key": str(uuid.uuid4())},
+                          json={**base, "due_date": "2020-01-01T00:00:00"})
+    if undated.status_code != 200 or dated.status_code != 200:
+        print(f"FAILED: could not create invoices ({undated.status_code}, {dated.status_code})")
+        return
+    duplicate = requests.post(f"{BASE_URL}/invoices/{undated.json()['invoice_id']}/duplicate", headers=headers)
+    if duplicate.status_code != 200:
+        print(f"FAILED: could not duplicate invoice ({duplicate.status_code}: {duplicate.text})")
+        return
+    resp = requests.post(f"{BASE_URL}/payments/allocate", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+        "party_id": customer["customer_id"], "party_name": customer.get("customer_name", ""), "amount": 1
+    })
+    print(f"{'SUCCESS' if resp.status_code == 200 else 'FAILED'}: FIFO with string and datetime invoice dates ({resp.status_code})")
+
+if __name__ == "__main__":
+    headers = login()
+    test_explicit_split_rejected(headers)
+    test_fifo_allocation(headers)
+    test_mixed_date_types(headers)
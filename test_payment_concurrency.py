@@ -0,0 +1,109 @@
+import requests
+import time
+import uuid
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+PARALLEL = 100
+AMOUNT = 1.0
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def send(method, path, headers, **kwargs):
+    """Send with a fixed Idempotency-Key, retrying throttled (429) attempts safely."""
+    headers = {**headers, "Idempotency-Key": str(uuid.uuid4())}
+    for _ in range(50):
+        resp = requests.request(method, f"{BASE_URL}{path}", headers=headers, **kwargs)
+        if resp.status_code not in (429, 503):
+            return resp
+        time.sleep(float(resp.headers.get("Retry-After", 1)))
+    return resp
+
+def parallel(fn, args):
+    with ThreadPoolExecutor(max_workers=PARALLEL) as pool:
+        return list(pool.map(fn, args))
+
+def check(label, expected, actual):
+    ok = abs(expected - actual) < 1e-6
+    print(f"{'SUCCESS' if ok else 'FAILED'}: {label} expected {expected}, got {actual}")
+    return ok
+
+def test_customer_payments(headers):
+    invoices = requests.get(f"{BASE_URL}/invoices/", headers=headers).json()
+    invoice = next((i for i in invoices if i.get("status") == "active"
+                    and i.get("balance_amount", 0) >= PARALLEL * AMOUNT), None)
+    if not invoice:
+        print(f"SKIPPED: need an active invoice with at least {PARALLEL * AMOUNT} outstanding")
+        return
+    invoice_id, customer_id = invoice["invoice_id"], invoice["customer_id"]
+    before = requests.get(f"{BASE_URL}/invoices/{invoice_id}", headers=headers).json()
+    customer_before = requests.get(f"{BASE_URL}/customers/{customer_id}", headers=headers).json()
+
+    print(f"Posting {PARALLEL} parallel payments of {AMOUNT} to {invoice['invoice_number']}...")
+    payload = {
+        "party_id": customer_id, "party_name": invoice.get("customer_name", ""),
+        "amount": AMOUNT, "payment_mode": "cash", "payment_type": "receive", "invoice_id": invoice_id
+    }
+    responses = parallel(lambda _: send("POST", "/payments/", headers, json=payload), range(PARALLEL))
+    payment_ids = [r.json()["payment_id"] for r in responses if r.status_code == 200]
+    print(f"{len(payment_ids)} payments created")
+
+    after = requests.get(f"{BASE_URL}/invoices/{invoice_id}", headers=headers).json()
+    customer_after = requests.get(f"{BASE_URL}/customers/{customer_id}", headers=headers).json()
+    total = len(payment_ids) * AMOUNT
+    check("amount_received", before.get("amount_received", 0) + total, after.get("amount_received", 0))
+    check("balance_amount", before["balance_amount"] - total, after["balance_amount"])
+    check("customer balance", customer_before.get("current_balance", 0) - total, customer_after.get("current_balance", 0))
+
+    print("Deleting every payment twice in parallel...")
+    parallel(lambda pid: send("DELETE", f"/payments/{pid}", headers), payment_ids * 2)
+    restored = requests.get(f"{BASE_URL}/invoices/{invoice_id}", headers=headers).json()
+    customer_restored = requests.get(f"{BASE_URL}/customers/{customer_id}", headers=headers).json()
+    check("restored balance_amount", before["balance_amount"], restored["balance_amount"])
+    check("restored customer balance", customer_before.get("current_balance", 0), customer_restored.get("current_balance", 0))
+    print(f"payment_status: {before.get('payment_status')} -> {after.get('payment_status')} -> {restored.get('payment_status')}")
+
+def test_vendor_payments(headers):
+    bills = requests.get(f"{BASE_URL}/purchase-bills/", headers=headers).json()
+    bill = next((b for b in bills if b.get("balance_amount", 0) >= PARALLEL * AMOUNT), None)
+    if not bill:
+        print(f"SKIPPED: need a purchase bill with at least {PARALLEL * AMOUNT} outstanding")
+        return
+    bill_id, weaver_id = bill["bill_id"], bill["weaver_id"]
+    before = requests.get(f"{BASE_URL}/purchase-bills/{bill_id}", headers=headers).json()
+    weaver_before = requests.get(f"{BASE_URL}/weavers/{weaver_id}", headers=headers).json()
+
+    print(f"Posting {PARALLEL} parallel vendor payments of {AMOUNT} to {bill.get('bill_number')}...")
+    payload = {
+        "weaver_id": weaver_id, "weaver_name": bill.get("weaver_name", ""), "bill_id": bill_id,
+        "payment_date": datetime.utcnow().isoformat(), "amount": AMOUNT, "payment_mode": "cash"
+    }
+    responses = parallel(lambda _: send("POST", "/vendor-payments/", headers, json=payload), range(PARALLEL))
+    payment_ids = [r.json()["payment_id"] for r in responses if r.status_code == 200]
+    print(f"{len(payment_ids)} vendor payments created")
+
+    after = requests.get(f"{BASE_URL}/purchase-bills/{bill_id}", headers=headers).json()
+    weaver_after = requests.get(f"{BASE_URL}/weavers/{weaver_id}", headers=headers).json()
+    total = len(payment_ids) * AMOUNT
+    check("paid_amount", before.get("paid_amount", 0) + total, after.get("paid_amount", 0))
+    check("bill balance_amount", before["balance_amount"] - total, after["balance_amount"])
+    check("weaver balance", weaver_before.get("current_balance", 0) - total, weaver_after.get("current_balance", 0))
+
+    print("Deleting every vendor payment twice in parallel...")
+    parallel(lambda pid: send("DELETE", f"/vendor-payments/{pid}", headers), payment_ids * 2)
+    restored = requests.get(f"{BASE_URL}/purchase-bills/{bill_id}", headers=headers).json()
+    weaver_restored = requests.get(f"{BASE_URL}/weavers/{weaver_id}", headers=headers).json()
+    check("restored paid_amount", before.get("paid_amount", 0), restored.get("paid_amount", 0))
+    check("restored weaver balance", weaver_before.get("current_balance", 0), weaver_restored.get("current_balance", 0))
+
+if __name__ == "__main__":
+    headers = login()
+    test_customer_payments(headers)
+    test_vendor_payments(headers)
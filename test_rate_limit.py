@@ -0,0 +1,52 @@
+import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+def test_read_bucket(token, requests_to_send=200):
+    print(f"Sending {requests_to_send} reads to /items/ as fast as possible...")
+    headers = {"Authorization": f"Bearer {token}"}
+    statuses = {}
+    retry_after = None
+    for _ in range(requests_to_send):
+        resp = requests.get(f"{BASE_URL}/items/", headers=headers)
+        statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+        if resp.status_code == 429:
+            retry_after = resp.headers.get("Retry-After")
+    print(f"Status counts: {statuses}")
+    if statuses.get(429):
+        print(f"SUCCESS: reads were throttled (Retry-After: {retry_after})")
+    else:
+        print("WARNING: no 429 seen; is RATE_LIMIT_ENABLED on and the plan limit lower than the request count?")
+
+def test_report_concurrency(token, parallel=8):
+    print(f"Running {parallel} dashboard stats requests in parallel...")
+    headers = {"Authorization": f"Bearer {token}"}
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        responses = list(pool.map(
+            lambda _: requests.get(f"{BASE_URL}/dashboard/stats", headers=headers),
+            range(parallel)
+        ))
+    codes = [r.status_code for r in responses]
+    print(f"Status codes: {codes}")
+    rejected = [r for r in responses if r.status_code == 429]
+    if rejected:
+        print(f"SUCCESS: {len(rejected)} report requests rejected: {rejected[0].json().get('detail')}")
+    else:
+        print("WARNING: no report request was rejected")
+
+if __name__ == "__main__":
+    token = login()
+    test_read_bucket(token)
+    # Let the buckets refill before the report test
+    time.sleep(10)
+    test_report_concurrency(token)
@@ -0,0 +1,159 @@
+"""
+Report read routing against a throwaway local three-node replica set.
+
+Starts three `mongod` processes (set MONGOD to the binary if it is not on PATH),
+initiates the set, points app.core.database.db at it and checks that:
+
+1. report reads (get_report_db) are served by a secondary,
+2. a report read without a causal token can miss a write that has not replicated yet,
+3. the same read with the token from db.write_fence() waits for the write and sees it.
+
+Replication is paused with the stopReplProducer fail point, so mongod runs with
+enableTestCommands=1. Everything is torn down at the end.
+
+    python test_read_routing.py
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from pymongo import MongoClient
+from pymongo.write_concern import WriteConcern
+from pymongo.read_preferences import SecondaryPreferred
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.core.database import db
+
+MONGOD = os.environ.get("MONGOD", "mongod")
+REPLICA_SET = "rs_report_test"
+PORTS = [27117, 27118, 27119]
+DATABASE_NAME = "billing_read_routing_test"
+
+
+def start_replica_set(base_dir):
+    processes = []
+    for port in PORTS:
+        db_path = os.path.join(base_dir, str(port))
+        os.makedirs(db_path)
+        processes.append(subprocess.Popen([
+            MONGOD, "--replSet", REPLICA_SET, "--port", str(port), "--bind_ip", "127.0.0.1",
+            "--dbpath", db_path, "--setParameter", "enableTestCommands=1",
+            "--logpath", os.path.join(db_path, "mongod.log")
+        ]))
+
+    seed = MongoClient(f"mongodb://127.0.0.1:{PORTS[0]}", directConnection=True, serverSelectionTimeoutMS=20000)
+    seed.admin.command("ping")
+    seed.admin.command("replSetInitiate", {
+        "_id": REPLICA_SET,
+        "members": [
+            {"_id": i, "host": f"127.0.0.1:{port}", "priority": 2 if i == 0 else 1}
+            for i, port in enumerate(PORTS)
+        ]
+    })
+    seed.close()
+
+    hosts = ",".join(f"127.0.0.1:{port}" for port in PORTS)
+    client = MongoClient(f"mongodb://{hosts}/?replicaSet={REPLICA_SET}", serverSelectionTimeoutMS=30000)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        status = client.admin.command("replSetGetStatus")
+        states = sorted(member["stateStr"] for member in status["members"])
+        if states == ["PRIMARY", "SECONDARY", "SECONDARY"]:
+            return processes, client
+        time.sleep(0.5)
+    raise RuntimeError(f"Replica set did not come up: {states}")
+
+
+def secondary_clients():
+    return [MongoClient(f"mongodb://{host}:{port}", directConnection=True) for host, port in db.client.secondaries]
+
+
+def set_replication_paused(paused):
+    for client in secondary_clients():
+        client.admin.command("configureFailPoint", "stopReplProducer", mode="alwaysOn" if paused else "off")
+        client.close()
+
+
+def test_report_reads_use_secondary():
+    print("Testing report reads are routed to a secondary...")
+    report_db = db.get_report_db()
+    assert isinstance(report_db.read_preference, SecondaryPreferred)
+    assert report_db.read_preference.max_staleness == settings.REPORT_MAX_STALENESS_SECONDS
+
+    db.get_db()["invoices"].insert_one({"account_id": "acc-routing", "grand_total": 10})
+    time.sleep(1)
+    cursor = report_db["invoices"].find({"account_id": "acc-routing"})
+    list(cursor)
+    assert cursor.address in db.client.secondaries, f"report read went to {cursor.address}"
+    print(f"SUCCESS: report read served by secondary {cursor.address}")
+
+
+def test_causal_token_reads_own_write():
+    print("Testing write-then-report-read with a causal token...")
+    collection = "payments"
+    set_replication_paused(True)
+    try:
+        # w=1: with replication paused a majority write (the server default) would never be acknowledged
+        db.get_db().get_collection(collection, write_concern=WriteConcern(w=1)).insert_one(
+            {"payment_id": "PAY-CAUSAL", "account_id": "acc-routing"}
+        )
+        token = db.write_fence()
+        assert token, "write_fence returned no token on a replica set"
+
+        # Without the token the secondary still serves its pre-write state
+        stale = db.get_report_db()[collection].find_one({"payment_id": "PAY-CAUSAL"})
+        assert stale is None, "secondary unexpectedly had the write while replication was paused"
+        print("Verified: plain secondary read is stale while replication is paused")
+
+        resume = threading.Timer(2.0, set_replication_paused, args=(False,))
+        resume.start()
+        started = time.time()
+        with db.causal_session(token) as session:
+            cursor = db.get_report_db()[collection].find({"payment_id": "PAY-CAUSAL"}, session=session)
+            docs = list(cursor)
+        waited = time.time() - started
+        resume.join()
+    finally:
+        set_replication_paused(False)
+
+    assert len(docs) == 1, "causal read did not see the write"
+    assert cursor.address in db.client.secondaries, f"causal read went to {cursor.address}"
+    print(f"SUCCESS: causal read on secondary {cursor.address} saw the write after waiting {waited:.1f}s")
+
+
+def main():
+    if shutil.which(MONGOD) is None and not os.path.exists(MONGOD):
+        print(f"SKIPPED: mongod binary not found ({MONGOD}); set MONGOD to run this test")
+        return 0
+
+    base_dir = tempfile.mkdtemp(prefix="billing_rs_")
+    processes = []
+    try:
+        processes, client = start_replica_set(base_dir)
+        settings.DATABASE_NAME = DATABASE_NAME
+        settings.REPORT_READ_PREFERENCE = "secondaryPreferred"
+        db.client = client
+
+        test_report_reads_use_secondary()
+        test_causal_token_reads_own_write()
+        print("All read routing tests passed.")
+        return 0
+    finally:
+        if db.client:
+            db.client.drop_database(DATABASE_NAME)
+            db.close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import os
+import sys
+import uuid
+import requests
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import db
+from app.core.recurring import run_due_schedules
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+WORKERS = 8
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def test_parallel_workers_bill_each_period_once(headers):
+    customers = requests.get(f"{BASE_URL}/customers/", headers=headers).json()
+    items = [i for i in requests.get(f"{BASE_URL}/items/", headers=headers).json() if i.get("current_stock", 0) >= 3]
+    if not customers or not items:
+        print("SKIPPED: need a customer and an item with at least 3 in stock")
+        return
+    item = items[0]
+    stock_before = item["current_stock"]
+
+    # Weekly since 15 days ago: periods at -15, -8 and -1 days are due now
+    start = datetime.utcnow() - timedelta(days=15)
+    resp = requests.post(f"{BASE_URL}/recurring-invoices/", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+        "customer_id": customers[0]["customer_id"],
+        "items": [{"item_id": item["item_id"], "item_name": item["item_name"], "qty": 1, "rate": 100, "tax_percent": 18}],
+        "frequency": "weekly",
+        "start_date": start.isoformat(),
+        "due_in_days": 15
+    })
+    if resp.status_code != 201:
+        print(f"FAILED: create schedule {resp.status_code} {resp.text}")
+        return
+    schedule = resp.json()
+    print(f"Created schedule {schedule['schedule_id']}; running {WORKERS} scheduler workers in parallel...")
+
+    db.connect()
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(lambda _: run_due_schedules(batch_size=1), range(WORKERS)))
+    print(f"generated per worker: {[r['generated'] for r in results]}")
+
+    invoices = requests.get(f"{BASE_URL}/recurring-invoices/{schedule['schedule_id']}/invoices", headers=headers).json()
+    numbers = [inv["invoice_number"] for inv in invoices]
+    print(f"{'SUCCESS' if len(invoices) == 3 else 'FAILED'}: {len(invoices)} invoices for 3 due periods {numbers}")
+    print(f"{'SUCCESS' if len(set(numbers)) == len(numbers) else 'FAILED'}: invoice numbers are unique")
+
+    after = requests.get(f"{BASE_URL}/recurring-invoices/{schedule['schedule_id']}", headers=headers).json()
+    print(f"{'SUCCESS' if after['run_count'] == 3 else 'FAILED'}: run_count {after['run_count']}, next run {after['next_run_at']}")
+    stock_after = requests.get(f"{BASE_URL}/items/{item['item_id']}", headers=headers).json()["current_stock"]
+    print(f"{'SUCCESS' if stock_before - stock_after == 3 else 'FAILED'}: stock {stock_before} -> {stock_after}")
+
+    requests.delete(f"{BASE_URL}/recurring-invoices/{schedule['schedule_id']}", headers=headers)
+
+if __name__ == "__main__":
+    headers = login()
+    test_parallel_workers_bill_each_period_once(headers)
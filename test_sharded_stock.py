@@ -0,0 +1,58 @@
+import requests
+import uuid
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def check(label, ok):
+    print(f"{'SUCCESS' if ok else 'FAILED'}: {label}")
+
+def stock_of(headers, item_id):
+    return requests.get(f"{BASE_URL}/items/{item_id}", headers=headers).json()["current_stock"]
+
+def test_sharded_item_stock(headers):
+    customers = requests.get(f"{BASE_URL}/customers/", headers=headers).json()
+    items = [i for i in requests.get(f"{BASE_URL}/items/", headers=headers).json() if i.get("available_stock", 0) >= 5]
+    if not customers or not items:
+        print("SKIPPED: need a customer and an item with at least 5 available")
+        return
+    customer, item = customers[0], items[0]
+    on_hand = stock_of(headers, item["item_id"])
+
+    resp = requests.put(f"{BASE_URL}/items/{item['item_id']}", headers=headers, json={"stock_shards": 4})
+    check(f"sharding enabled ({resp.status_code})", resp.status_code == 200 and resp.json().get("stock_shards") == 4)
+    bad = requests.put(f"{BASE_URL}/items/{item['item_id']}", headers=headers, json={"stock_shards": 100000})
+    check(f"out-of-range shard count rejected ({bad.status_code})", bad.status_code == 400)
+
+    line = {"item_id": item["item_id"], "item_name": item["item_name"], "qty": 1, "rate": 100, "tax_percent": 0}
+    invoice_ids = []
+    for _ in range(3):
+        invoice = requests.post(f"{BASE_URL}/invoices/", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+            "customer_id": customer["customer_id"], "customer_name": customer["customer_name"],
+            "items": [line], "sub_total": 100, "total_tax": 0, "grand_total": 100
+        })
+        if invoice.status_code == 200:
+            invoice_ids.append(invoice.json()["invoice_id"])
+    sharded = stock_of(headers, item["item_id"])
+    check(f"reads include unfolded shard deltas: {on_hand} -> {sharded} after {len(invoice_ids)} sales",
+          sharded == on_hand - len(invoice_ids))
+
+    # Turning sharding off folds the counters into current_stock
+    requests.put(f"{BASE_URL}/items/{item['item_id']}", headers=headers, json={"stock_shards": 0})
+    folded = stock_of(headers, item["item_id"])
+    check(f"stock unchanged by folding: {sharded} -> {folded}", folded == sharded)
+
+    for invoice_id in invoice_ids:
+        requests.delete(f"{BASE_URL}/invoices/{invoice_id}", headers=headers)
+    check(f"deleting the invoices restores stock: {stock_of(headers, item['item_id'])}", stock_of(headers, item["item_id"]) == on_hand)
+
+if __name__ == "__main__":
+    headers = login()
+    test_sharded_item_stock(headers)
@@ -0,0 +1,43 @@
+import requests
+from datetime import datetime, timedelta
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def check(label, ok):
+    print(f"{'SUCCESS' if ok else 'FAILED'}: {label}")
+
+def test_stock_as_of(headers):
+    items = requests.get(f"{BASE_URL}/items/", headers=headers).json()
+    if not items:
+        print("SKIPPED: no items")
+        return
+    item = items[0]
+
+    today = datetime.utcnow().date().isoformat()
+    resp = requests.get(f"{BASE_URL}/items/stock-as-of", headers=headers, params={"date": today, "item_id": item["item_id"]})
+    if resp.status_code != 200:
+        check(f"stock-as-of today ({resp.status_code}: {resp.text})", False)
+        return
+    rows = {row["item_id"]: row["stock"] for row in resp.json()["items"]}
+    check(f"stock as of today matches current stock ({rows.get(item['item_id'])} vs {item['current_stock']})",
+          rows.get(item["item_id"]) == item["current_stock"])
+
+    created = datetime.fromisoformat(item["created_at"].replace("Z", "")).date()
+    before = (created - timedelta(days=1)).isoformat()
+    earlier = requests.get(f"{BASE_URL}/items/stock-as-of", headers=headers, params={"date": before, "item_id": item["item_id"]}).json()
+    check("items did not exist before they were created", item["item_id"] not in {row["item_id"] for row in earlier["items"]})
+
+    missing = requests.get(f"{BASE_URL}/items/stock-as-of", headers=headers)
+    check(f"date is required ({missing.status_code})", missing.status_code == 422)
+
+if __name__ == "__main__":
+    headers = login()
+    test_stock_as_of(headers)
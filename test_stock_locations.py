@@ -0,0 +1,83 @@
+import requests
+import uuid
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def check(label, ok):
+    print(f"{'SUCCESS' if ok else 'FAILED'}: {label}")
+
+def by_location(headers, item_id):
+    rows = requests.get(f"{BASE_URL}/items/{item_id}/locations", headers=headers).json()
+    return {row["location_id"]: row["current_stock"] for row in rows}
+
+def test_locations_and_transfers(headers):
+    customers = requests.get(f"{BASE_URL}/customers/", headers=headers).json()
+    items = [i for i in requests.get(f"{BASE_URL}/items/", headers=headers).json() if i.get("available_stock", 0) >= 5]
+    if not customers or not items:
+        print("SKIPPED: need a customer and an item with at least 5 available")
+        return
+    customer, item = customers[0], items[0]
+    suffix = uuid.uuid4().hex[:6]
+
+    godown = requests.post(f"{BASE_URL}/locations/", headers=headers, json={"name": f"Godown {suffix}"}).json()
+    shop = requests.post(f"{BASE_URL}/locations/", headers=headers, json={"name": f"Shop {suffix}", "location_type": "shop"}).json()
+    check("locations created", "location_id" in godown and "location_id" in shop)
+    bad = requests.post(f"{BASE_URL}/locations/", headers=headers, json={"name": f"Bad {suffix}", "location_type": "moon"})
+    check(f"unknown location type rejected ({bad.status_code})", bad.status_code == 400)
+
+    before = by_location(headers, item["item_id"])
+    total = requests.get(f"{BASE_URL}/items/{item['item_id']}", headers=headers).json()["current_stock"]
+    check(f"per-location stock adds up to the item total ({total})", round(sum(before.values()), 6) == round(total, 6))
+
+    # Place unassigned stock at the godown, then move part of it to the shop
+    placed = requests.post(f"{BASE_URL}/locations/transfers", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+        "item_id": item["item_id"], "to_location_id": godown["location_id"], "quantity": 4
+    })
+    moved = requests.post(f"{BASE_URL}/locations/transfers", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+        "item_id": item["item_id"], "from_location_id": godown["location_id"], "to_location_id": shop["location_id"], "quantity": 3
+    })
+    after = by_location(headers, item["item_id"])
+    check(f"transfers ({placed.status_code}, {moved.status_code}): godown {after.get(godown['location_id'])}, shop {after.get(shop['location_id'])}",
+          after.get(godown["location_id"]) == 1 and after.get(shop["location_id"]) == 3)
+    check("transfers leave the item total unchanged",
+          requests.get(f"{BASE_URL}/items/{item['item_id']}", headers=headers).json()["current_stock"] == total)
+
+    over = requests.post(f"{BASE_URL}/locations/transfers", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+        "item_id": item["item_id"], "from_location_id": godown["location_id"], "to_location_id": shop["location_id"], "quantity": 2
+    })
+    check(f"transfer beyond location stock rejected ({over.status_code})", over.status_code == 400)
+
+    line = {"item_id": item["item_id"], "item_name": item["item_name"], "qty": 2, "rate": 100, "tax_percent": 0}
+    body = {"customer_id": customer["customer_id"], "customer_name": customer["customer_name"],
+            "items": [line], "sub_total": 200, "total_tax": 0, "grand_total": 200}
+    short = requests.post(f"{BASE_URL}/invoices/", headers={**headers, "Idempotency-Key": str(uuid.uuid4())},
+                          json={**body, "location_id": godown["location_id"]})
+    check(f"sale beyond location stock rejected ({short.status_code})", short.status_code == 400)
+    sold = requests.post(f"{BASE_URL}/invoices/", headers={**headers, "Idempotency-Key": str(uuid.uuid4())},
+                         json={**body, "location_id": shop["location_id"]})
+    check(f"sale from the shop ({sold.status_code}) leaves {by_location(headers, item['item_id']).get(shop['location_id'])}",
+          sold.status_code == 200 and by_location(headers, item["item_id"]).get(shop["location_id"]) == 1)
+    if sold.status_code == 200:
+        requests.delete(f"{BASE_URL}/invoices/{sold.json()['invoice_id']}", headers=headers)
+        check("cancelling returns stock to the shop", by_location(headers, item["item_id"]).get(shop["location_id"]) == 3)
+
+    # A location can only be retired once it is empty
+    requests.post(f"{BASE_URL}/locations/transfers", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+        "item_id": item["item_id"], "from_location_id": shop["location_id"], "to_location_id": godown["location_id"], "quantity": 3
+    })
+    retired = requests.delete(f"{BASE_URL}/locations/{shop['location_id']}", headers=headers)
+    check(f"empty location deactivated ({retired.status_code})", retired.status_code == 200)
+    busy = requests.delete(f"{BASE_URL}/locations/{godown['location_id']}", headers=headers)
+    check(f"location holding stock kept ({busy.status_code})", busy.status_code == 400)
+
+if __name__ == "__main__":
+    headers = login()
+    test_locations_and_transfers(headers)
@@ -0,0 +1,82 @@
+import requests
+import uuid
+from datetime import datetime, timedelta
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+def login():
+    resp = requests.post(f"{BASE_URL}/auth/login", data={
+        "username": "admin@billing.com",
+        "password": "admin123"
+    })
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+def item_state(headers, item_id):
+    item = requests.get(f"{BASE_URL}/items/{item_id}", headers=headers).json()
+    return item["current_stock"], item.get("reserved_stock", 0), item.get("available_stock")
+
+def check(label, ok):
+    print(f"{'SUCCESS' if ok else 'FAILED'}: {label}")
+
+def test_quotation_reservation_converts(headers):
+    customers = requests.get(f"{BASE_URL}/customers/", headers=headers).json()
+    items = [i for i in requests.get(f"{BASE_URL}/items/", headers=headers).json() if i.get("available_stock", 0) >= 2]
+    if not customers or not items:
+        print("SKIPPED: need a customer and an item with at least 2 available")
+        return
+    customer, item = customers[0], items[0]
+    on_hand, reserved, available = item_state(headers, item["item_id"])
+    line = {"item_id": item["item_id"], "item_name": item["item_name"], "qty": 2, "rate": 100, "tax_percent": 18}
+
+    quote = requests.post(f"{BASE_URL}/quotations/", headers=headers, json={
+        "customer_id": customer["customer_id"], "customer_name": customer["customer_name"],
+        "valid_until": (datetime.utcnow() + timedelta(days=7)).isoformat(),
+        "items": [line], "sub_total": 200, "total_tax": 36, "grand_total": 236, "reserve_stock": True
+    }).json()
+    held = item_state(headers, item["item_id"])
+    check(f"quotation holds 2: reserved {reserved} -> {held[1]}, available {available} -> {held[2]}",
+          held[1] == reserved + 2 and held[2] == available - 2 and held[0] == on_hand)
+
+    # Asking for more than is available now fails without touching the hold
+    too_much = requests.post(f"{BASE_URL}/quotations/", headers=headers, json={
+        "customer_id": customer["customer_id"], "customer_name": customer["customer_name"],
+        "items": [{**line, "qty": held[2] + 1}], "sub_total": 0, "total_tax": 0, "grand_total": 0, "reserve_stock": True
+    })
+    check(f"over-reservation rejected ({too_much.status_code})", too_much.status_code == 400)
+
+    invoice = requests.post(f"{BASE_URL}/invoices/", headers={**headers, "Idempotency-Key": str(uuid.uuid4())}, json={
+        "customer_id": customer["customer_id"], "customer_name": customer["customer_name"],
+        "items": [line], "sub_total": 200, "total_tax": 36, "grand_total": 236,
+        "quotation_id": quote["quotation_id"]
+    })
+    after = item_state(headers, item["item_id"])
+    check(f"conversion deducts 2 and releases the hold: on hand {on_hand} -> {after[0]}, reserved -> {after[1]}",
+          invoice.status_code == 200 and after[0] == on_hand - 2 and after[1] == reserved)
+    return invoice.json() if invoice.status_code == 200 else None
+
+def test_duplicate_invoice_reserves(headers, invoice):
+    if not invoice:
+        print("SKIPPED: no invoice to duplicate")
+        return
+    item_id = invoice["items"][0]["item_id"]
+    on_hand, reserved, _ = item_state(headers, item_id)
+    dup = requests.post(f"{BASE_URL}/invoices/{invoice['invoice_id']}/duplicate", headers=headers)
+    if dup.status_code != 200:
+        print(f"SKIPPED: duplicate failed {dup.status_code} {dup.text}")
+        return
+    new_id = dup.json()["new_invoice_id"]
+    held = item_state(headers, item_id)
+    check(f"duplicate reserves without deducting: reserved {reserved} -> {held[1]}", held[1] > reserved and held[0] == on_hand)
+
+    saved = requests.get(f"{BASE_URL}/invoices/{new_id}", headers=headers).json()
+    requests.put(f"{BASE_URL}/invoices/{new_id}", headers=headers, json={"items": saved["items"]})
+    after = item_state(headers, item_id)
+    check(f"saving deducts and releases: on hand {on_hand} -> {after[0]}, reserved -> {after[1]}",
+          after[0] < on_hand and after[1] == reserved)
+    requests.delete(f"{BASE_URL}/invoices/{new_id}", headers=headers)
+
+if __name__ == "__main__":
+    headers = login()
+    invoice = test_quotation_reservation_converts(headers)
+    test_duplicate_invoice_reserves(headers, invoice)